@@ -0,0 +1,131 @@
+# bench/bench_projecao.py — fluxo de caixa/aging: uma consulta SQL por pergunta vs motor colunar
+#   python -m bench.bench_projecao [n_linhas_por_tabela]      (padrão 1.000.000)
+# Mede: SQL (GROUP BY por pergunta), motor frio (carga + cálculo), motor com colunas já
+# carregadas (outro dia/horizonte), acerto de cache e o caminho em Python puro.
+# Confere que SQL, NumPy e Python dão os mesmos números; sai com código 1 se divergir.
+import os, sys, time, tempfile
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import database
+from src.services import report, projecao, mock_data
+
+CONTATOS = 20_000
+# títulos em aberto vencendo hoje, num contato só deles: ficam em "a vencer", não em atraso
+CONTATO_HOJE = "999999999"
+
+
+def _popular(n, seed=11):
+    # gerador determinístico (src/services/mock_data.py): mesmos títulos em qualquer máquina
+    return mock_data.popular(n, seed=seed, contatos=CONTATOS, referencia=date.today())
+
+
+def _vencendo_hoje(hoje, n=5):
+    extrair = database.extrator("v3")
+    for tipo, tabela in projecao.TIPOS.items():
+        database.upsert_rows(tabela, [extrair({
+            "id": f"hoje-{tipo}-{i}", "situacao": 1, "valor": 100.0 + i, "dataVencimento": hoje.isoformat(),
+            "contato": {"id": CONTATO_HOJE, "nome": "Vence hoje"}}) for i in range(n)])
+
+
+# --------- referência: uma consulta por pergunta ---------
+def fluxo_sql(con, horizonte, hoje):
+    fim = hoje + timedelta(days=horizonte)
+    series = {}
+    for tipo, tabela in projecao.TIPOS.items():
+        por_dia = dict(con.execute(f"""SELECT vencimento, SUM(valor) FROM {tabela}
+            WHERE situacao_cod = 'ABERTO' AND vencimento >= ? AND vencimento < ? GROUP BY vencimento""",
+                                   (hoje.isoformat(), fim.isoformat())))
+        series[tipo] = [por_dia.get((hoje + timedelta(days=i)).isoformat(), 0.0) for i in range(horizonte)]
+    saldo, acumulado = [], 0.0
+    for e, s in zip(series["receber"], series["pagar"]):
+        acumulado += e - s
+        saldo.append(acumulado)
+    return {"entradas": series["receber"], "saidas": series["pagar"], "saldo": saldo}
+
+
+def aging_sql(con, hoje):
+    r = {}
+    for tipo, tabela in projecao.TIPOS.items():
+        r[tipo] = {cid: list(faixas) for cid, *faixas in con.execute(f"""
+            SELECT (SELECT id_bling FROM contatos WHERE contatos.id = contato_ref),
+                   SUM(CASE WHEN atraso <= 0 THEN valor ELSE 0 END),
+                   SUM(CASE WHEN atraso BETWEEN 1 AND 30 THEN valor ELSE 0 END),
+                   SUM(CASE WHEN atraso BETWEEN 31 AND 60 THEN valor ELSE 0 END),
+                   SUM(CASE WHEN atraso BETWEEN 61 AND 90 THEN valor ELSE 0 END),
+                   SUM(CASE WHEN atraso > 90 THEN valor ELSE 0 END)
+            FROM (SELECT contato_ref, valor, CAST(julianday(?) - julianday(vencimento) AS INTEGER) AS atraso
+                  FROM {tabela} WHERE situacao_cod = 'ABERTO' AND vencimento IS NOT NULL)
+            GROUP BY contato_ref""", (hoje.isoformat(),))}
+    return r
+
+
+def _perto(a, b, tol=0.05):
+    return len(a) == len(b) and all(abs(x - y) <= tol for x, y in zip(a, b))
+
+
+def conferir(fluxo, aging, ref_fluxo, ref_aging, nome):
+    ok = all(_perto(fluxo[k], ref_fluxo[k], tol=0.05 if k != "saldo" else 1.0) for k in ("entradas", "saidas", "saldo"))
+    for tipo in projecao.TIPOS:
+        got = {l["contato_id"]: l["faixas"] for l in aging[tipo]["contatos"]}
+        ok = ok and got.keys() == ref_aging[tipo].keys()
+        ok = ok and all(_perto(got[k], ref_aging[tipo][k]) for k in got)
+        hoje = got.get(CONTATO_HOJE, [])
+        ok = ok and len(hoje) == 5 and hoje[0] > 0 and not any(hoje[1:])  # vence hoje: só "a vencer"
+    if not ok:
+        print(f"  !! {nome}: diverge da referência SQL")
+    return ok
+
+
+def _tempo(fn, reps=3):
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        r = fn()
+    return (time.perf_counter() - t0) / reps * 1000, r
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    hoje = date.today()
+    with tempfile.TemporaryDirectory() as d:
+        database.DB_PATH = report.DB_PATH = os.path.join(d, "bench.db")
+        database.migrate()
+        t0 = time.perf_counter()
+        _popular(n)
+        _vencendo_hoje(hoje)
+        print(f"{n} títulos por tabela (gerados em {time.perf_counter() - t0:.1f}s), "
+              f"numpy {'disponível' if projecao.np is not None else 'ausente'}\n")
+
+        def perguntas(motor, dia):
+            return (motor.fluxo_caixa(90, dia), motor.fluxo_caixa(365, dia), motor.aging(dia))
+
+        con = database._conn()
+        ms_sql, (ref90, ref365, ref_aging) = _tempo(
+            lambda: (fluxo_sql(con, 90, hoje), fluxo_sql(con, 365, hoje), aging_sql(con, hoje)), reps=1)
+        con.close()
+        print(f"{'':<34} {'ms':>10}")
+        print(f"{'SQL (uma consulta por pergunta)':<34} {ms_sql:>10.1f}")
+
+        ok = True
+        caminhos = [("python", False)] + ([("numpy", True)] if projecao.np is not None else [])
+        for nome, usar_numpy in caminhos:
+            motor = projecao.Projecao(usar_numpy=usar_numpy)
+            ms_frio, (f90, f365, ag) = _tempo(lambda: perguntas(motor, hoje), reps=1)
+            dias = iter(range(1, 100))
+            ms_quente, _ = _tempo(lambda: perguntas(motor, hoje + timedelta(days=next(dias))))
+            ms_cache, _ = _tempo(lambda: perguntas(motor, hoje), reps=100)
+            print(f"{'motor ' + nome + ': frio (carga+cálculo)':<34} {ms_frio:>10.1f}")
+            print(f"{'motor ' + nome + ': colunas carregadas':<34} {ms_quente:>10.1f}")
+            print(f"{'motor ' + nome + ': cache (mesma versão)':<34} {ms_cache:>10.3f}")
+            ok = conferir(f90, ag, ref90, ref_aging, f"{nome} 90d") and ok
+            ok = conferir(f365, ag, ref365, ref_aging, f"{nome} 365d") and ok
+            print(f"  (cargas: {motor.stats['cargas']}, cálculos: {motor.stats['calculos']}, "
+                  f"acertos: {motor.stats['acertos']})")
+            motor.fechar()
+        print("\nresultados conferem com a referência SQL" if ok else "\n!! divergência")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# bench/bench_raw.py — raw_json inline (texto) vs comprimido em {tabela}_raw
+#   python -m bench.bench_raw [n_linhas]
+# Cria um banco no layout antigo, mede tamanho e tempo de scan, roda migrate()
+# (conversão one-shot + VACUUM) e mede de novo.
+import os, sys, json, time, random, sqlite3, tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import database
+
+LAYOUT_ANTIGO = """
+CREATE TABLE contas_pagar (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, id_bling TEXT UNIQUE, numero_documento TEXT, descricao TEXT,
+    categoria TEXT, contato_id TEXT, contato_nome TEXT, valor REAL, data_emissao TEXT, data_vencimento TEXT,
+    data_pagamento TEXT, situacao TEXT, status TEXT, raw_json TEXT,
+    created_at TEXT DEFAULT (datetime('now')), updated_at TEXT DEFAULT (datetime('now'))
+);
+"""
+
+# scans que os relatórios/consultas ad-hoc fazem quando não há índice que ajude
+SCANS = {
+    "sum_valor": "SELECT SUM(valor) FROM contas_pagar NOT INDEXED",
+    "like_descricao": "SELECT COUNT(*) FROM contas_pagar WHERE descricao LIKE '%zz%'",
+}
+
+
+def _item(i, rnd):
+    return {
+        "id": 7000000 + i, "situacao": rnd.choice([1, 2, 5]), "valor": round(rnd.uniform(10, 9000), 2),
+        "vencimento": "2025-03-10", "dataEmissao": "2025-02-10", "dataVencimento": "2025-03-10",
+        "contato": {"id": rnd.randint(1, 3000), "nome": f"Cliente {rnd.randint(1, 3000)}",
+                    "numeroDocumento": "12345678000190", "tipo": "J"},
+        "formaPagamento": {"id": 1, "descricao": "Boleto"}, "categoria": {"id": 7, "descricao": "Vendas"},
+        "portador": {"id": 3}, "historico": f"Venda {i} conforme pedido de compra e nota fiscal emitida",
+        "numeroDocumento": f"NF-{i}", "competencia": "2025-02-01", "ocorrencia": {"tipo": 1},
+    }
+
+
+def _criar(path, n):
+    rnd = random.Random(3)
+    con = sqlite3.connect(path)
+    con.executescript(LAYOUT_ANTIGO)
+    rows = []
+    for i in range(n):
+        it = _item(i, rnd)
+        rows.append((str(it["id"]), it["historico"], it["valor"], json.dumps(it, ensure_ascii=False)))
+    con.executemany("INSERT INTO contas_pagar (id_bling, descricao, valor, raw_json) VALUES (?, ?, ?, ?)", rows)
+    con.commit()
+    con.close()
+
+
+def _medir(path):
+    con = sqlite3.connect(path)
+    tempos = {}
+    for nome, q in SCANS.items():
+        con.execute(q).fetchall()  # aquece o cache de páginas
+        t0 = time.perf_counter()
+        for _ in range(5):
+            con.execute(q).fetchall()
+        tempos[nome] = (time.perf_counter() - t0) / 5 * 1000
+    con.close()
+    return os.path.getsize(path), tempos
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    with tempfile.TemporaryDirectory() as d:
+        path = database.DB_PATH = os.path.join(d, "raw.db")
+        _criar(path, n)
+        tam_a, t_a = _medir(path)
+        t0 = time.perf_counter()
+        database.migrate()
+        conv = time.perf_counter() - t0
+        tam_d, t_d = _medir(path)
+        print(f"{n} linhas; conversão + VACUUM em {conv:.1f}s")
+        print(f"{'':<16} {'antes':>12} {'depois':>12}")
+        print(f"{'arquivo':<16} {tam_a / 2**20:10.1f}MB {tam_d / 2**20:10.1f}MB")
+        print(f"{'  (só títulos)':<16} {'':>12} {_tamanho_tabela(path, 'contas_pagar') / 2**20:10.1f}MB")
+        for nome in SCANS:
+            print(f"{nome:<16} {t_a[nome]:10.1f}ms {t_d[nome]:10.1f}ms")
+        t0 = time.perf_counter()
+        for i in range(0, n, max(1, n // 1000)):
+            database.get_raw_json("contas_pagar", str(7000000 + i))
+        print(f"get_raw_json: {(time.perf_counter() - t0) / 1000 * 1e6:.0f}µs por título (sob demanda)")
+        database.close_conn()
+
+
+def _tamanho_tabela(path, tabela):
+    con = sqlite3.connect(path)
+    try:
+        return con.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = ?", (tabela,)).fetchone()[0] or 0
+    except sqlite3.OperationalError:  # SQLite sem dbstat
+        return 0
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    main()
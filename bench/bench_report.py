@@ -0,0 +1,95 @@
+# bench/bench_report.py — relatórios antigos (date()/LIKE) vs índices compostos + agregados
+#   python -m bench.bench_report [n_linhas]
+# Também confere resultado igual ao antigo e a consistência dos agregados; sai com código 1
+# se algo falhar. O plano de execução (sem SCAN nas tabelas) é testado em tests/test_report_plans.py.
+import os, sys, time, random, tempfile
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import database
+from src.services import report
+
+ANTIGAS = {
+    "pagar_hoje": """SELECT IFNULL(SUM(valor),0) FROM contas_pagar
+        WHERE situacao LIKE 'ABER%' AND date(data_vencimento) = date('now')""",
+    "devedores": """SELECT c.id_bling, c.nome, SUM(valor) AS total FROM contas_receber
+        LEFT JOIN contatos c ON c.id = contato_ref
+        WHERE situacao LIKE 'ABER%' AND date(data_vencimento) < date('now')
+        GROUP BY contato_ref ORDER BY total DESC""",
+    "resumo_semana": """SELECT 'pagar', IFNULL(SUM(valor),0) FROM contas_pagar
+        WHERE date(data_vencimento) BETWEEN date('now','-6 day') AND date('now')
+        UNION ALL SELECT 'receber', IFNULL(SUM(valor),0) FROM contas_receber
+        WHERE date(data_vencimento) BETWEEN date('now','-6 day') AND date('now')""",
+}
+
+NOVAS = {
+    "pagar_hoje": report.total_a_pagar_hoje,
+    "devedores": report.devedores,
+    "resumo_semana": report.resumo_semana,
+}
+
+CONTATOS = 2000
+
+
+def _popular(n, seed=7):
+    rnd = random.Random(seed)
+    hoje = date.today()
+    sits = ["ABERTA"] * 3 + ["BAIXADA"] * 6 + ["CANCELADA"]
+    for tabela in ("contas_pagar", "contas_receber"):
+        rows = []
+        for i in range(n):
+            venc = (hoje + timedelta(days=rnd.randint(-400, 120))).isoformat()
+            sit = rnd.choice(sits)
+            rows.append((f"{tabela}-{i}", rnd.randint(1, CONTATOS), round(rnd.uniform(10, 5000), 2),
+                         venc, sit, venc, database._norm_situacao(sit)))
+        con = database._conn()
+        with con:
+            # homônimos de propósito: o relatório tem que separar por contato, não por nome
+            con.executemany("INSERT OR IGNORE INTO contatos (id, id_bling, nome) VALUES (?, ?, ?)",
+                            [(k, str(900000 + k), f"Contato {k % (CONTATOS // 2)}") for k in range(1, CONTATOS + 1)])
+            con.executemany(f"""INSERT INTO {tabela} (id_bling, contato_ref, valor, data_vencimento, situacao,
+                vencimento, situacao_cod) VALUES (?, ?, ?, ?, ?, ?, ?)""", rows)
+        con.execute("ANALYZE")
+        con.close()
+
+
+def _tempo(fn, reps=5):
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    return (time.perf_counter() - t0) / reps * 1000
+
+
+def _mesmo_resultado(antigo, novo):
+    if not isinstance(novo, list):
+        novo = [(novo,)]
+    a = sorted((tuple(r)[:-1], round(tuple(r)[-1], 2)) for r in antigo)
+    b = sorted((tuple(r)[:-1], round(tuple(r)[-1], 2)) for r in novo)
+    return a == b
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    with tempfile.TemporaryDirectory() as d:
+        database.DB_PATH = report.DB_PATH = os.path.join(d, "bench.db")
+        database.migrate()
+        _popular(n)
+        print(f"{n} linhas por tabela\n")
+        print(f"{'consulta':<14} {'antes (ms)':>12} {'depois (ms)':>12}")
+        ok = True
+        for nome, q in ANTIGAS.items():
+            antes = _tempo(lambda: report.run_query(q))
+            depois = _tempo(NOVAS[nome])
+            print(f"{nome:<14} {antes:12.1f} {depois:12.1f}")
+            if not _mesmo_resultado(report.run_query(q), NOVAS[nome]()):
+                ok = False
+                print(f"  !! {nome}: resultado diverge da consulta antiga")
+        div = database.checar_agregados()
+        print(f"\nagregados: {len(div)} divergência(s)")
+        ok = ok and not div
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# bench/bench_stream.py — página inteira (r.json() + json.dumps por item) vs parser em streaming
+#   python -m bench.bench_stream
+# Mede CPU por registro e pico de memória (tracemalloc) para páginas de tamanhos diferentes.
+import sys, json, time, tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import database
+from src.api.bling_api import iter_json_array
+from src.core.campos import extrator
+
+CHUNK = 64 * 1024
+
+
+def _corpo(n):
+    items = [{
+        "id": 5000000 + i, "situacao": 1, "vencimento": "2025-03-10", "valor": 123.45 + i,
+        "contato": {"id": 100 + i % 300, "nome": f"Cliente {i % 300}", "numeroDocumento": "12345678000190"},
+        "formaPagamento": {"id": 1}, "categoria": {"id": 7, "descricao": "Vendas"},
+        "dataEmissao": "2025-02-10", "dataVencimento": "2025-03-10", "numeroDocumento": f"NF-{i}",
+        "historico": "Venda de mercadorias conforme pedido " * 3,
+    } for i in range(n)]
+    return json.dumps({"data": items}, ensure_ascii=False).encode("utf-8")
+
+
+def _chunks(body):
+    for i in range(0, len(body), CHUNK):
+        yield body[i:i + CHUNK]
+
+
+def antes(body):
+    payload = json.loads(b"".join(_chunks(body)))  # equivalente a r.json()
+    return [database._extract(item) for item in payload["data"]]
+
+
+def depois(body):
+    n = 0
+    extrair = extrator("v3")
+    for item, raw in iter_json_array(_chunks(body)):
+        extrair(item, raw)
+        n += 1
+    return n
+
+
+def _medir(fn, body):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    fn(body)
+    dt = time.perf_counter() - t0
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return dt, pico
+
+
+def main():
+    print(f"{'itens/página':>12} {'antes µs/item':>14} {'depois µs/item':>15} {'antes pico':>12} {'depois pico':>12}")
+    for n in (100, 1000, 10000, 50000):
+        body = _corpo(n)
+        ta, pa = _medir(antes, body)
+        td, pd = _medir(depois, body)
+        print(f"{n:>12} {ta / n * 1e6:14.1f} {td / n * 1e6:15.1f} {pa / 1024:10.0f}KB {pd / 1024:10.0f}KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# bench/bench_sync.py — sync completo ponta a ponta contra o fake Bling local
+#   python -m bench.bench_sync [--registros 5000] [--cenarios limpo,latencia,falhas]
+#                              [--saida bench_sync.jsonl] [--comparar bench_sync.jsonl]
+# Mede por fase (completo pagar/receber, incremental) registros/s, requisições
+# emitidas (e 401/429/5xx vistos pelo servidor), tempo de parede e a divisão do
+# tempo do cliente (http/espera/token/decode/extract/db) vinda de sync_runs.
+import os, sys, json, time, argparse, tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from bench.fake_bling import Config, FakeBling
+
+CENARIOS = {
+    "limpo": dict(),
+    "latencia": dict(latencia_ms=40, jitter_ms=20),
+    "falhas": dict(latencia_ms=5, token_ttl=3, rate=40, falha_5xx=0.02),
+}
+
+TOLERANCIA = 0.20  # queda de registros/s acima disso conta como regressão
+
+
+def _env_inicial(tmp):
+    # antes de importar bling_api/database (lidos na importação)
+    os.environ.update({
+        "BLING_API_KEY": "",
+        "BLING_CLIENT_ID": "bench", "BLING_CLIENT_SECRET": "bench",
+        "BLING_ACCESS_TOKEN": "", "BLING_REFRESH_TOKEN": "refresh-inicial",
+        "BLING_TOKEN_STORE": os.path.join(tmp, "tokens.json"),
+        "BLING_DB_PATH": os.path.join(tmp, "bench.db"),
+        "BLING_V3_BASE": "http://127.0.0.1:1/Api/v3",
+        "BLING_METRICS_LOG": os.path.join(tmp, "metrics.jsonl"),
+    })
+    os.environ.setdefault("BLING_RATE_PER_SEC", "1000")
+    os.environ.setdefault("BLING_HTTP_RETRIES", "8")
+    os.environ.setdefault("BLING_CONTATOS_LOTE", "0")  # mede só os títulos
+
+
+def _preparar(bling_api, database, base_url, db_path):
+    """Zera o estado do cliente entre cenários (cada fake começa com tokens novos)."""
+    bling_api.V3_BASE = base_url
+    bling_api.TOKEN_URL = f"{base_url}/oauth/token"
+    bling_api.ACCESS_TOKEN = None
+    bling_api.REFRESH_TOKEN = "refresh-inicial"
+    bling_api._token_exp = None
+    bling_api.configure_http()
+    database.close_conn()
+    database.DB_PATH = db_path
+    database.migrate()
+
+
+def _fase(nome, fn, fake, bling_api):
+    antes_srv = fake.contadores.snapshot()
+    antes_cli = bling_api.http_stats()
+    t0 = time.perf_counter()
+    r = fn()
+    dt = time.perf_counter() - t0
+    depois_srv = fake.contadores.snapshot()
+    depois_cli = bling_api.http_stats()
+    delta = {k: depois_srv.get(k, 0) - antes_srv.get(k, 0) for k in depois_srv}
+    return {
+        "fase": nome,
+        "registros": r["vistos"],
+        "segundos": round(dt, 3),
+        "registros_s": round(r["vistos"] / dt, 1) if dt else 0.0,
+        "requisicoes": sum(v for k, v in delta.items() if k.startswith("/")),
+        "http_401": delta.get("401", 0),
+        "http_429": delta.get("429", 0),
+        "http_5xx": delta.get("5xx", 0),
+        "retries_cliente": depois_cli["retries"] - antes_cli["retries"],
+        "fases_s": r["metricas"]["fases_s"],
+        "http_ms": r["metricas"]["http_ms"],
+    }
+
+
+def rodar(cenario, registros, tmp):
+    from src.api import bling_api
+    from src.services import sync
+    import database
+
+    cfg = Config(pagar=registros, receber=registros, **CENARIOS[cenario])
+    fake = FakeBling(cfg).start()
+    try:
+        _preparar(bling_api, database, fake.base_url, os.path.join(tmp, f"{cenario}.db"))
+        fases = [
+            _fase("pagar_completo", lambda: sync.sync_contas_pagar(full=True), fake, bling_api),
+            _fase("receber_completo", lambda: sync.sync_contas_receber(full=True), fake, bling_api),
+        ]
+        fake.indexar()  # índice de datas dos filtros do fake: custo do servidor, fora da medição
+        fases += [
+            _fase("pagar_incremental", lambda: sync.sync_contas_pagar(), fake, bling_api),
+        ]
+    finally:
+        fake.stop()
+        database.close_conn()
+    return {"cenario": cenario, "registros": registros, "ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "fases": fases}
+
+
+def _imprimir(res):
+    print(f"\n== {res['cenario']} ({res['registros']} registros por tabela)")
+    print(f"{'fase':<20} {'registros':>9} {'tempo(s)':>9} {'reg/s':>9} {'req':>6} {'401':>5} {'429':>5} {'5xx':>5}")
+    for f in res["fases"]:
+        print(f"{f['fase']:<20} {f['registros']:>9} {f['segundos']:>9.2f} {f['registros_s']:>9.0f} "
+              f"{f['requisicoes']:>6} {f['http_401']:>5} {f['http_429']:>5} {f['http_5xx']:>5}")
+    print("tempo do cliente por fase (s):")
+    for f in res["fases"]:
+        fases = "  ".join(f"{k}={v:.2f}" for k, v in f.get("fases_s", {}).items())
+        print(f"  {f['fase']:<20} {fases}  http_ms={f.get('http_ms', {})}")
+
+
+def _comparar(res, arquivo):
+    """Compara com a última execução do mesmo cenário gravada em `arquivo`; True se regrediu."""
+    anterior = None
+    try:
+        for linha in Path(arquivo).read_text(encoding="utf-8").splitlines():
+            r = json.loads(linha)
+            if r["cenario"] == res["cenario"] and r["registros"] == res["registros"]:
+                anterior = r
+    except FileNotFoundError:
+        return False
+    if anterior is None:
+        return False
+    base = {f["fase"]: f for f in anterior["fases"]}
+    regrediu = False
+    for f in res["fases"]:
+        b = base.get(f["fase"])
+        if not b or not b["registros_s"]:
+            continue
+        var = f["registros_s"] / b["registros_s"] - 1
+        marca = "  !! regressão" if var < -TOLERANCIA else ""
+        regrediu |= bool(marca)
+        print(f"  {f['fase']:<20} {b['registros_s']:>9.0f} -> {f['registros_s']:>9.0f} reg/s ({var:+.0%}){marca}")
+    return regrediu
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark ponta a ponta do sync contra o fake Bling.")
+    ap.add_argument("--registros", type=int, default=5000)
+    ap.add_argument("--cenarios", default=",".join(CENARIOS))
+    ap.add_argument("--saida", help="acrescenta os resultados (JSON por linha) neste arquivo")
+    ap.add_argument("--comparar", help="compara com a última execução gravada neste arquivo")
+    a = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _env_inicial(tmp)
+        regrediu = False
+        for cenario in a.cenarios.split(","):
+            res = rodar(cenario, a.registros, tmp)
+            _imprimir(res)
+            if a.comparar:
+                regrediu |= _comparar(res, a.comparar)
+            if a.saida:
+                with open(a.saida, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(res, ensure_ascii=False) + "\n")
+    sys.exit(1 if regrediu else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# bench/bench_upsert.py — upsert_conta (1 conexão/commit por item) vs upsert_contas (1 transação por página)
+#   python -m bench.bench_upsert [n_itens]
+import os, sys, time, random, tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import database
+
+
+def _fake_items(n, seed=42):
+    rnd = random.Random(seed)
+    for i in range(n):
+        yield {
+            "id": 1000000 + i,
+            "numeroDocumento": f"NF-{i}",
+            "descricao": f"Titulo {i}",
+            "categoria": {"descricao": rnd.choice(["Aluguel", "Fornecedores", "Vendas"])},
+            "contato": {"id": rnd.randint(1, 500), "nome": f"Contato {rnd.randint(1, 500)}"},
+            "valor": round(rnd.uniform(10, 5000), 2),
+            "dataEmissao": "2025-01-01",
+            "dataVencimento": f"2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+            "situacao": rnd.choice(["ABERTA", "BAIXADA"]),
+        }
+
+
+def _run(label, fn, items):
+    t0 = time.perf_counter()
+    fn(items)
+    dt = time.perf_counter() - t0
+    print(f"{label:<32} {len(items):>8} itens  {dt:8.2f}s  {len(items) / dt:10.0f} linhas/s")
+
+
+def por_item(items):
+    for it in items:
+        database.upsert_conta("contas_pagar", it)
+
+
+def por_pagina(items, page=100):
+    for i in range(0, len(items), page):
+        database.upsert_contas("contas_pagar", items[i:i + page])
+    database.close_conn()
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    items = list(_fake_items(n))
+    with tempfile.TemporaryDirectory() as d:
+        for label, fn in (("upsert_conta (antes)", por_item), ("upsert_contas (depois)", por_pagina)):
+            database.DB_PATH = os.path.join(d, f"{fn.__name__}.db")
+            database.migrate()
+            _run(label + " insert", fn, items)
+            _run(label + " update", fn, items)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+# bench/fake_bling.py — servidor local que imita a API v3 do Bling (contas + oauth)
+#
+# Serve GET /Api/v3/contas/pagar, GET /Api/v3/contas/receber (e /{id}), GET /Api/v3/contatos/{id}
+# e POST /Api/v3/oauth/token
+# com quantidade de registros, latência, expiração de token (401), rate limit (429)
+# e falhas 5xx configuráveis (--resumo: listagem resumida, como a v3 real). Os registros são gerados de forma determinística pelo id,
+# sem manter nada em memória (com filtro de data na listagem, só os índices que passam, em cache).
+# Os filtros de data da v3 (dataEmissao*/dataPagamento*, ou tipoFiltroData + dataInicial/dataFinal)
+# são aplicados: o sync incremental recebe só a fatia da janela, como no Bling.
+#
+#   python -m bench.fake_bling --pagar 50000 --receber 50000 --latencia-ms 80 --rate 3
+#   BLING_V3_BASE=http://127.0.0.1:8765/Api/v3 python -m src.services.sync
+import sys, json, time, random, hashlib, argparse, threading, urllib.parse
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIXO = "/Api/v3"
+MAX_LIMIT = 100  # o Bling limita o tamanho de página em 100
+CONTATOS = 5000  # ids 900001..905000
+
+
+@dataclass
+class Config:
+    pagar: int = 10_000
+    receber: int = 10_000
+    latencia_ms: float = 0.0        # latência base por requisição
+    jitter_ms: float = 0.0          # + uniforme(0, jitter)
+    token_ttl: float = 3600.0       # s até o access token expirar (401)
+    rate: float = 0.0               # req/s permitidas (0 = sem limite); excesso -> 429
+    falha_5xx: float = 0.0          # probabilidade de 503 por requisição
+    seed: int = 42
+    resumo: bool = False            # listagem só com campos resumidos (detalhe completo por id)
+    referencia: date = None         # emissões no ano que termina nesta data (padrão: hoje)
+
+
+@dataclass
+class Contadores:
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    req: dict = field(default_factory=dict)
+
+    def inc(self, chave):
+        with self.lock:
+            self.req[chave] = self.req.get(chave, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.req)
+
+
+def _rnd(seed, tipo, i):
+    h = hashlib.blake2b(f"{seed}:{tipo}:{i}".encode(), digest_size=8).digest()
+    return random.Random(int.from_bytes(h, "big"))
+
+
+def gerar_item(tipo, i, seed=42, referencia=date(2025, 12, 31)):
+    """Registro no formato da listagem v3 de contas/{pagar,receber} (determinístico por id e referência)."""
+    rnd = _rnd(seed, tipo, i)
+    base = referencia - timedelta(days=364)
+    emissao = base + timedelta(days=rnd.randint(0, 364))
+    venc = emissao + timedelta(days=rnd.choice([0, 7, 14, 28, 30, 45, 60, 90]))
+    situacao = rnd.choices([1, 2, 3, 5], weights=[35, 55, 5, 5])[0]
+    contato = int(rnd.paretovariate(1.2)) % CONTATOS + 1
+    item = {
+        "id": (1 if tipo == "pagar" else 2) * 10_000_000 + i,
+        "situacao": situacao,
+        "vencimento": venc.isoformat(),
+        "valor": round(rnd.lognormvariate(6, 1.1), 2),
+        "dataEmissao": emissao.isoformat(),
+        "dataVencimento": venc.isoformat(),
+        "contato": {"id": 900000 + contato, "nome": f"Contato {contato}", "tipo": rnd.choice("FJ")},
+        "formaPagamento": {"id": rnd.randint(1, 6)},
+        "numeroDocumento": f"{rnd.randint(1, 999999):06d}",
+        "historico": f"Título {i}",
+    }
+    if situacao == 2:
+        item["dataPagamento"] = (venc + timedelta(days=rnd.randint(-5, 10))).isoformat()
+    return item
+
+
+# filtros de data da listagem v3 -> (campo do item, parâmetro inicial, parâmetro final)
+_FILTROS_DATA = (
+    ("dataEmissao", "dataEmissaoInicial", "dataEmissaoFinal"),
+    ("dataPagamento", "dataPagamentoInicial", "dataPagamentoFinal"),
+    ("dataVencimento", "dataVencimentoInicial", "dataVencimentoFinal"),
+)
+_TIPO_FILTRO_DATA = {"E": "dataEmissao", "P": "dataPagamento", "V": "dataVencimento"}
+
+
+def filtro_data(q):
+    """Query string (parse_qs) -> (campo, inicio, fim) ou None; datas ISO, extremos inclusive."""
+    def _p(nome):
+        return (q.get(nome) or [""])[0] or None
+    if _p("tipoFiltroData"):
+        campo = _TIPO_FILTRO_DATA.get(_p("tipoFiltroData").upper())
+        return (campo, _p("dataInicial"), _p("dataFinal")) if campo else None
+    for campo, ini, fim in _FILTROS_DATA:
+        if _p(ini) or _p(fim):
+            return campo, _p(ini), _p(fim)
+    return None
+
+
+_CAMPOS_RESUMO = ("id", "situacao", "vencimento", "valor", "dataVencimento")
+
+
+def _resumo(item):
+    """O que a listagem v3 devolve de fato: sem nome do contato, documento, histórico etc."""
+    r = {k: item[k] for k in _CAMPOS_RESUMO if k in item}
+    r["contato"] = {"id": item["contato"]["id"]}
+    return r
+
+
+class _Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # cliente fechou a conexão keep-alive (fim do pool/stream): não é erro do fake
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class FakeBling:
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or Config()
+        self.contadores = Contadores()
+        self._tokens = {}           # access_token -> expira_em
+        self._refresh = {"refresh-inicial"}
+        self._lock = threading.Lock()
+        self._janela = []           # timestamps das últimas requisições (rate limit)
+        self._rand = random.Random(self.config.seed)
+        self.referencia = self.config.referencia or date.today()
+        self._datas = {}            # tipo -> {campo de data: [valor por índice]} (ver indexar)
+        self._filtrados = {}        # (tipo, filtro) -> índices que passam
+        self.httpd = _Servidor((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{PREFIXO}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    # --- regras ---
+    def _limitado(self):
+        if self.config.rate <= 0:
+            return False
+        agora = time.monotonic()
+        with self._lock:
+            self._janela = [t for t in self._janela if agora - t < 1.0]
+            if len(self._janela) >= self.config.rate:
+                return True
+            self._janela.append(agora)
+            return False
+
+    def _falha(self):
+        if self.config.falha_5xx <= 0:
+            return False
+        with self._lock:
+            return self._rand.random() < self.config.falha_5xx
+
+    def _token_ok(self, auth):
+        tok = auth[7:] if auth and auth.startswith("Bearer ") else None
+        with self._lock:
+            exp = self._tokens.get(tok)
+        return exp is not None and time.time() < exp
+
+    def emitir_token(self, refresh):
+        with self._lock:
+            if refresh not in self._refresh:
+                return None
+            self._refresh.discard(refresh)
+            n = len(self._tokens) + 1
+            access, novo_refresh = f"access-{n}", f"refresh-{n}"
+            self._tokens[access] = time.time() + self.config.token_ttl
+            self._refresh.add(novo_refresh)
+        return {"access_token": access, "refresh_token": novo_refresh,
+                "expires_in": int(self.config.token_ttl), "token_type": "Bearer"}
+
+    def _item(self, tipo, i):
+        return gerar_item(tipo, i, self.config.seed, self.referencia)
+
+    def indexar(self, tipos=("pagar", "receber")):
+        """Datas de todos os itens, por tipo e campo (feito uma vez; o bench chama fora da medição)."""
+        for tipo in tipos:
+            with self._lock:
+                if tipo in self._datas:
+                    continue
+                total = self.config.pagar if tipo == "pagar" else self.config.receber
+                itens = [self._item(tipo, i) for i in range(total)]
+                self._datas[tipo] = {campo: [x.get(campo) for x in itens] for campo, _, _ in _FILTROS_DATA}
+
+    def _indices(self, tipo, filtro):
+        if filtro is None:
+            return range(self.config.pagar if tipo == "pagar" else self.config.receber)
+        chave = (tipo, filtro)
+        with self._lock:
+            idx = self._filtrados.get(chave)
+        if idx is None:
+            self.indexar((tipo,))
+            campo, ini, fim = filtro
+            idx = [i for i, d in enumerate(self._datas[tipo][campo])
+                   if d and (ini is None or d >= ini) and (fim is None or d <= fim)]
+            with self._lock:
+                self._filtrados[chave] = idx
+        return idx
+
+    def pagina(self, tipo, page, limit, filtro=None):
+        limit = max(1, min(limit, MAX_LIMIT))
+        ini = (page - 1) * limit
+        itens = [self._item(tipo, i) for i in self._indices(tipo, filtro)[ini:ini + limit]]
+        return [_resumo(x) for x in itens] if self.config.resumo else itens
+
+    def detalhe(self, tipo, id_bling):
+        """Título por id (GET contas/{tipo}/{id}); None se fora do intervalo gerado."""
+        total = self.config.pagar if tipo == "pagar" else self.config.receber
+        try:
+            i = int(id_bling) - (1 if tipo == "pagar" else 2) * 10_000_000
+        except ValueError:
+            return None
+        return self._item(tipo, i) if 0 <= i < total else None
+
+    def contato(self, id_bling):
+        """Contato por id (GET contatos/{id}); None se fora do intervalo gerado."""
+        try:
+            n = int(id_bling) - 900000
+        except ValueError:
+            return None
+        if not 1 <= n <= CONTATOS:
+            return None
+        return {"id": 900000 + n, "nome": f"Contato {n}", "numeroDocumento": f"{n:014d}",
+                "tipo": "J" if n % 2 else "F", "situacao": "A"}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, como o Bling
+
+            def log_message(self, fmt, *args):  # silencia logs chatos
+                return
+
+            def _send_json(self, obj, status=200, headers=None):
+                body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _atraso(self):
+                c = fake.config
+                if c.latencia_ms or c.jitter_ms:
+                    time.sleep((c.latencia_ms + random.uniform(0, c.jitter_ms)) / 1000)
+
+            def _barreiras(self, chave):
+                fake.contadores.inc(chave)
+                self._atraso()
+                if fake._limitado():
+                    fake.contadores.inc("429")
+                    self._send_json({"error": {"type": "TOO_MANY_REQUESTS"}}, 429, {"Retry-After": "1"})
+                    return False
+                if fake._falha():
+                    fake.contadores.inc("5xx")
+                    self._send_json({"error": {"type": "SERVICE_UNAVAILABLE"}}, 503)
+                    return False
+                return True
+
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                rota = url.path[len(PREFIXO):] if url.path.startswith(PREFIXO) else url.path
+                if rota.startswith("/contatos/"):
+                    base, id_ = "/contatos", rota[len("/contatos/"):]
+                else:
+                    base, _, id_ = rota.rpartition("/") if rota.count("/") == 3 else (rota, "", "")
+                tipo = {"/contas/pagar": "pagar", "/contas/receber": "receber", "/contatos": "contatos"}.get(base)
+                if tipo is None or (tipo == "contatos" and not id_):
+                    return self._send_json({"error": {"type": "RESOURCE_NOT_FOUND"}}, 404)
+                if not self._barreiras(base if id_ else rota):
+                    return
+                if not fake._token_ok(self.headers.get("Authorization")):
+                    fake.contadores.inc("401")
+                    return self._send_json({"error": {"type": "invalid_token"}}, 401)
+                if id_:
+                    item = fake.contato(id_) if tipo == "contatos" else fake.detalhe(tipo, id_)
+                    if item is None:
+                        return self._send_json({"error": {"type": "RESOURCE_NOT_FOUND"}}, 404)
+                    return self._send_json({"data": item})
+                q = urllib.parse.parse_qs(url.query)
+                page = int(q.get("page", ["1"])[0])
+                limit = int(q.get("limit", ["100"])[0])
+                self._send_json({"data": fake.pagina(tipo, page, limit, filtro_data(q))})
+
+            def do_POST(self):
+                url = urllib.parse.urlparse(self.path)
+                if not url.path.endswith("/oauth/token"):
+                    return self._send_json({"error": {"type": "RESOURCE_NOT_FOUND"}}, 404)
+                n = int(self.headers.get("Content-Length") or 0)
+                form = urllib.parse.parse_qs(self.rfile.read(n).decode("utf-8"))
+                if not self._barreiras("/oauth/token"):
+                    return
+                tok = fake.emitir_token(form.get("refresh_token", [""])[0])
+                if tok is None:
+                    return self._send_json({"error": "invalid_grant"}, 400)
+                self._send_json(tok)
+
+        return Handler
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Servidor local que imita a API v3 do Bling.")
+    ap.add_argument("--porta", type=int, default=8765)
+    ap.add_argument("--pagar", type=int, default=Config.pagar)
+    ap.add_argument("--receber", type=int, default=Config.receber)
+    ap.add_argument("--latencia-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--token-ttl", type=float, default=3600.0)
+    ap.add_argument("--rate", type=float, default=0.0, help="req/s antes de responder 429 (0 = sem limite)")
+    ap.add_argument("--falha-5xx", type=float, default=0.0, help="probabilidade de 503 por requisição")
+    ap.add_argument("--resumo", action="store_true", help="listagem resumida (para testar sync --hidratar)")
+    a = ap.parse_args()
+    cfg = Config(a.pagar, a.receber, a.latencia_ms, a.jitter_ms, a.token_ttl, a.rate, a.falha_5xx,
+                 resumo=a.resumo)
+    fake = FakeBling(cfg, port=a.porta)
+    print(f" Fake Bling em {fake.base_url} (refresh token inicial: refresh-inicial)")
+    try:
+        fake.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
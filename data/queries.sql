@@ -1,25 +1,29 @@
+-- Filtros em situacao_cod/vencimento (colunas normalizadas e indexadas).
+-- Não envolva as colunas em date()/LIKE: isso impede o uso dos índices.
+
 -- Total a pagar HOJE (abertas)
 SELECT IFNULL(SUM(valor), 0) AS total_hoje
 FROM contas_pagar
-WHERE situacao LIKE 'ABER%' AND date(data_vencimento) = date('now');
+WHERE situacao_cod = 'ABERTO' AND vencimento = date('now');
 
 -- Total a receber HOJE (abertas)
 SELECT IFNULL(SUM(valor), 0) AS total_hoje
 FROM contas_receber
-WHERE situacao LIKE 'ABER%' AND date(data_vencimento) = date('now');
+WHERE situacao_cod = 'ABERTO' AND vencimento = date('now');
 
--- Quem está me devendo (abertas e vencidas)
-SELECT contato_nome, SUM(valor) AS total_devedor
-FROM contas_receber
-WHERE situacao LIKE 'ABER%' AND date(data_vencimento) < date('now')
-GROUP BY contato_nome
+-- Quem está me devendo (abertas e vencidas), por contato (homônimos não se misturam)
+SELECT c.id_bling AS contato_id, c.nome AS contato_nome, SUM(t.valor) AS total_devedor
+FROM contas_receber t
+LEFT JOIN contatos c ON c.id = t.contato_ref
+WHERE t.situacao_cod = 'ABERTO' AND t.vencimento < date('now')
+GROUP BY t.contato_ref
 ORDER BY total_devedor DESC;
 
 -- Resumo por período (últimos 7 dias)
 SELECT 'pagar' AS tipo, IFNULL(SUM(valor),0) AS total
 FROM contas_pagar
-WHERE date(data_vencimento) BETWEEN date('now','-6 day') AND date('now')
+WHERE vencimento BETWEEN date('now','-6 day') AND date('now') AND excluido_em IS NULL
 UNION ALL
 SELECT 'receber', IFNULL(SUM(valor),0)
 FROM contas_receber
-WHERE date(data_vencimento) BETWEEN date('now','-6 day') AND date('now');
+WHERE vencimento BETWEEN date('now','-6 day') AND date('now') AND excluido_em IS NULL;
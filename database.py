@@ -1,8 +1,10 @@
 # database.py — versão SQLite pura (sem SQLAlchemy, sem models.py)
-import sqlite3, json, os
+import sqlite3, json, os, zlib, threading
 from pathlib import Path
 from datetime import datetime
 
+from src.core import metrics
+
 DB_PATH = os.getenv("BLING_DB_PATH", "bling.db")
 
 def _conn():
@@ -22,6 +24,23 @@ def _recreate_if_corrupted():
     except Exception:
         pass
 
+def _add_column(cur, tabela, coluna, tipo):
+    """Adiciona a coluna se não existir. Retorna True se adicionou."""
+    cols = {r[1] for r in cur.execute(f"PRAGMA table_info({tabela})")}
+    if coluna in cols:
+        return False
+    cur.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}")
+    return True
+
+# --------- Normalização (colunas usadas nos filtros dos relatórios) ---------
+# normalizadores e mapeamento de campos ficam em src/core/campos.py (extrator compilado)
+from src.core.campos import _norm_data, _norm_situacao, COLS as _COLS, I_ID, I_HASH, extrator
+
+def _backfill_normalizados(con, tabela):
+    con.create_function("norm_data", 1, _norm_data, deterministic=True)
+    con.create_function("norm_situacao", 1, _norm_situacao, deterministic=True)
+    con.execute(f"UPDATE {tabela} SET vencimento = norm_data(data_vencimento), situacao_cod = norm_situacao(situacao)")
+
 def migrate():
     """Cria tabelas e índices. Se o arquivo estiver corrompido, recria."""
     _ensure_dir()
@@ -36,15 +55,18 @@ def migrate():
             numero_documento TEXT,
             descricao TEXT,
             categoria TEXT,
-            contato_id TEXT,
-            contato_nome TEXT,
+            contato_ref INTEGER,    -- contatos.id (nome/documento ficam só em `contatos`)
             valor REAL,
             data_emissao TEXT,
             data_vencimento TEXT,
             data_pagamento TEXT,
             situacao TEXT,
             status TEXT,
-            raw_json TEXT,
+            content_hash TEXT,
+            vencimento TEXT,        -- data_vencimento normalizada (YYYY-MM-DD)
+            situacao_cod TEXT,      -- situacao normalizada (ABERTO/PAGO/PARCIAL/CANCELADO/.../EXCLUIDO)
+            sync_gen INTEGER,       -- geração do último sync que viu o título
+            excluido_em TEXT,       -- soft delete: sumiu do Bling num sync completo
             created_at TEXT DEFAULT (datetime('now')),
             updated_at TEXT DEFAULT (datetime('now'))
         );
@@ -57,78 +79,787 @@ def migrate():
             numero_documento TEXT,
             descricao TEXT,
             categoria TEXT,
-            contato_id TEXT,
-            contato_nome TEXT,
+            contato_ref INTEGER,    -- contatos.id (nome/documento ficam só em `contatos`)
             valor REAL,
             data_emissao TEXT,
             data_vencimento TEXT,
             data_pagamento TEXT,
             situacao TEXT,
             status TEXT,
-            raw_json TEXT,
+            content_hash TEXT,
+            vencimento TEXT,        -- data_vencimento normalizada (YYYY-MM-DD)
+            situacao_cod TEXT,      -- situacao normalizada (ABERTO/PAGO/PARCIAL/CANCELADO/.../EXCLUIDO)
+            sync_gen INTEGER,       -- geração do último sync que viu o título
+            excluido_em TEXT,       -- soft delete: sumiu do Bling num sync completo
             created_at TEXT DEFAULT (datetime('now')),
             updated_at TEXT DEFAULT (datetime('now'))
         );
         """)
 
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_pagar_venc ON contas_pagar(data_vencimento);")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_receber_venc ON contas_receber(data_vencimento);")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_pagar_sit ON contas_pagar(situacao);")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_receber_sit ON contas_receber(situacao);")
+        # bancos antigos: colunas adicionadas depois
+        for tabela in ("contas_pagar", "contas_receber"):
+            _add_column(cur, tabela, "content_hash", "TEXT")
+            if _add_column(cur, tabela, "vencimento", "TEXT") | _add_column(cur, tabela, "situacao_cod", "TEXT"):
+                _backfill_normalizados(con, tabela)
+            _add_column(cur, tabela, "sync_gen", "INTEGER")
+            _add_column(cur, tabela, "excluido_em", "TEXT")
+        _migrate_contatos(cur)
+
+        # índices antigos em data_vencimento/situacao não servem para os relatórios
+        for idx in ("idx_pagar_venc", "idx_receber_venc", "idx_pagar_sit", "idx_receber_sit"):
+            cur.execute(f"DROP INDEX IF EXISTS {idx};")
+        # (situacao_cod, vencimento, ..., valor): filtro por igualdade/intervalo e SUM/GROUP BY sem tocar a tabela
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_pagar_sit_venc ON contas_pagar(situacao_cod, vencimento, valor);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_receber_sit_venc ON contas_receber(situacao_cod, vencimento, contato_ref, valor);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_pagar_vencimento ON contas_pagar(vencimento, valor);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_receber_vencimento ON contas_receber(vencimento, valor);")
+
+        _migrate_agregados(cur)
+        convertido = _migrate_raw(cur)
+
+        # high-water mark do sync incremental, por recurso (contas_pagar/contas_receber)
+        # geracao: contador de syncs completos (mark-and-sweep de exclusões)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS sync_state (
+            recurso TEXT PRIMARY KEY,
+            ultima_sync TEXT,
+            cursor TEXT,
+            geracao INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT DEFAULT (datetime('now'))
+        );
+        """)
+        _add_column(cur, "sync_state", "geracao", "INTEGER NOT NULL DEFAULT 0")
+
+        # histórico de execuções do sync (instrumentação por fase em `metricas`, JSON)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS sync_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            recurso TEXT,
+            modo TEXT,
+            status TEXT,
+            inicio TEXT,
+            fim TEXT,
+            duracao_s REAL,
+            registros_s REAL,
+            paginas INTEGER,
+            bytes INTEGER,
+            requisicoes INTEGER,
+            retries INTEGER,
+            inseridos INTEGER,
+            atualizados INTEGER,
+            inalterados INTEGER,
+            metricas TEXT
+        );
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_sync_runs_recurso ON sync_runs(recurso, id);")
+
+        # checkpoint por página do sync em andamento (gravado na mesma transação da página)
+        # plano: JSON da lista de filtros; etapa: índice do filtro; pagina: última página gravada
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS sync_checkpoint (
+            recurso TEXT PRIMARY KEY,
+            plano TEXT NOT NULL,
+            etapa INTEGER NOT NULL,
+            pagina INTEGER NOT NULL,
+            geracao INTEGER,
+            inicio TEXT,
+            contadores TEXT,
+            updated_at TEXT DEFAULT (datetime('now'))
+        );
+        """)
+
+        # detalhe (GET contas/{tipo}/{id}) já buscado, por id e versão do resumo da listagem:
+        # título inalterado na listagem não gera nova busca (ver src/services/detalhes.py)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS detalhe_cache (
+            tabela TEXT NOT NULL,
+            id_bling TEXT NOT NULL,
+            versao TEXT NOT NULL,   -- hash do item da listagem
+            payload BLOB NOT NULL,  -- resumo + detalhe, comprimido como em {tabela}_raw
+            buscado_em TEXT DEFAULT (datetime('now')),
+            PRIMARY KEY (tabela, id_bling)
+        ) WITHOUT ROWID;
+        """)
 
         con.commit(); con.close()
+        if convertido:
+            # devolve ao SO o espaço do raw_json antigo (uma vez, na conversão)
+            con = _conn(); con.execute("VACUUM"); con.close()
     except sqlite3.DatabaseError:
         # arquivo não é DB válido -> renomeia e tenta novamente
         _recreate_if_corrupted()
         con = _conn(); con.close()
         return migrate()
 
-def _extract(item: dict):
-    contato = item.get("contato") or {}
-    categoria = item.get("categoria")
-    categoria_desc = categoria.get("descricao") if isinstance(categoria, dict) else (categoria or "")
-    return {
-        "id_bling": str(item.get("id") or item.get("numero") or ""),
-        "numero_documento": item.get("numeroDocumento") or item.get("numero") or "",
-        "descricao": item.get("descricao") or item.get("historico") or "",
-        "categoria": categoria_desc,
-        "contato_id": str(contato.get("id") or ""),
-        "contato_nome": contato.get("nome") or "",
-        "valor": float(item.get("valor") or 0),
-        "data_emissao": item.get("dataEmissao") or item.get("data") or "",
-        "data_vencimento": item.get("dataVencimento") or "",
-        "data_pagamento": item.get("dataPagamento") or "",
-        "situacao": item.get("situacao") or item.get("situacaoTitulo") or "",
-        "status": item.get("status") or "",
-        "raw_json": json.dumps(item, ensure_ascii=False),
-    }
+# --------- Contatos (dimensão) ---------
+# Os títulos guardam só contato_ref (contatos.id, inteiro); id do Bling, nome, documento
+# e tipo ficam uma vez por contato. O sync cria/atualiza o contato com o que vem no título;
+# src/services/contatos.py completa pela API (buscado_em = última busca, para o TTL).
+def _migrate_contatos(cur):
+    """Cria `contatos` e, em bancos antigos, move contato_id/contato_nome dos títulos para lá."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS contatos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_bling TEXT UNIQUE NOT NULL,
+        nome TEXT,
+        documento TEXT,
+        tipo TEXT,
+        buscado_em TEXT,        -- última busca em contatos/{id} (NULL = só o que veio nos títulos)
+        created_at TEXT DEFAULT (datetime('now')),
+        updated_at TEXT DEFAULT (datetime('now'))
+    );
+    """)
+    antigas = [t for t in _TIPOS if "contato_ref" not in {r[1] for r in cur.execute(f"PRAGMA table_info({t})")}]
+    if not antigas:
+        return
+    con = cur.connection
+    if not con.in_transaction:
+        cur.execute("BEGIN")  # conversão inteira ou nada (o sqlite3 não abre transação antes de DDL)
+    for tabela in antigas:
+        cur.execute(f"ALTER TABLE {tabela} ADD COLUMN contato_ref INTEGER")
+        # nome do título alterado por último (coluna solta + MAX(): linha do máximo no SQLite)
+        cur.execute(f"""
+        INSERT OR IGNORE INTO contatos (id_bling, nome)
+        SELECT contato_id, nome FROM (
+            SELECT contato_id, IFNULL(contato_nome, '') AS nome, MAX(updated_at)
+            FROM {tabela} WHERE contato_id != '' GROUP BY contato_id)
+        """)
+        cur.execute(f"""
+        UPDATE {tabela} SET contato_ref = (SELECT id FROM contatos WHERE contatos.id_bling = {tabela}.contato_id)
+        WHERE contato_id != ''
+        """)
+    # agregados e índice por nome saem; _migrate_agregados recria por contato_ref
+    for nome, in cur.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_%_agg_%'").fetchall():
+        cur.execute(f"DROP TRIGGER {nome}")
+    cur.execute("DROP TABLE IF EXISTS agg_contato")
+    cur.execute("DROP INDEX IF EXISTS idx_receber_sit_venc")
+    for tabela in antigas:
+        for coluna in ("contato_id", "contato_nome"):
+            try:
+                cur.execute(f"ALTER TABLE {tabela} DROP COLUMN {coluna}")  # SQLite >= 3.35
+            except sqlite3.OperationalError:
+                cur.execute(f"UPDATE {tabela} SET {coluna} = NULL")
 
-def upsert_conta(tabela: str, item: dict):
-    data = _extract(item)
-    q = f"""
-    INSERT INTO {tabela} (
-        id_bling, numero_documento, descricao, categoria, contato_id, contato_nome,
-        valor, data_emissao, data_vencimento, data_pagamento, situacao, status, raw_json, updated_at
-    ) VALUES (
-        :id_bling, :numero_documento, :descricao, :categoria, :contato_id, :contato_nome,
-        :valor, :data_emissao, :data_vencimento, :data_pagamento, :situacao, :status, :raw_json, datetime('now')
-    )
-    ON CONFLICT(id_bling) DO UPDATE SET
-        numero_documento=excluded.numero_documento,
-        descricao=excluded.descricao,
-        categoria=excluded.categoria,
-        contato_id=excluded.contato_id,
-        contato_nome=excluded.contato_nome,
-        valor=excluded.valor,
-        data_emissao=excluded.data_emissao,
-        data_vencimento=excluded.data_vencimento,
-        data_pagamento=excluded.data_pagamento,
-        situacao=excluded.situacao,
-        status=excluded.status,
-        raw_json=excluded.raw_json,
-        updated_at=datetime('now');
+# --------- Agregados (mantidos por triggers) ---------
+# agg_vencimento: (tipo, vencimento, situacao_cod) -> total/qtd   [relatórios por dia]
+# agg_contato:    (tipo, contato_ref, situacao_cod) -> total/qtd  [devedores; 0 = sem contato]
+# Títulos sem vencimento ficam fora dos agregados (os relatórios também os ignoram).
+_TIPOS = {"contas_pagar": "pagar", "contas_receber": "receber"}
+
+def _agg_sql(tipo, row, sinal):
+    return f"""
+        INSERT INTO agg_vencimento (tipo, vencimento, situacao_cod, total, qtd)
+        VALUES ('{tipo}', {row}.vencimento, IFNULL({row}.situacao_cod, ''), {sinal}IFNULL({row}.valor, 0), {sinal}1)
+        ON CONFLICT(tipo, vencimento, situacao_cod) DO UPDATE SET
+            total = total + excluded.total, qtd = qtd + excluded.qtd;
+        INSERT INTO agg_contato (tipo, contato_ref, situacao_cod, total, qtd)
+        VALUES ('{tipo}', IFNULL({row}.contato_ref, 0), IFNULL({row}.situacao_cod, ''), {sinal}IFNULL({row}.valor, 0), {sinal}1)
+        ON CONFLICT(tipo, contato_ref, situacao_cod) DO UPDATE SET
+            total = total + excluded.total, qtd = qtd + excluded.qtd;
+    """
+
+def _migrate_agregados(cur):
+    novo = cur.execute("SELECT COUNT(*) FROM sqlite_master WHERE name IN ('agg_vencimento', 'agg_contato')").fetchone()[0] < 2
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS agg_vencimento (
+        tipo TEXT NOT NULL, vencimento TEXT NOT NULL, situacao_cod TEXT NOT NULL,
+        total REAL NOT NULL DEFAULT 0, qtd INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (tipo, vencimento, situacao_cod)
+    ) WITHOUT ROWID;
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS agg_contato (
+        tipo TEXT NOT NULL, contato_ref INTEGER NOT NULL, situacao_cod TEXT NOT NULL,
+        total REAL NOT NULL DEFAULT 0, qtd INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (tipo, contato_ref, situacao_cod)
+    ) WITHOUT ROWID;
+    """)
+    for tabela, tipo in _TIPOS.items():
+        cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{tipo}_agg_ins AFTER INSERT ON {tabela}
+        WHEN NEW.vencimento IS NOT NULL
+        BEGIN {_agg_sql(tipo, "NEW", "")} END;
+        """)
+        cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{tipo}_agg_del AFTER DELETE ON {tabela}
+        WHEN OLD.vencimento IS NOT NULL
+        BEGIN {_agg_sql(tipo, "OLD", "-")} END;
+        """)
+        # UPDATE = remove a contribuição antiga e soma a nova (só se mudou algo relevante)
+        for parte, row, sinal in (("old", "OLD", "-"), ("new", "NEW", "")):
+            cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{tipo}_agg_upd_{parte}
+            AFTER UPDATE OF valor, vencimento, situacao_cod, contato_ref ON {tabela}
+            WHEN {row}.vencimento IS NOT NULL
+            BEGIN {_agg_sql(tipo, row, sinal)} END;
+            """)
+    if novo:
+        rebuild_agregados(cur)
+
+def _recompute_sql():
+    partes_v, partes_c = [], []
+    for tabela, tipo in _TIPOS.items():
+        partes_v.append(f"""
+            SELECT '{tipo}' AS tipo, vencimento, IFNULL(situacao_cod, '') AS situacao_cod,
+                   SUM(IFNULL(valor, 0)) AS total, COUNT(*) AS qtd
+            FROM {tabela} WHERE vencimento IS NOT NULL
+            GROUP BY vencimento, IFNULL(situacao_cod, '')""")
+        partes_c.append(f"""
+            SELECT '{tipo}' AS tipo, IFNULL(contato_ref, 0) AS contato_ref, IFNULL(situacao_cod, '') AS situacao_cod,
+                   SUM(IFNULL(valor, 0)) AS total, COUNT(*) AS qtd
+            FROM {tabela} WHERE vencimento IS NOT NULL
+            GROUP BY IFNULL(contato_ref, 0), IFNULL(situacao_cod, '')""")
+    return " UNION ALL ".join(partes_v), " UNION ALL ".join(partes_c)
+
+def rebuild_agregados(cur=None):
+    """Recalcula agg_vencimento/agg_contato do zero a partir das tabelas de títulos."""
+    con = None
+    if cur is None:
+        con = _conn(); cur = con.cursor()
+    q_venc, q_cont = _recompute_sql()
+    cur.execute("DELETE FROM agg_vencimento")
+    cur.execute("DELETE FROM agg_contato")
+    cur.execute(f"INSERT INTO agg_vencimento (tipo, vencimento, situacao_cod, total, qtd) {q_venc}")
+    cur.execute(f"INSERT INTO agg_contato (tipo, contato_ref, situacao_cod, total, qtd) {q_cont}")
+    if con is not None:
+        con.commit(); con.close()
+
+def checar_agregados(tolerancia=0.005):
+    """
+    Compara os agregados com um recálculo completo.
+    Retorna lista de divergências [(tabela, chave, (total, qtd) agregado, (total, qtd) recalculado)].
     """
     con = _conn()
-    con.execute(q, data)
-    con.commit()
+    q_venc, q_cont = _recompute_sql()
+    divergencias = []
+    for agg, chaves, q in (("agg_vencimento", "tipo, vencimento, situacao_cod", q_venc),
+                           ("agg_contato", "tipo, contato_ref, situacao_cod", q_cont)):
+        n = len(chaves.split(","))
+        atual = {r[:n]: r[n:] for r in con.execute(f"SELECT {chaves}, total, qtd FROM {agg} WHERE qtd != 0")}
+        esperado = {r[:n]: r[n:] for r in con.execute(q)}
+        for k in atual.keys() | esperado.keys():
+            a, e = atual.get(k, (0.0, 0)), esperado.get(k, (0.0, 0))
+            if a[1] != e[1] or abs(a[0] - e[0]) > tolerancia:
+                divergencias.append((agg, k, a, e))
     con.close()
+    return divergencias
+
+# --------- Payload bruto (comprimido, fora da linha quente) ---------
+# {tabela}_raw guarda o JSON original comprimido por id_bling; as tabelas de
+# títulos ficam só com as colunas usadas em filtros/relatórios, e scans ficam menores.
+# Formato: 1 byte de versão + deflate com dicionário pré-definido (payloads pequenos
+# repetem sempre as mesmas chaves; o dicionário quase dobra a compressão).
+RAW_ZLIB_LEVEL = 6
+_RAW_V1 = b"\x01"
+_RAW_ZDICT_V1 = (
+    b'{"id": , "situacao": , "vencimento": "", "valor": , "saldo": , "idTransacao": "", '
+    b'"linkQRCodePix": "", "linkBoleto": "", "dataEmissao": "", "dataVencimento": "", '
+    b'"dataVencimentoOriginal": "", "dataPagamento": "", "competencia": "", "numeroDocumento": "", '
+    b'"historico": "", "descricao": "", "contato": {"id": , "nome": "", "numeroDocumento": "", "tipo": "J"}, '
+    b'"formaPagamento": {"id": , "codigoFiscal": , "descricao": ""}, "contaContabil": {"id": , "descricao": ""}, '
+    b'"categoria": {"id": , "descricao": ""}, "portador": {"id": }, "vendedor": {"id": }, '
+    b'"ocorrencia": {"tipo": , "considerarDiasUteis": false, "diaVencimento": , "numeroParcelas": }, '
+    b'"origem": {"id": , "tipoOrigem": "", "numero": "", "dataEmissao": "", "valor": , "url": ""}}'
+)
+
+def _compress(raw: str) -> bytes:
+    c = zlib.compressobj(RAW_ZLIB_LEVEL, zlib.DEFLATED, -15, zdict=_RAW_ZDICT_V1)
+    return _RAW_V1 + c.compress(raw.encode("utf-8")) + c.flush()
+
+def _decompress(blob: bytes) -> str:
+    if blob[:1] == _RAW_V1:
+        d = zlib.decompressobj(-15, zdict=_RAW_ZDICT_V1)
+        return (d.decompress(blob[1:]) + d.flush()).decode("utf-8")
+    return zlib.decompress(blob).decode("utf-8")
+
+def _migrate_raw(cur, chunk=5000):
+    """Cria {tabela}_raw e converte o raw_json inline de bancos antigos. Retorna True se converteu."""
+    convertido = False
+    for tabela in _TIPOS:
+        cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {tabela}_raw (
+            id_bling TEXT PRIMARY KEY,
+            raw BLOB NOT NULL
+        );
+        """)
+        cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{tabela}_raw_del AFTER DELETE ON {tabela}
+        BEGIN DELETE FROM {tabela}_raw WHERE id_bling = OLD.id_bling; END;
+        """)
+        cols = {r[1] for r in cur.execute(f"PRAGMA table_info({tabela})")}
+        if "raw_json" not in cols:
+            continue
+        ultimo = 0
+        while True:
+            rows = cur.execute(f"""
+                SELECT id, id_bling, raw_json FROM {tabela}
+                WHERE id > ? AND raw_json IS NOT NULL ORDER BY id LIMIT ?""", (ultimo, chunk)).fetchall()
+            if not rows:
+                break
+            cur.executemany(f"INSERT OR REPLACE INTO {tabela}_raw (id_bling, raw) VALUES (?, ?)",
+                            [(id_bling, _compress(raw)) for _, id_bling, raw in rows])
+            ultimo = rows[-1][0]
+            convertido = True
+        try:
+            cur.execute(f"ALTER TABLE {tabela} DROP COLUMN raw_json")  # SQLite >= 3.35
+            convertido = True
+        except sqlite3.OperationalError:
+            cur.execute(f"UPDATE {tabela} SET raw_json = NULL WHERE raw_json IS NOT NULL")
+            convertido = convertido or cur.rowcount > 0
+    return convertido
+
+def get_raw_json(tabela: str, id_bling: str, con=None):
+    """Payload original do título (dict), descomprimido só quando pedido; None se não existir."""
+    con = con or get_conn()
+    row = con.execute(f"SELECT raw FROM {tabela}_raw WHERE id_bling = ?", (str(id_bling),)).fetchone()
+    return json.loads(_decompress(row[0])) if row else None
+
+def _extract(item: dict, raw: str = None):
+    """
+    Compatibilidade: linha como dict (inclui raw_json). No caminho de gravação use
+    extrator(versao), que devolve (valores, raw) sem montar dict.
+    """
+    valores, raw = extrator("v2")(item, raw)  # v2 = cadeia de fallbacks completa
+    data = dict(zip(_COLS, valores))
+    data["raw_json"] = raw
+    return data
+
+# contato_id/contato_nome saem do extrator mas vão para `contatos`; o título grava
+# contato_ref. Parâmetros numerados (?N = COLS[N-1]): o executemany usa a mesma tupla.
+_COLS_CONTATO = ("contato_id", "contato_nome")
+_COLS_TITULO = tuple(c for c in _COLS if c not in _COLS_CONTATO)
+I_CONTATO_ID = _COLS.index("contato_id")
+I_CONTATO_NOME = _COLS.index("contato_nome")
+
+def _upsert_sql(tabela: str, geracao=None) -> str:
+    """
+    Upsert de uma tupla do extrator. Com `geracao`, o título novo já entra com sync_gen
+    (os existentes são carimbados na leitura dos hashes, ver _existing_hashes).
+    """
+    cols = ", ".join(_COLS_TITULO)
+    vals = ", ".join(f"?{_COLS.index(c) + 1}" for c in _COLS_TITULO)
+    ref = f"(SELECT id FROM contatos WHERE id_bling = NULLIF(?{I_CONTATO_ID + 1}, ''))"
+    sets = ",\n        ".join(f"{c}=excluded.{c}" for c in _COLS_TITULO + ("contato_ref",) if c != "id_bling")
+    gen = "NULL" if geracao is None else str(int(geracao))
+    return f"""
+    INSERT INTO {tabela} ({cols}, contato_ref, sync_gen, updated_at)
+    VALUES ({vals}, {ref}, {gen}, datetime('now'))
+    ON CONFLICT(id_bling) DO UPDATE SET
+        {sets},
+        excluido_em=NULL,
+        updated_at=datetime('now')
+    WHERE {tabela}.content_hash IS NOT excluded.content_hash;
+    """
+
+_SQL_CONTATO = """
+INSERT INTO contatos (id_bling, nome) VALUES (?, ?)
+ON CONFLICT(id_bling) DO UPDATE SET nome=excluded.nome, updated_at=datetime('now')
+WHERE contatos.buscado_em IS NULL AND excluded.nome != '' AND contatos.nome IS NOT excluded.nome;
+"""
+
+def _gravar_contatos(con, valores):
+    """
+    Contatos dos títulos (tuplas do extrator) em `contatos`, antes dos títulos que os
+    referenciam. O nome do título só vale até o contato ser buscado na API.
+    """
+    contatos = {}
+    for v in valores:
+        if v[I_CONTATO_ID] and (v[I_CONTATO_NOME] or v[I_CONTATO_ID] not in contatos):
+            contatos[v[I_CONTATO_ID]] = v[I_CONTATO_NOME]
+    if contatos:
+        con.executemany(_SQL_CONTATO, contatos.items())
+
+# conexão compartilhada: evita abrir/fechar sqlite3.connect a cada registro.
+# Uma por thread (sqlite3 não compartilha conexão entre threads); fica aberta até close_conn().
+_local = threading.local()
+
+def get_conn():
+    """Conexão reaproveitada pela thread atual durante todo o processo (sync/daemon)."""
+    con = getattr(_local, "con", None)
+    if con is None:
+        _ensure_dir()
+        con = sqlite3.connect(DB_PATH, timeout=30)
+        # WAL: leitores (relatórios) não bloqueiam o sync e vice-versa
+        con.execute("PRAGMA journal_mode=WAL")
+        _local.con = con
+    return con
+
+def close_conn():
+    con = getattr(_local, "con", None)
+    if con is not None:
+        con.close()
+        _local.con = None
+
+def _existing_hashes(con, tabela: str, ids, chunk=500, geracao=None):
+    """
+    {id_bling: content_hash} dos ids que já existem na tabela. Com `geracao`, a mesma
+    instrução carimba sync_gen em todos eles (inclusive os que não mudaram): marcar a
+    geração não custa nenhuma instrução a mais por página.
+    """
+    found = {}
+    ids = list(ids)
+    for i in range(0, len(ids), chunk):
+        part = ids[i:i + chunk]
+        marks = ",".join("?" * len(part))
+        if geracao is None:
+            found.update(con.execute(f"SELECT id_bling, content_hash FROM {tabela} WHERE id_bling IN ({marks})", part))
+        else:
+            found.update(con.execute(f"""
+            UPDATE {tabela} SET sync_gen = ? WHERE id_bling IN ({marks})
+            RETURNING id_bling, content_hash
+            """, (geracao, *part)).fetchall())
+    return found
+
+def upsert_rows(tabela: str, rows, con=None, chunk=500, geracao=None, na_transacao=None):
+    """
+    Grava linhas já extraídas numa única transação, em blocos de `chunk` com executemany.
+    Cada linha é o par (valores, raw) devolvido por extrator(): `valores` vai direto
+    para o executemany, `raw` comprimido para {tabela}_raw.
+    `rows` pode ser um gerador: a memória fica limitada ao bloco.
+    Registros cujo content_hash não mudou não são reescritos (updated_at fica intacto).
+    Com `geracao`, todos os ids do bloco (inclusive inalterados) recebem sync_gen na
+    própria leitura dos hashes e no INSERT dos novos (ver varrer_excluidos).
+    `na_transacao(con, stats)`, se dado, roda antes do COMMIT (ex.: checkpoint da página).
+    Retorna {"inseridos": n, "atualizados": m, "inalterados": k}.
+    """
+    stats = {"inseridos": 0, "atualizados": 0, "inalterados": 0}
+    con = con or get_conn()
+    sql = _upsert_sql(tabela, geracao)
+    sql_raw = f"""
+    INSERT INTO {tabela}_raw (id_bling, raw) VALUES (?, ?)
+    ON CONFLICT(id_bling) DO UPDATE SET raw=excluded.raw;
+    """
+    it = iter(rows)
+    with con:  # BEGIN ... COMMIT (rollback em caso de erro)
+        while True:
+            # dedup por id_bling dentro do bloco (último vence)
+            bloco = {}
+            for linha in it:
+                bloco[linha[0][I_ID]] = linha
+                if len(bloco) >= chunk:
+                    break
+            if not bloco:
+                break
+            with metrics.tempo("db"):
+                existentes = _existing_hashes(con, tabela, bloco.keys(), geracao=geracao)
+                pendentes = []
+                for id_bling, linha in bloco.items():
+                    if id_bling not in existentes:
+                        stats["inseridos"] += 1
+                    elif existentes[id_bling] == linha[0][I_HASH]:
+                        stats["inalterados"] += 1
+                        continue
+                    else:
+                        stats["atualizados"] += 1
+                    pendentes.append(linha)
+                if pendentes:
+                    _gravar_contatos(con, [v for v, _ in pendentes])
+                    con.executemany(sql, [v for v, _ in pendentes])
+                    con.executemany(sql_raw, [(v[I_ID], _compress(raw)) for v, raw in pendentes])
+        if na_transacao is not None:
+            na_transacao(con, stats)
+    return stats
+
+# colunas que o reindex (src/services/reindex.py) refaz a partir do payload guardado
+# (id_bling é a chave; content_hash é do próprio payload, que não muda)
+COLS_DERIVADAS = tuple(c for c in _COLS_TITULO if c not in ("id_bling", "content_hash"))
+
+def regravar_derivadas(tabela: str, valores, colunas=None, con=None) -> int:
+    """
+    Regrava colunas derivadas de títulos já existentes a partir de tuplas do extrator,
+    numa transação e em SQL por conjunto: as tuplas vão para uma tabela temporária e cada
+    coluna de `colunas` (padrão: todas as derivadas + contato_ref) é atualizada com um
+    UPDATE ... FROM só onde o valor difere (índices e triggers dos agregados só nas linhas
+    que mudaram). Não toca content_hash/sync_gen; título excluído (soft delete) mantém a
+    situação EXCLUIDO. Retorna o nº de títulos alterados.
+    """
+    valores = list(valores)
+    if not valores:
+        return 0
+    con = con or get_conn()
+    colunas = COLS_DERIVADAS + ("contato_ref",) if colunas is None else colunas
+    # mesmos tipos declarados da tabela: mesma afinidade, comparação igual à do valor gravado
+    tipos = {r[1]: r[2] for r in con.execute(f"PRAGMA table_info({tabela})")}
+    defs = ", ".join(f"{c} {tipos.get(c) or 'TEXT'}" + (" PRIMARY KEY" if c == "id_bling" else "") for c in _COLS)
+    alterados = set()
+    with con:
+        con.execute(f"CREATE TEMP TABLE IF NOT EXISTS _regravar_{tabela} ({defs})")
+        con.execute(f"DELETE FROM _regravar_{tabela}")
+        con.executemany(f"INSERT OR REPLACE INTO _regravar_{tabela} VALUES ({', '.join('?' * len(_COLS))})", valores)
+        _gravar_contatos(con, valores)
+        for c in colunas:
+            novo = "(SELECT id FROM contatos WHERE contatos.id_bling = NULLIF(n.contato_id, ''))" \
+                if c == "contato_ref" else f"n.{c}"
+            extra = " AND t.excluido_em IS NULL" if c == "situacao_cod" else ""
+            alterados.update(r[0] for r in con.execute(f"""
+            UPDATE {tabela} AS t SET {c} = {novo}, updated_at = datetime('now')
+            FROM _regravar_{tabela} AS n
+            WHERE n.id_bling = t.id_bling AND t.{c} IS NOT {novo}{extra}
+            RETURNING id
+            """))
+    return len(alterados)
+
+def carga_em_massa(tabela: str, blocos, con=None):
+    """
+    Carga inicial/sintética: grava blocos de linhas (valores, raw já comprimido) sem a
+    leitura prévia de hashes e sem os triggers dos agregados, que são recalculados uma
+    vez no fim (rebuild_agregados). Tudo numa transação: se falhar, nada fica gravado
+    (nem os triggers removidos). Retorna o nº de linhas.
+    """
+    con = con or get_conn()
+    tipo = _TIPOS[tabela]
+    sql = _upsert_sql(tabela)
+    sql_raw = f"""
+    INSERT INTO {tabela}_raw (id_bling, raw) VALUES (?, ?)
+    ON CONFLICT(id_bling) DO UPDATE SET raw=excluded.raw;
+    """
+    gatilhos = con.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ? "
+                           "AND name LIKE ?", (tabela, f"trg_{tipo}_agg_%")).fetchall()
+    n = 0
+    with con:
+        if not con.in_transaction:
+            con.execute("BEGIN")  # o sqlite3 só abre transação sozinho antes de DML, não de DROP
+        for nome, _ in gatilhos:
+            con.execute(f"DROP TRIGGER {nome}")
+        for bloco in blocos:
+            _gravar_contatos(con, [v for v, _ in bloco])
+            con.executemany(sql, [v for v, _ in bloco])
+            con.executemany(sql_raw, [(v[I_ID], blob) for v, blob in bloco])
+            n += len(bloco)
+        for _, ddl in gatilhos:
+            con.execute(ddl)
+        rebuild_agregados(con.cursor())
+    return n
+
+def upsert_contas(tabela: str, items, con=None, versao="v2"):
+    """
+    Grava uma página inteira de itens (dicts do payload) numa única transação.
+    `versao`: formato do payload; o padrão "v2" tenta todas as chaves conhecidas.
+    """
+    extrair = extrator(versao)
+    return upsert_rows(tabela, (extrair(item) for item in items), con=con)
+
+def get_sync_state(recurso: str, con=None):
+    """Retorna {"ultima_sync": ..., "cursor": ..., "geracao": n} ou None se nunca sincronizou."""
+    con = con or get_conn()
+    row = con.execute("SELECT ultima_sync, cursor, geracao FROM sync_state WHERE recurso = ?", (recurso,)).fetchone()
+    return {"ultima_sync": row[0], "cursor": row[1], "geracao": row[2]} if row else None
+
+def nova_geracao(recurso: str, con=None) -> int:
+    """Reserva o número de geração de um sync completo (cada tentativa tem o seu)."""
+    con = con or get_conn()
+    with con:
+        return con.execute("""
+        INSERT INTO sync_state (recurso, geracao) VALUES (?, 1)
+        ON CONFLICT(recurso) DO UPDATE SET geracao = geracao + 1
+        RETURNING geracao;
+        """, (recurso,)).fetchone()[0]
+
+# soft delete: some dos relatórios pela situação (os agregados acompanham via trigger);
+# content_hash NULL faz o título ser regravado por inteiro se voltar a aparecer
+SITUACAO_EXCLUIDO = "EXCLUIDO"
+_SET_EXCLUIDO = f"""
+    excluido_em = datetime('now'),
+    situacao_cod = '{SITUACAO_EXCLUIDO}',
+    content_hash = NULL,
+    updated_at = datetime('now')"""
+# não varre se a geração viu menos que esta fração dos títulos ativos (resposta vazia/truncada)
+SWEEP_MIN_VISTOS = float(os.getenv("BLING_SWEEP_MIN_VISTOS", "0.5"))
+
+def varrer_excluidos(tabela: str, geracao: int, vistos: int, con=None) -> int:
+    """
+    Fim de um sync completo: marca como excluído (uma instrução) todo título ativo que
+    não foi visto na `geracao`. Retorna quantos foram marcados; -1 se a varredura foi
+    recusada por ter visto poucos títulos.
+    """
+    con = con or get_conn()
+    with con:
+        ativos = con.execute(f"SELECT COUNT(*) FROM {tabela} WHERE excluido_em IS NULL").fetchone()[0]
+        if ativos and vistos < ativos * SWEEP_MIN_VISTOS:
+            return -1
+        cur = con.execute(f"""
+        UPDATE {tabela} SET {_SET_EXCLUIDO}
+        WHERE excluido_em IS NULL AND (sync_gen IS NULL OR sync_gen < ?);
+        """, (geracao,))
+        return cur.rowcount
+
+def marcar_geracao_atual(con, tabela: str, ids):
+    """
+    Carimba `ids` com a geração atual de sync_state (gravação fora do sync, ex.: webhook),
+    lida dentro da transação de quem chama: um sync completo em andamento não os varre.
+    """
+    ids = [str(i) for i in ids]
+    for i in range(0, len(ids), 500):
+        parte = ids[i:i + 500]
+        con.execute(f"""
+        UPDATE {tabela} SET sync_gen = (SELECT geracao FROM sync_state WHERE recurso = ?)
+        WHERE id_bling IN ({",".join("?" * len(parte))})
+        """, (tabela, *parte))
+
+def excluir_ids(tabela: str, ids, con=None) -> int:
+    """Soft delete pontual (ex.: webhook de exclusão); mesma marcação da varredura."""
+    ids = [str(i) for i in ids]
+    if not ids:
+        return 0
+    con = con or get_conn()
+    with con:
+        marks = ",".join("?" * len(ids))
+        cur = con.execute(f"UPDATE {tabela} SET {_SET_EXCLUIDO} WHERE excluido_em IS NULL AND id_bling IN ({marks})", ids)
+        return cur.rowcount
+
+def set_sync_state(recurso: str, ultima_sync: str, cursor: str = None, con=None):
+    con = con or get_conn()
+    with con:
+        con.execute("""
+        INSERT INTO sync_state (recurso, ultima_sync, cursor, updated_at)
+        VALUES (?, ?, ?, datetime('now'))
+        ON CONFLICT(recurso) DO UPDATE SET
+            ultima_sync=excluded.ultima_sync,
+            cursor=excluded.cursor,
+            updated_at=datetime('now');
+        """, (recurso, ultima_sync, cursor))
+
+def detalhes_em_cache(tabela: str, ids, con=None, chunk=500):
+    """{id_bling: (versao, payload em texto)} dos detalhes já buscados."""
+    con = con or get_conn()
+    ids = list(ids)
+    r = {}
+    for i in range(0, len(ids), chunk):
+        parte = ids[i:i + chunk]
+        marks = ",".join("?" * len(parte))
+        for id_bling, versao, blob in con.execute(
+                f"SELECT id_bling, versao, payload FROM detalhe_cache WHERE tabela = ? AND id_bling IN ({marks})",
+                (tabela, *parte)):
+            r[id_bling] = (versao, _decompress(blob))
+    return r
+
+def gravar_detalhes(con, tabela: str, linhas):
+    """Grava [(id_bling, versao, payload em texto)] na transação aberta em `con`."""
+    con.executemany("""
+    INSERT INTO detalhe_cache (tabela, id_bling, versao, payload, buscado_em)
+    VALUES (?, ?, ?, ?, datetime('now'))
+    ON CONFLICT(tabela, id_bling) DO UPDATE SET
+        versao=excluded.versao, payload=excluded.payload, buscado_em=excluded.buscado_em;
+    """, [(tabela, i, v, _compress(p)) for i, v, p in linhas])
+
+# contato buscado na API há mais que isto é buscado de novo (src/services/contatos.py)
+CONTATOS_TTL_HORAS = float(os.getenv("BLING_CONTATOS_TTL_HORAS", "168"))
+
+def contatos_a_buscar(limite: int, ttl_horas: float = None, con=None):
+    """id_bling dos contatos nunca buscados na API ou com busca vencida, os mais antigos primeiro."""
+    con = con or get_conn()
+    ttl = CONTATOS_TTL_HORAS if ttl_horas is None else ttl_horas
+    return [r[0] for r in con.execute("""
+    SELECT id_bling FROM contatos
+    WHERE buscado_em IS NULL OR buscado_em < datetime('now', ?)
+    ORDER BY buscado_em IS NOT NULL, buscado_em
+    LIMIT ?
+    """, (f"-{ttl} hours", limite))]
+
+def gravar_contatos_api(con, linhas):
+    """
+    Grava [(id_bling, nome, documento, tipo)] vindos de contatos/{id}, na transação aberta
+    em `con`; campos None mantêm o valor atual (contato não encontrado só marca a busca).
+    """
+    con.executemany("""
+    UPDATE contatos SET nome = IFNULL(?, nome), documento = IFNULL(?, documento), tipo = IFNULL(?, tipo),
+        buscado_em = datetime('now'), updated_at = datetime('now')
+    WHERE id_bling = ?
+    """, [(nome, documento, tipo, id_bling) for id_bling, nome, documento, tipo in linhas])
+
+# checkpoint mais antigo que isto é descartado (paginação por offset envelhece: títulos
+# criados/excluídos no meio tempo deslocam as páginas)
+CHECKPOINT_TTL_HORAS = float(os.getenv("BLING_CHECKPOINT_TTL_HORAS", "6"))
+
+def gravar_checkpoint(con, recurso: str, plano, etapa: int, pagina: int, geracao, inicio: str, contadores: dict):
+    """Grava o checkpoint na transação aberta em `con` (chamar de dentro de upsert_rows)."""
+    con.execute("""
+    INSERT INTO sync_checkpoint (recurso, plano, etapa, pagina, geracao, inicio, contadores, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'))
+    ON CONFLICT(recurso) DO UPDATE SET
+        plano=excluded.plano, etapa=excluded.etapa, pagina=excluded.pagina, geracao=excluded.geracao,
+        inicio=excluded.inicio, contadores=excluded.contadores, updated_at=excluded.updated_at;
+    """, (recurso, json.dumps(plano, sort_keys=True), etapa, pagina, geracao, inicio,
+          json.dumps(contadores)))
+
+def get_checkpoint(recurso: str, con=None):
+    """
+    Checkpoint do sync interrompido de `recurso`, ou None. Inclui `idade_h` e
+    `expirado` (mais velho que CHECKPOINT_TTL_HORAS).
+    """
+    con = con or get_conn()
+    row = con.execute("""
+    SELECT plano, etapa, pagina, geracao, inicio, contadores, updated_at,
+           (julianday('now') - julianday(updated_at)) * 24
+    FROM sync_checkpoint WHERE recurso = ?
+    """, (recurso,)).fetchone()
+    if not row:
+        return None
+    return {"plano": json.loads(row[0]), "etapa": row[1], "pagina": row[2], "geracao": row[3],
+            "inicio": row[4], "contadores": json.loads(row[5] or "{}"), "updated_at": row[6],
+            "idade_h": row[7], "expirado": row[7] > CHECKPOINT_TTL_HORAS}
+
+def limpar_checkpoint(recurso: str, con=None):
+    con = con or get_conn()
+    with con:
+        con.execute("DELETE FROM sync_checkpoint WHERE recurso = ?", (recurso,))
+
+def ultimas_runs(recurso: str = None, limite: int = 5, con=None):
+    """Últimas execuções de sync_runs (mais recente primeiro)."""
+    con = con or get_conn()
+    where, params = ("WHERE recurso = ?", (recurso,)) if recurso else ("", ())
+    cur = con.execute(f"""
+    SELECT recurso, modo, status, inicio, duracao_s, registros_s, paginas, inseridos, atualizados, inalterados
+    FROM sync_runs {where} ORDER BY id DESC LIMIT ?
+    """, (*params, limite))
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, r)) for r in cur]
+
+def ultimo_completo(recurso: str, con=None):
+    """Início (ISO) do último sync completo terminado com sucesso de `recurso`; None se nunca houve."""
+    con = con or get_conn()
+    row = con.execute("""
+    SELECT inicio FROM sync_runs WHERE recurso = ? AND modo = 'completo' AND status = 'ok'
+    ORDER BY id DESC LIMIT 1
+    """, (recurso,)).fetchone()
+    return row[0] if row else None
+
+def registrar_run(resumo: dict, con=None):
+    """Grava o resumo de uma execução (metrics.RunMetrics.resumo()) em sync_runs."""
+    con = con or get_conn()
+    c = resumo.get("contadores", {})
+    with con:
+        con.execute("""
+        INSERT INTO sync_runs (recurso, modo, status, inicio, fim, duracao_s, registros_s, paginas, bytes,
+                               requisicoes, retries, inseridos, atualizados, inalterados, metricas)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (resumo["recurso"], resumo.get("modo"), resumo["status"], resumo["inicio"], resumo.get("fim"),
+              resumo["duracao_s"], resumo["registros_s"], c.get("paginas", 0), c.get("bytes", 0),
+              c.get("requisicoes", 0), c.get("retries", 0), c.get("inseridos", 0), c.get("atualizados", 0),
+              c.get("inalterados", 0), json.dumps(resumo, ensure_ascii=False)))
+
+def upsert_conta(tabela: str, item: dict):
+    """Compatibilidade: grava um único item (prefira upsert_contas por página)."""
+    con = _conn()
+    try:
+        return upsert_contas(tabela, [item], con=con)
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Manutenção do banco local.")
+    ap.add_argument("--checar-agregados", action="store_true", help="compara agregados com recálculo completo")
+    ap.add_argument("--reconstruir-agregados", action="store_true", help="recalcula os agregados do zero")
+    args = ap.parse_args()
+    migrate()
+    if args.reconstruir_agregados:
+        rebuild_agregados()
+        print(" Agregados reconstruídos.")
+    if args.checar_agregados:
+        div = checar_agregados()
+        for agg, chave, atual, esperado in div[:50]:
+            print(f" {agg} {chave}: agregado={atual} recalculado={esperado}")
+        print(f" {len(div)} divergência(s).")
+        raise SystemExit(1 if div else 0)
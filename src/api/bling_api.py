@@ -1,53 +1,195 @@
 # src/api/bling_api.py
-import os, requests
+import os, re, json, time, codecs, random, tempfile, threading, requests
+from requests.adapters import HTTPAdapter
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime
 from dotenv import load_dotenv, find_dotenv
 
+from src.core import metrics
+
 # --- carregar .env de forma robusta ---
 dotenv_path = find_dotenv()
 if not dotenv_path:
     dotenv_path = Path(__file__).resolve().parents[2] / ".env"  # raiz do projeto
 load_dotenv(dotenv_path)
 
-def _save_env(kv: dict):
-    """Atualiza/insere chaves no .env da raiz."""
-    p = Path(dotenv_path)
-    lines = p.read_text(encoding="utf-8").splitlines() if p.exists() else []
-    m = {k: str(v) for k, v in kv.items()}
-    new = []
-    seen = set()
-    for line in lines:
-        if "=" in line:
-            k = line.split("=", 1)[0].strip()
-            if k in m:
-                new.append(f"{k}={m[k]}"); seen.add(k)
-            else:
-                new.append(line)
-        else:
-            new.append(line)
-    for k, v in m.items():
-        if k not in seen:
-            new.append(f"{k}={v}")
-    p.write_text("\n".join(new) + "\n", encoding="utf-8")
-
 # --------- Configs comuns ---------
-TIMEOUT = 20
+# (connect, read) em segundos, por requisição
+TIMEOUT = (float(os.getenv("BLING_CONNECT_TIMEOUT", "5")), float(os.getenv("BLING_READ_TIMEOUT", "20")))
 
 # v2 (chave antiga)
 API_KEY = os.getenv("BLING_API_KEY")
 V2_BASE = "https://bling.com.br/Api/v2"
 
 # v3 (OAuth2)
-V3_BASE = "https://www.bling.com.br/Api/v3"
-TOKEN_URL = "https://www.bling.com.br/Api/v3/oauth/token"
+# BLING_V3_BASE permite apontar para um servidor local (bench/fake_bling.py)
+V3_BASE = os.getenv("BLING_V3_BASE", "https://www.bling.com.br/Api/v3").rstrip("/")
+TOKEN_URL = f"{V3_BASE}/oauth/token"
 
 CLIENT_ID = os.getenv("BLING_CLIENT_ID")
 CLIENT_SECRET = os.getenv("BLING_CLIENT_SECRET")
 ACCESS_TOKEN = os.getenv("BLING_ACCESS_TOKEN")
 REFRESH_TOKEN = os.getenv("BLING_REFRESH_TOKEN")
 
-_token_exp = None  # expiração em memória (opcional)
+_token_exp = None  # epoch (time.time()) em que o access token expira; None = desconhecido
+
+# Tokens renovados vão para um JSON próprio (gravação atômica, 1 escrita por refresh),
+# não para o .env. O .env continua sendo a origem na primeira autorização (oauth_server).
+TOKEN_STORE = Path(os.getenv("BLING_TOKEN_STORE") or Path(dotenv_path).with_name(".bling_tokens.json"))
+REFRESH_MARGIN = 120  # s antes da expiração em que o token já é renovado
+_token_margin = REFRESH_MARGIN  # limitada a 10% da validade (tokens curtos não renovam a cada chamada)
+_token_lock = threading.Lock()
+
+# --------- Rate limit (compartilhado entre threads) ---------
+RATE_PER_SEC = float(os.getenv("BLING_RATE_PER_SEC", "3"))  # limite do Bling: 3 req/s
+
+class _TokenBucket:
+    """Token bucket thread-safe; backoff() bloqueia todos após um 429."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def backoff(self, seconds):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+_bucket = _TokenBucket(RATE_PER_SEC)
+
+# --------- Sessão HTTP (keep-alive + pool + retry) ---------
+HTTP_POOL_SIZE = int(os.getenv("BLING_HTTP_POOL", "10"))
+HTTP_RETRIES = int(os.getenv("BLING_HTTP_RETRIES", "5"))
+BACKOFF_BASE = 0.5   # s
+BACKOFF_MAX = 30.0   # s
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+_stats = {"requisicoes": 0, "retries": 0}
+_stats_lock = threading.Lock()
+
+def configure_http(pool_size=None, retries=None, timeout=None):
+    """Ajusta pool/retries/timeout e recria a sessão compartilhada."""
+    global HTTP_POOL_SIZE, HTTP_RETRIES, TIMEOUT, _session
+    with _session_lock:
+        if pool_size is not None:
+            HTTP_POOL_SIZE = pool_size
+        if retries is not None:
+            HTTP_RETRIES = retries
+        if timeout is not None:
+            TIMEOUT = timeout
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def get_session():
+    """requests.Session única do processo: conexões TCP/TLS reaproveitadas (keep-alive)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _session = s
+        return _session
+
+def http_stats():
+    """Contadores: requisições, retries e conexões abertas vs reutilizadas."""
+    abertas = enviadas = 0
+    s = _session
+    if s is not None:
+        for adapter in set(s.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    abertas += pool.num_connections
+                    enviadas += pool.num_requests
+    with _stats_lock:
+        out = dict(_stats)
+    out["conexoes_abertas"] = abertas
+    out["conexoes_reutilizadas"] = max(0, enviadas - abertas)
+    return out
+
+def _count(key, n=1):
+    with _stats_lock:
+        _stats[key] += n
+    metrics.contar(key, n)
+
+def _retry_after(resp):
+    try:
+        return float(resp.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+def _backoff(tentativa):
+    # exponencial com "full jitter"
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** tentativa))
+
+def _request(method, url, **kw):
+    """
+    Requisição pela sessão compartilhada, respeitando o token bucket.
+    Retenta 429/5xx e erros de conexão com backoff exponencial + jitter;
+    Retry-After, quando presente, tem prioridade. 429 pausa o bucket para todos.
+    """
+    kw.setdefault("timeout", TIMEOUT)
+    fase = kw.pop("_fase", "http")  # o refresh de token é contado na fase "token"
+    session = get_session()
+    for tentativa in range(HTTP_RETRIES + 1):
+        with metrics.tempo("espera"):
+            _bucket.acquire()
+        _count("requisicoes")
+        t0 = time.perf_counter()
+        try:
+            r = session.request(method, url, **kw)
+        except (requests.ConnectionError, requests.Timeout):
+            if tentativa == HTTP_RETRIES:
+                raise
+            _count("retries")
+            with metrics.tempo("espera"):
+                time.sleep(_backoff(tentativa))
+            continue
+        finally:
+            dt = time.perf_counter() - t0
+            metrics.add_tempo(fase, dt)
+            metrics.observar(f"{fase}_ms", dt * 1000)
+        if not kw.get("stream"):
+            metrics.contar("bytes", len(r.content))
+        if r.status_code not in RETRY_STATUS or tentativa == HTTP_RETRIES:
+            return r
+        r.close()  # devolve a conexão ao pool (respostas com stream=True)
+        _count("retries")
+        metrics.contar(f"http_{r.status_code}")
+        espera = _retry_after(r)
+        if espera is None:
+            espera = _backoff(tentativa)
+        if r.status_code == 429:
+            _bucket.backoff(espera)  # a pausa cai no próximo acquire (fase "espera")
+        else:
+            with metrics.tempo("espera"):
+                time.sleep(espera)
+    return r
 
 def _raise_detail(resp):
     try:
@@ -56,6 +198,9 @@ def _raise_detail(resp):
         pass
     resp.raise_for_status()
 
+def _http_get(url, **kw):
+    return _request("GET", url, **kw)
+
 # --------- v2 ---------
 def v2_get(path, params=None):
     params = params or {}
@@ -65,7 +210,7 @@ def v2_get(path, params=None):
     if not path.endswith("/json"):
         path = f"{path}/json"
     url = f"{V2_BASE}/{path.lstrip('/')}"
-    r = requests.get(url, params=params, timeout=TIMEOUT)
+    r = _http_get(url, params=params)
     if not r.ok:
         _raise_detail(r)
     return r.json()
@@ -78,8 +223,50 @@ def v2_contas_pagar(page=1, limite=100):
 
 # --- troque APENAS esta função no src/api/bling_api.py ---
 
+def _load_token_store():
+    """Carrega tokens do TOKEN_STORE, se ele derivar do refresh token atual do .env."""
+    global ACCESS_TOKEN, REFRESH_TOKEN, _token_exp, _token_margin
+    try:
+        jd = json.loads(TOKEN_STORE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return
+    # .env reautorizado (oauth_server) depois do último refresh -> store está velho
+    if jd.get("env_refresh_token") != os.getenv("BLING_REFRESH_TOKEN"):
+        return
+    ACCESS_TOKEN = jd.get("access_token") or ACCESS_TOKEN
+    REFRESH_TOKEN = jd.get("refresh_token") or REFRESH_TOKEN
+    _token_exp = jd.get("expires_at")
+    _token_margin = jd.get("margin", REFRESH_MARGIN)
+
+def _save_token_store():
+    """Grava os tokens numa única escrita atômica (tmp + fsync + os.replace)."""
+    data = {
+        "access_token": ACCESS_TOKEN,
+        "refresh_token": REFRESH_TOKEN,
+        "expires_at": _token_exp,
+        "margin": _token_margin,
+        "env_refresh_token": os.getenv("BLING_REFRESH_TOKEN"),
+    }
+    TOKEN_STORE.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=TOKEN_STORE.parent, prefix=".bling_tokens.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o600)
+        os.replace(tmp, TOKEN_STORE)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+_load_token_store()
+
 def _refresh_access_token():
-    global ACCESS_TOKEN, REFRESH_TOKEN, _token_exp
+    global ACCESS_TOKEN, REFRESH_TOKEN, _token_exp, _token_margin
     if not (CLIENT_ID and CLIENT_SECRET and REFRESH_TOKEN):
         raise RuntimeError(
             "Faltam variáveis no .env: defina BLING_CLIENT_ID, BLING_CLIENT_SECRET e BLING_REFRESH_TOKEN."
@@ -92,13 +279,15 @@ def _refresh_access_token():
     }
     headers = {"Accept": "application/json"}
     # 'auth=(user, pass)' envia Authorization: Basic base64(client_id:client_secret)
-    r = requests.post(
+    r = _request(
+        "POST",
         TOKEN_URL,
         data=data,
         headers=headers,
         auth=(CLIENT_ID, CLIENT_SECRET),
-        timeout=TIMEOUT,
+        _fase="token",
     )
+    metrics.contar("token_refresh")
 
     if not r.ok:
         _raise_detail(r)  # imprime detalhe e levanta HTTPError
@@ -108,51 +297,224 @@ def _refresh_access_token():
     # alguns providers retornam novo refresh_token; se não vier, mantemos o atual
     REFRESH_TOKEN = jd.get("refresh_token") or REFRESH_TOKEN
     expires_in = int(jd.get("expires_in", 3000))
-    _token_exp = datetime.utcnow() + timedelta(seconds=expires_in - 30)
+    _token_exp = time.time() + expires_in
+    _token_margin = min(REFRESH_MARGIN, expires_in * 0.1)
 
-    # persiste tokens no .env
-    _save_env({
-        "BLING_ACCESS_TOKEN": ACCESS_TOKEN or "",
-        "BLING_REFRESH_TOKEN": REFRESH_TOKEN or "",
-    })
+    _save_token_store()
 
-    # persiste no .env
-    _save_env({"BLING_ACCESS_TOKEN": ACCESS_TOKEN or "", "BLING_REFRESH_TOKEN": REFRESH_TOKEN or ""})
-
-def _bearer_headers():
+def _token_valido():
     if not ACCESS_TOKEN:
+        return False
+    return _token_exp is None or time.time() < _token_exp - _token_margin
+
+def get_access_token(stale=None):
+    """
+    Access token válido, renovado proativamente perto da expiração.
+    `stale`: token que acabou de levar 401 -> força refresh, a menos que outra
+    thread já o tenha trocado. O lock garante um único refresh concorrente.
+    """
+    tok = ACCESS_TOKEN
+    if stale is None and _token_valido():
+        return tok
+    with _token_lock:
+        if stale is not None and ACCESS_TOKEN != stale:
+            return ACCESS_TOKEN          # outra thread já renovou
+        if stale is None and _token_valido():
+            return ACCESS_TOKEN          # idem, enquanto esperávamos o lock
         _refresh_access_token()
-    return {"Authorization": f"Bearer {ACCESS_TOKEN}", "Accept": "application/json"}
+        return ACCESS_TOKEN
+
+def _bearer_headers(token):
+    return {"Authorization": f"Bearer {token}", "Accept": "application/json"}
 
 def v3_get(path, params=None):
-    if not ACCESS_TOKEN:
-        _refresh_access_token()
     url = f"{V3_BASE}/{path.lstrip('/')}"
-    headers = _bearer_headers()
-    r = requests.get(url, headers=headers, params=params or {}, timeout=TIMEOUT)
+    token = get_access_token()
+    r = _http_get(url, headers=_bearer_headers(token), params=params or {})
     if r.status_code == 401:
-        # token expirado -> refresh e tenta 1x
-        _refresh_access_token()
-        headers = _bearer_headers()
-        r = requests.get(url, headers=headers, params=params or {}, timeout=TIMEOUT)
+        # token revogado/expirado antes do previsto -> refresh (uma vez) e tenta 1x
+        token = get_access_token(stale=token)
+        r = _http_get(url, headers=_bearer_headers(token), params=params or {})
     if not r.ok:
         _raise_detail(r)
     return r.json()
 
-def v3_contas_receber(page=1, limit=100):
-    return v3_get("contas/receber", {"page": page, "limit": limit})
+# --------- Streaming (corpo HTTP -> itens, sem carregar a página inteira) ---------
+_ARRAY_KEY = re.compile(r'"(?:data|items)"\s*:\s*\[|^\s*\[')
+_decoder = json.JSONDecoder()
+
+def iter_json_array(chunks):
+    """
+    Lê o array `data` (ou `items`, ou lista pura) de um JSON que chega em pedaços
+    e produz (item_dict, texto_original_do_item) um por vez. Usa raw_decode (C),
+    então cada item é decodificado uma única vez e o texto original é preservado.
+    """
+    dec = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buf, pos, fim = "", None, False
+
+    def _mais():
+        nonlocal buf, pos, fim
+        if pos:  # descarta o que já foi consumido antes de anexar o próximo pedaço
+            buf, pos = buf[pos:], 0
+        chunk = next(chunks, None)
+        if chunk is None:
+            fim = True
+            buf += dec.decode(b"", final=True)
+        else:
+            buf += dec.decode(chunk)
+
+    while pos is None:  # procura o início do array
+        m = _ARRAY_KEY.search(buf)
+        if m:
+            pos = m.end()
+        elif fim:
+            return
+        else:
+            _mais()
+
+    while True:
+        # pula espaços e vírgulas entre itens
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) or fim:
+                break
+            _mais()
+        if pos >= len(buf) or buf[pos] == "]":
+            return
+        t0 = time.perf_counter()
+        try:
+            item, end = _decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if fim:
+                raise
+            _mais()  # item incompleto: lê mais e tenta de novo
+            continue
+        finally:
+            metrics.add_tempo("decode", time.perf_counter() - t0)
+        yield item, buf[pos:end]
+        pos = end
+
+def _timed_chunks(r, chunk_size):
+    # leitura do corpo = espera de rede: conta na fase "http", com os bytes recebidos
+    it = r.iter_content(chunk_size)
+    while True:
+        t0 = time.perf_counter()
+        chunk = next(it, None)
+        metrics.add_tempo("http", time.perf_counter() - t0)
+        if chunk is None:
+            return
+        metrics.contar("bytes", len(chunk))
+        yield chunk
+
+def _stream_records(r, chunk_size):
+    with r:  # fecha a resposta/devolve a conexão ao pool ao terminar
+        yield from iter_json_array(_timed_chunks(r, chunk_size))
+
+class _Registros:
+    """
+    Iterador de (item, raw) de uma resposta em streaming. close() devolve a conexão ao
+    pool mesmo se o corpo nunca foi lido (close() de um gerador não iniciado não roda o
+    `with` dele): página buscada de antemão e descartada não prende conexão.
+    """
+
+    def __init__(self, r, chunk_size):
+        self._r = r
+        self._it = _stream_records(r, chunk_size)
+
+    def __iter__(self):
+        return self._it
+
+    def __next__(self):
+        return next(self._it)
+
+    def close(self):
+        self._it.close()
+        self._r.close()
+
+def v3_stream(path, params=None, chunk_size=64 * 1024):
+    """
+    Como v3_get, mas devolve um iterador de (item, raw) lendo o corpo sob demanda.
+    Status/401 são tratados aqui; o corpo só é lido por quem consumir o iterador
+    (ou descartado com close()).
+    """
+    url = f"{V3_BASE}/{path.lstrip('/')}"
+    token = get_access_token()
+    r = _http_get(url, headers=_bearer_headers(token), params=params or {}, stream=True)
+    if r.status_code == 401:
+        r.close()
+        token = get_access_token(stale=token)
+        r = _http_get(url, headers=_bearer_headers(token), params=params or {}, stream=True)
+    if not r.ok:
+        _raise_detail(r)
+    return _Registros(r, chunk_size)
+
+def v3_contas_receber(page=1, limit=100, **filtros):
+    return v3_get("contas/receber", {"page": page, "limit": limit, **filtros})
 
-def v3_contas_pagar(page=1, limit=100):
-    return v3_get("contas/pagar", {"page": page, "limit": limit})
+def v3_contas_pagar(page=1, limit=100, **filtros):
+    return v3_get("contas/pagar", {"page": page, "limit": limit, **filtros})
+
+def filtros_desde(recurso, desde):
+    """
+    Filtros de data da v3 para buscar só o que foi emitido ou baixado desde `desde` (date).
+    Cada dict é uma varredura separada. Retorna None na v2 (sem suporte -> sync completo).
+    """
+    if API_KEY:
+        return None
+    ini, fim = desde.isoformat(), datetime.now().date().isoformat()
+    if recurso == "contas_pagar":
+        return [
+            {"dataEmissaoInicial": ini, "dataEmissaoFinal": fim},
+            {"dataPagamentoInicial": ini, "dataPagamentoFinal": fim},
+        ]
+    return [
+        {"tipoFiltroData": "E", "dataInicial": ini, "dataFinal": fim},
+        {"tipoFiltroData": "P", "dataInicial": ini, "dataFinal": fim},
+    ]
 
 # --------- Facades ---------
-def get_contas_receber(page=1, limit=100):
+def _v3_registro(path):
+    """GET de um registro na v3 -> dict de "data"; None se não existe mais (404)."""
+    try:
+        jd = v3_get(path)
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return None
+        raise
+    return jd.get("data", jd) if isinstance(jd, dict) else jd
+
+def get_conta(tipo, id_bling):
+    """Detalhe de um título na v3 (tipo "pagar"/"receber"); None se não existe mais (404)."""
+    return _v3_registro(f"contas/{tipo}/{id_bling}")
+
+def get_contato(id_bling):
+    """Contato na v3 (nome, numeroDocumento, tipo...); None se não existe mais (404)."""
+    return _v3_registro(f"contatos/{id_bling}")
+
+def versao_api():
+    """Formato dos payloads devolvidos pelas fachadas abaixo ("v2" com API_KEY, senão "v3")."""
+    return "v2" if API_KEY else "v3"
+
+def get_contas_receber(page=1, limit=100, **filtros):
     # Se houver API_KEY, usa v2; senão v3.
     if API_KEY:
         return v2_contas_receber(page, limit)
-    return v3_contas_receber(page, limit)
+    return v3_contas_receber(page, limit, **filtros)
+
+def get_contas_pagar(page=1, limit=100, **filtros):
+    if API_KEY:
+        return v2_contas_pagar(page, limit)
+    return v3_contas_pagar(page, limit, **filtros)
+
+# Versões em streaming: v3 -> gerador de (item, raw); v2 -> payload completo (sem streaming)
+def stream_contas_receber(page=1, limit=100, **filtros):
+    if API_KEY:
+        return v2_contas_receber(page, limit)
+    return v3_stream("contas/receber", {"page": page, "limit": limit, **filtros})
 
-def get_contas_pagar(page=1, limit=100):
+def stream_contas_pagar(page=1, limit=100, **filtros):
     if API_KEY:
         return v2_contas_pagar(page, limit)
-    return v3_contas_pagar(page, limit)
+    return v3_stream("contas/pagar", {"page": page, "limit": limit, **filtros})
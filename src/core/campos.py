@@ -0,0 +1,174 @@
+# campos.py — mapeamento payload do Bling (v2/v3) -> linha de contas_pagar/contas_receber
+#
+# O mapeamento é declarado uma vez (CAMPOS) e compilado, por formato de payload, numa
+# função Python gerada (compilar()). A função não monta dict: devolve a tupla de valores
+# na ordem de COLS (pronta para o executemany com "?") e o texto original do item, que
+# vai comprimido para a tabela {tabela}_raw.
+import json, hashlib
+
+# --------- Normalização (colunas usadas nos filtros dos relatórios) ---------
+# v3: situacao numérica; v2/mock: texto livre
+_SITUACAO_V3 = {1: "ABERTO", 2: "PAGO", 3: "PARCIAL", 4: "DEVOLVIDO", 5: "CANCELADO"}
+_SITUACAO_PREFIXOS = (
+    ("EM ABER", "ABERTO"), ("ABER", "ABERTO"),
+    ("PARC", "PARCIAL"),
+    ("PAG", "PAGO"), ("BAIX", "PAGO"), ("RECEB", "PAGO"), ("LIQUID", "PAGO"), ("QUIT", "PAGO"),
+    ("CANC", "CANCELADO"),
+    ("DEVOL", "DEVOLVIDO"),
+)
+
+def _norm_situacao(v):
+    if v is None or v == "":
+        return ""
+    if isinstance(v, dict):
+        v = v.get("id") or v.get("valor") or ""
+    if isinstance(v, (int, float)) or str(v).strip().isdigit():
+        return _SITUACAO_V3.get(int(v), str(v))
+    s = str(v).strip().upper()
+    for prefixo, cod in _SITUACAO_PREFIXOS:
+        if s.startswith(prefixo):
+            return cod
+    return s
+
+def _norm_data(v):
+    """'YYYY-MM-DD[ hh:mm:ss]' ou 'DD/MM/YYYY' (v2) -> 'YYYY-MM-DD'; senão None."""
+    if not v:
+        return None
+    s = str(v).strip()
+    if len(s) >= 10 and s[4] == "-" and s[7] == "-":
+        return s[:10]
+    if len(s) >= 10 and s[2] == "/" and s[5] == "/":
+        return f"{s[6:10]}-{s[3:5]}-{s[0:2]}"
+    return None
+
+# situação e datas: poucos valores distintos, então memoiza (só valores hasheáveis)
+_sit_cache = {}
+_data_cache = {}
+_CACHE_MAX = 100_000
+
+def _vencimento(v):
+    try:
+        return _data_cache[v]
+    except KeyError:
+        if len(_data_cache) >= _CACHE_MAX:
+            _data_cache.clear()
+        d = _data_cache[v] = _norm_data(v)
+        return d
+    except TypeError:
+        return _norm_data(v)
+
+def _situacao_cod(v):
+    try:
+        return _sit_cache[v]
+    except KeyError:
+        if len(_sit_cache) >= _CACHE_MAX:
+            _sit_cache.clear()
+        cod = _sit_cache[v] = _norm_situacao(v)
+        return cod
+    except TypeError:  # dict (situação aninhada)
+        return _norm_situacao(v)
+
+
+# --------- Mapeamento ---------
+# Colunas gravadas na tabela principal, na ordem das tuplas devolvidas pelos extratores
+# (contato_id/contato_nome vão para a tabela `contatos`; o título guarda contato_ref).
+COLS = (
+    "id_bling", "numero_documento", "descricao", "categoria", "contato_id", "contato_nome",
+    "valor", "data_emissao", "data_vencimento", "data_pagamento", "situacao", "status",
+    "content_hash", "vencimento", "situacao_cod",
+)
+I_ID = COLS.index("id_bling")
+I_HASH = COLS.index("content_hash")
+
+# coluna -> (conversão, chaves na v3, chaves na v2); as chaves são tentadas em ordem
+# (a primeira com valor "verdadeiro" vence, como nos `a or b` de antes).
+#   texto: valor ou ""          str: str(valor ou "")        valor: float(valor ou 0)
+#   descricao: dict -> ["descricao"], senão valor ou ""
+#   "contato.id" lê item["contato"]["id"]
+# content_hash, vencimento e situacao_cod são derivadas (ver compilar()).
+CAMPOS = (
+    ("id_bling",         "str",       ("id",),                          ("id", "numero")),
+    ("numero_documento", "texto",     ("numeroDocumento", "numero"),    ("numeroDocumento", "numero")),
+    ("descricao",        "texto",     ("descricao", "historico"),       ("descricao", "historico")),
+    ("categoria",        "descricao", ("categoria",),                   ("categoria",)),
+    ("contato_id",       "str",       ("contato.id",),                  ("contato.id",)),
+    ("contato_nome",     "texto",     ("contato.nome",),                ("contato.nome",)),
+    ("valor",            "valor",     ("valor",),                       ("valor",)),
+    ("data_emissao",     "texto",     ("dataEmissao",),                 ("dataEmissao", "data")),
+    ("data_vencimento",  "texto",     ("dataVencimento",),              ("dataVencimento",)),
+    ("data_pagamento",   "texto",     ("dataPagamento",),               ("dataPagamento",)),
+    ("situacao",         "texto",     ("situacao",),                    ("situacao", "situacaoTitulo")),
+    ("status",           "texto",     ("status",),                      ("status",)),
+)
+
+_VERSOES = {"v3": 2, "v2": 3}  # índice das chaves em CAMPOS
+
+
+def _acesso(chave):
+    if "." in chave:
+        pai, filho = chave.split(".", 1)
+        return f'_{pai}.get("{filho}")'
+    return f'g("{chave}")'
+
+
+def _fonte(versao):
+    """Código-fonte do extrator de `versao` (v2/v3)."""
+    idx = _VERSOES[versao]
+    pais = sorted({c.split(".", 1)[0] for campo in CAMPOS for c in campo[idx] if "." in c})
+    src = ["def extrair(item, raw=None):", "    g = item.get"]
+    src += [f'    _{p} = g("{p}") or _VAZIO' for p in pais]
+    for coluna, conv, *chaves in CAMPOS:
+        expr = " or ".join(_acesso(c) for c in chaves[idx - 2])
+        if conv == "texto":
+            src.append(f'    {coluna} = {expr} or ""')
+        elif conv == "str":
+            src.append(f'    {coluna} = str({expr} or "")')
+        elif conv == "valor":
+            src.append(f"    {coluna} = float({expr} or 0)")
+        elif conv == "descricao":
+            src.append(f"    {coluna} = {expr}")
+            src.append(f'    {coluna} = {coluna}.get("descricao") if {coluna}.__class__ is dict else ({coluna} or "")')
+    src += [
+        "    if raw is None:",
+        "        # chaves ordenadas: mesmo payload -> mesmo texto -> mesmo hash",
+        "        raw = canonico = _dumps(item, ensure_ascii=False, sort_keys=True)",
+        "    else:",
+        "        # texto do streaming (formatação/ordem do Bling): o hash é sempre do JSON",
+        "        # canônico, para o mesmo título dar o mesmo hash por qualquer caminho",
+        "        canonico = _dumps(item, ensure_ascii=False, sort_keys=True)",
+        "    h = _hash0.copy()",
+        '    h.update(canonico.encode("utf-8"))',
+        "    content_hash = h.hexdigest()",
+        "    vencimento = _vencimento(data_vencimento)",
+        "    situacao_cod = _situacao_cod(situacao)",
+        f"    return ({', '.join(COLS)}), raw",
+    ]
+    return "\n".join(src)
+
+
+def compilar(versao="v3"):
+    """
+    Gera o extrator do formato `versao`: extrair(item, raw=None) -> (valores, raw).
+    `valores` é uma tupla na ordem de COLS; `raw` é o texto original do item (o do
+    parser em streaming, ou o dict serializado com chaves ordenadas). content_hash é
+    sempre do item serializado com chaves ordenadas, não do texto recebido: sync em
+    streaming, webhook e carga sintética dão o mesmo hash para o mesmo título.
+    """
+    ns = {
+        "_VAZIO": {}, "_dumps": json.dumps,
+        # blake2b de 16 bytes do JSON canônico; copiar o estado inicial evita o construtor
+        "_hash0": hashlib.blake2b(digest_size=16),
+        "_vencimento": _vencimento, "_situacao_cod": _situacao_cod,
+    }
+    exec(compile(_fonte(versao), f"<extrator {versao}>", "exec"), ns)
+    return ns["extrair"]
+
+
+_extratores = {}
+
+def extrator(versao="v3"):
+    """Extrator compilado (uma vez por processo) para o formato `versao`."""
+    fn = _extratores.get(versao)
+    if fn is None:
+        fn = _extratores[versao] = compilar(versao)
+    return fn
@@ -0,0 +1,207 @@
+# metrics.py — instrumentação do sync (tempo por fase, contadores, percentis)
+#
+# Cada execução cria um RunMetrics e o ativa com `ativar()`; o código instrumentado
+# (bling_api, database, sync) chama tempo()/contar()/observar(), que não fazem nada
+# quando não há execução ativa. O contexto é um ContextVar: as threads do pool de
+# páginas recebem uma cópia (ver sync._iter_paginated).
+import os, sys, json, time, threading, contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# fases medidas: espera = token bucket/429 + backoff de retries; token inclui o HTTP do refresh
+FASES = ("http", "espera", "token", "decode", "extract", "db")
+
+_atual = contextvars.ContextVar("bling_run_metrics", default=None)
+
+
+class RunMetrics:
+    def __init__(self, recurso="todos", modo=None):
+        self.recurso = recurso
+        self.modo = modo
+        self.inicio = datetime.now()
+        self._t0 = time.perf_counter()
+        self.fim = None
+        self.status = "rodando"
+        self.fases = {f: 0.0 for f in FASES}
+        self.contadores = {}
+        self.amostras = {}
+        self._lock = threading.Lock()
+
+    def add_tempo(self, fase, segundos):
+        with self._lock:
+            self.fases[fase] = self.fases.get(fase, 0.0) + segundos
+
+    def contar(self, nome, n=1):
+        with self._lock:
+            self.contadores[nome] = self.contadores.get(nome, 0) + n
+
+    def observar(self, nome, valor):
+        with self._lock:
+            self.amostras.setdefault(nome, []).append(valor)
+
+    def finalizar(self, status="ok"):
+        self.fim = datetime.now()
+        self.status = status
+        self.duracao = time.perf_counter() - self._t0
+
+    def percentis(self, nome, ps=(50, 90, 99)):
+        with self._lock:
+            xs = sorted(self.amostras.get(nome, ()))
+        if not xs:
+            return {}
+        return {f"p{p}": round(xs[min(len(xs) - 1, int(len(xs) * p / 100))], 2) for p in ps}
+
+    def resumo(self):
+        duracao = getattr(self, "duracao", time.perf_counter() - self._t0)
+        c = dict(self.contadores)
+        gravados = c.get("vistos", 0)
+        return {
+            "recurso": self.recurso,
+            "modo": self.modo,
+            "status": self.status,
+            "inicio": self.inicio.isoformat(timespec="seconds"),
+            "fim": self.fim.isoformat(timespec="seconds") if self.fim else None,
+            "duracao_s": round(duracao, 3),
+            "registros_s": round(gravados / duracao, 1) if duracao else 0.0,
+            "fases_s": {k: round(v, 3) for k, v in self.fases.items()},
+            "contadores": c,
+            "http_ms": self.percentis("http_ms"),
+        }
+
+
+def ativar(run):
+    """Ativa `run` no contexto atual; devolve o token para desativar()."""
+    return _atual.set(run)
+
+
+def desativar(token):
+    _atual.reset(token)
+
+
+def atual():
+    return _atual.get()
+
+
+@contextmanager
+def tempo(fase):
+    run = _atual.get()
+    if run is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        run.add_tempo(fase, time.perf_counter() - t0)
+
+
+def add_tempo(fase, segundos):
+    run = _atual.get()
+    if run is not None:
+        run.add_tempo(fase, segundos)
+
+
+def contar(nome, n=1):
+    run = _atual.get()
+    if run is not None:
+        run.contar(nome, n)
+
+
+def observar(nome, valor):
+    run = _atual.get()
+    if run is not None:
+        run.observar(nome, valor)
+
+
+# --------- Log JSON estruturado ---------
+METRICS_LOG = os.getenv("BLING_METRICS_LOG")  # arquivo JSONL; vazio = stderr
+TENANT = os.getenv("BLING_TENANT")  # definido pelo sync multi-tenant (src/services/tenants.py)
+_log_lock = threading.Lock()
+
+
+def log_json(evento: dict):
+    if TENANT:
+        evento = {"tenant": TENANT, **evento}
+    linha = json.dumps(evento, ensure_ascii=False)
+    with _log_lock:
+        if METRICS_LOG:
+            with open(METRICS_LOG, "a", encoding="utf-8") as f:
+                f.write(linha + "\n")
+        else:
+            print(linha, file=sys.stderr, flush=True)
+
+
+# --------- Endpoint Prometheus (texto) ---------
+def render_prometheus(con):
+    """Métricas no formato texto do Prometheus a partir da tabela sync_runs."""
+    out = [
+        "# HELP bling_sync_runs_total Execuções de sync registradas, por recurso e status.",
+        "# TYPE bling_sync_runs_total counter",
+    ]
+    for recurso, status, n in con.execute("SELECT recurso, status, COUNT(*) FROM sync_runs GROUP BY recurso, status"):
+        out.append(f'bling_sync_runs_total{{recurso="{recurso}",status="{status}"}} {n}')
+
+    ultimas = con.execute("""
+        SELECT r.recurso, r.fim, r.duracao_s, r.registros_s, r.status, r.metricas
+        FROM sync_runs r
+        JOIN (SELECT recurso, MAX(id) AS id FROM sync_runs GROUP BY recurso) u ON u.id = r.id
+    """).fetchall()
+    gauges = {
+        "bling_sync_last_run_timestamp_seconds": "Fim da última execução (epoch).",
+        "bling_sync_last_run_duration_seconds": "Duração da última execução.",
+        "bling_sync_last_run_records_per_second": "Registros/s da última execução.",
+        "bling_sync_last_run_success": "1 se a última execução terminou ok.",
+        "bling_sync_last_run_phase_seconds": "Tempo por fase na última execução.",
+        "bling_sync_last_run_count": "Contadores da última execução (páginas, bytes, linhas...).",
+        "bling_sync_last_run_http_latency_ms": "Percentis de latência HTTP na última execução.",
+    }
+    linhas = {k: [] for k in gauges}
+    for recurso, fim, duracao, rps, status, metricas in ultimas:
+        m = json.loads(metricas or "{}")
+        lbl = f'recurso="{recurso}"'
+        if fim:
+            ts = datetime.fromisoformat(fim).timestamp()
+            linhas["bling_sync_last_run_timestamp_seconds"].append(f"{{{lbl}}} {ts:.0f}")
+        linhas["bling_sync_last_run_duration_seconds"].append(f"{{{lbl}}} {duracao or 0}")
+        linhas["bling_sync_last_run_records_per_second"].append(f"{{{lbl}}} {rps or 0}")
+        linhas["bling_sync_last_run_success"].append(f"{{{lbl}}} {1 if status == 'ok' else 0}")
+        for fase, s in (m.get("fases_s") or {}).items():
+            linhas["bling_sync_last_run_phase_seconds"].append(f'{{{lbl},fase="{fase}"}} {s}')
+        for nome, v in (m.get("contadores") or {}).items():
+            linhas["bling_sync_last_run_count"].append(f'{{{lbl},nome="{nome}"}} {v}')
+        for q, v in (m.get("http_ms") or {}).items():
+            linhas["bling_sync_last_run_http_latency_ms"].append(f'{{{lbl},quantile="{int(q[1:]) / 100:g}"}} {v}')
+    for nome, ajuda in gauges.items():
+        out.append(f"# HELP {nome} {ajuda}")
+        out.append(f"# TYPE {nome} gauge")
+        out.extend(f"{nome}{l}" for l in linhas[nome])
+    return "\n".join(out) + "\n"
+
+
+def serve_metrics(porta, conectar, host="0.0.0.0"):
+    """Sobe /metrics numa thread; `conectar()` devolve uma conexão sqlite nova por scrape."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):  # silencia logs chatos
+            return
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_response(404); self.end_headers()
+                return
+            con = conectar()
+            try:
+                body = render_prometheus(con).encode("utf-8")
+            finally:
+                con.close()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    httpd = ThreadingHTTPServer((host, porta), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="metrics-http", daemon=True).start()
+    return httpd
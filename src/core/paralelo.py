@@ -0,0 +1,16 @@
+# paralelo.py — utilitários dos pools de processos (gerador sintético, reindex)
+
+
+def em_ordem(ex, fn, args, janela):
+    """
+    Como ex.map(fn, *zip(*args)), mas com no máximo `janela` tarefas submetidas e ainda não
+    consumidas: o consumidor (em geral um gravador único) controla quanto fica em memória
+    à frente dele. Entrega os resultados na ordem de `args`.
+    """
+    pendentes = []
+    for a in args:
+        pendentes.append(ex.submit(fn, *a))
+        if len(pendentes) >= janela:
+            yield pendentes.pop(0).result()
+    for f in pendentes:
+        yield f.result()
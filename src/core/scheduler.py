@@ -1,6 +1,7 @@
 # scheduler.py
-import time, traceback
-from sync import main as run_sync
+# O loop com time.sleep foi substituído pelo daemon em processo único.
+import traceback
+from src.services.sync import main as run_sync
 
 def job():
     try:
@@ -10,8 +11,5 @@ def job():
         traceback.print_exc()
 
 if __name__ == "__main__":
-    # loop simples de 1h
-    while True:
-        job()
-        print("Aguardando 1h para a próxima execução...")
-        time.sleep(60 * 60)
+    from src.services.daemon import main
+    main()
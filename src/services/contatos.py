@@ -0,0 +1,78 @@
+# src/services/contatos.py — dimensão de contatos completada pela API, com cache por id e TTL
+#
+# Os títulos só referenciam o contato (contato_ref -> contatos.id). O sync dos títulos já
+# cria cada contato com o que vem no título (id e nome); aqui os contatos nunca buscados,
+# ou buscados há mais de BLING_CONTATOS_TTL_HORAS, são completados com GET contatos/{id}
+# (v3): no máximo BLING_CONTATOS_LOTE por execução, CONTATOS_CONCORRENCIA ao mesmo tempo
+# e dentro do mesmo rate limit. Dentro do TTL um contato não é buscado de novo, por mais
+# títulos que o referenciem.
+#
+#   python -m src.services.contatos [--limite 500]
+import os, argparse, contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from database import migrate, get_conn, close_conn, contatos_a_buscar, gravar_contatos_api
+except ImportError:
+    from src.database import migrate, get_conn, close_conn, contatos_a_buscar, gravar_contatos_api
+
+try:
+    from src.api.bling_api import get_contato, versao_api
+except ImportError:
+    try:
+        from api.bling_api import get_contato, versao_api
+    except ImportError:
+        from bling_api import get_contato, versao_api
+
+# contatos buscados por execução (0 = só o que vem nos títulos)
+CONTATOS_LOTE = int(os.getenv("BLING_CONTATOS_LOTE", "500"))
+CONTATOS_CONCORRENCIA = int(os.getenv("BLING_CONTATOS_CONCORRENCIA", "4"))
+
+
+def atualizar_contatos(limite=CONTATOS_LOTE, concorrencia=CONTATOS_CONCORRENCIA, buscar=get_contato,
+                       parar=None, bloco=100):
+    """
+    Busca na API os contatos pendentes (sem busca ou com TTL vencido), gravando a cada
+    `bloco` (uma interrupção não perde o que já foi buscado). Só na v3.
+    Retorna {"buscados": n, "nao_encontrados": m}.
+    """
+    stats = {"buscados": 0, "nao_encontrados": 0}
+    if limite <= 0 or versao_api() != "v3":
+        return stats
+    ids = contatos_a_buscar(limite)
+    con = get_conn()
+    with ThreadPoolExecutor(max_workers=max(1, concorrencia), thread_name_prefix="contatos") as ex:
+        for i in range(0, len(ids), bloco):
+            if parar is not None and parar.is_set():
+                stats["interrompido"] = True
+                break
+            parte = ids[i:i + bloco]
+            # cópia do contexto: as requisições contam na execução atual (metrics)
+            futuros = [ex.submit(contextvars.copy_context().run, buscar, id_bling) for id_bling in parte]
+            linhas = []
+            for id_bling, f in zip(parte, futuros):
+                c = f.result()
+                if c:
+                    stats["buscados"] += 1
+                    linhas.append((id_bling, c.get("nome") or None, c.get("numeroDocumento") or None,
+                                   c.get("tipo") or None))
+                else:  # 404: fica o nome dos títulos, tenta de novo depois do TTL
+                    stats["nao_encontrados"] += 1
+                    linhas.append((id_bling, None, None, None))
+            with con:
+                gravar_contatos_api(con, linhas)
+    return stats
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Completa a tabela de contatos pela API do Bling (cache com TTL).")
+    ap.add_argument("--limite", type=int, default=CONTATOS_LOTE, help="máximo de contatos buscados")
+    args = ap.parse_args(argv)
+    migrate()
+    r = atualizar_contatos(args.limite)
+    close_conn()
+    print(f" Contatos: {r['buscados']} atualizados pela API, {r['nao_encontrados']} não encontrados")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# src/services/daemon.py — sync contínuo em processo único
+#
+# Substitui o subprocess por execução (auto_sync.py) e o loop de scheduler.py:
+# sessão HTTP, tokens e conexões SQLite ficam quentes entre execuções.
+# Cada recurso roda numa thread própria com seu intervalo; uma execução nunca
+# se sobrepõe à anterior (horários perdidos durante uma execução longa são pulados).
+#
+#   python -m src.services.daemon [--intervalo-pagar 60] [--intervalo-receber 60] [--full-cada 24]
+#                                 [--metrics-porta 9108] [--webhook-porta 8081] [--relatorios-porta 8090]
+import os, time, signal, argparse, threading, traceback
+from datetime import datetime
+
+try:
+    from database import migrate, close_conn, _conn, ultimo_completo
+except ImportError:
+    from src.database import migrate, close_conn, _conn, ultimo_completo
+
+from src.core import metrics
+
+from src.services.sync import sync_contas_pagar, sync_contas_receber
+
+try:
+    from src.api.bling_api import http_stats
+except ImportError:
+    from bling_api import http_stats
+
+# minutos / horas
+INTERVALO_PAGAR = float(os.getenv("BLING_INTERVALO_PAGAR", "60"))
+INTERVALO_RECEBER = float(os.getenv("BLING_INTERVALO_RECEBER", "60"))
+FULL_CADA_HORAS = float(os.getenv("BLING_FULL_CADA_HORAS", "24"))
+# porta do endpoint /metrics (Prometheus); 0 = desligado
+METRICS_PORTA = int(os.getenv("BLING_METRICS_PORTA", "0"))
+# porta do receptor de webhooks (src/services/webhook.py); 0 = desligado
+WEBHOOK_PORTA = int(os.getenv("BLING_WEBHOOK_PORTA", "0"))
+# porta da API de relatórios (src/services/report_server.py); 0 = desligado
+RELATORIOS_PORTA = int(os.getenv("BLING_REPORT_PORTA", "0"))
+
+
+def _log(msg):
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}", flush=True)
+
+
+def _resumo_contatos(c):
+    if "erro" in c:
+        return f", contatos: erro ({c['erro']})"
+    return f", contatos buscados: {c['buscados']}" if c.get("buscados") else ""
+
+
+class _Worker(threading.Thread):
+    """Executa fn(full, parar) a cada `intervalo` segundos, sempre em série."""
+
+    def __init__(self, nome, fn, intervalo, full_cada, parar):
+        super().__init__(name=f"sync-{nome}", daemon=True)
+        self.nome = nome
+        self.fn = fn
+        self.intervalo = intervalo
+        self.full_cada = full_cada
+        self.parar = parar
+        self.ultimo_full = None  # time.monotonic() do início do último completo
+
+    def _carregar_ultimo_full(self):
+        """
+        Último completo com sucesso registrado em sync_runs, convertido para o relógio
+        monotônico: reiniciar o daemon não força outro completo antes de `full_cada`.
+        """
+        try:
+            inicio = ultimo_completo(self.nome)
+        except Exception:
+            _log(f"{self.nome}: não foi possível ler o último sync completo")
+            traceback.print_exc()
+            return
+        if inicio is None:
+            return  # banco sem sync completo: o primeiro é completo
+        idade = max(0.0, (datetime.now() - datetime.fromisoformat(inicio)).total_seconds())
+        self.ultimo_full = time.monotonic() - idade
+        if self.full_cada > 0:
+            _log(f"{self.nome}: último completo em {inicio}; próximo em "
+                 f"{max(0.0, self.full_cada - idade) / 3600:.1f} h")
+
+    def _executar(self):
+        agora = time.monotonic()
+        full = self.full_cada > 0 and (self.ultimo_full is None or agora - self.ultimo_full >= self.full_cada)
+        t0 = time.perf_counter()
+        try:
+            r = self.fn(full=full, parar=self.parar)
+        except Exception:
+            _log(f"{self.nome}: erro na sincronização")
+            traceback.print_exc()
+            return
+        # sem high-water mark o sync faz completo mesmo sem ser pedido: também conta
+        if (full or r.get("incremental") is False) and not r.get("interrompido"):
+            self.ultimo_full = agora
+        _log(f"{self.nome}: {'completo' if full else 'incremental'} em {time.perf_counter() - t0:.1f}s "
+             f"(vistos: {r['vistos']}, novos: {r['inseridos']}, atualizados: {r['atualizados']}, "
+             f"inalterados: {r['inalterados']}, excluídos: {r['excluidos']}"
+             f"{', interrompido' if r.get('interrompido') else ''}"
+             f"{', varredura recusada' if r.get('varredura_recusada') else ''}"
+             f"{_resumo_contatos(r.get('contatos') or {})})")
+
+    def run(self):
+        try:
+            self._carregar_ultimo_full()
+            proximo = time.monotonic()
+            while not self.parar.is_set():
+                self._executar()
+                if self.parar.is_set():
+                    break
+                proximo += self.intervalo
+                agora = time.monotonic()
+                if proximo <= agora:
+                    # execução passou do intervalo: pula os horários perdidos em vez de encavalar
+                    pulados = int((agora - proximo) // self.intervalo) + 1
+                    proximo += pulados * self.intervalo
+                    _log(f"{self.nome}: execução longa, {pulados} horário(s) pulado(s)")
+                self.parar.wait(proximo - agora)
+        finally:
+            close_conn()  # conexão desta thread
+
+
+def run(intervalo_pagar=INTERVALO_PAGAR, intervalo_receber=INTERVALO_RECEBER, full_cada_horas=FULL_CADA_HORAS,
+        metrics_porta=METRICS_PORTA, webhook_porta=WEBHOOK_PORTA, relatorios_porta=RELATORIOS_PORTA):
+    parar = threading.Event()
+
+    def _sinal(signum, frame):
+        _log(f"sinal {signal.Signals(signum).name} recebido, finalizando após a página atual...")
+        parar.set()
+
+    signal.signal(signal.SIGTERM, _sinal)
+    signal.signal(signal.SIGINT, _sinal)
+
+    migrate()
+    httpd = None
+    if metrics_porta:
+        httpd = metrics.serve_metrics(metrics_porta, conectar=_conn)
+        _log(f"métricas em http://0.0.0.0:{metrics_porta}/metrics")
+    receptor = None
+    if webhook_porta:
+        from src.services import webhook
+        receptor = webhook.iniciar(webhook_porta)
+        _log(f"webhooks em http://0.0.0.0:{webhook_porta}/")
+    relatorios = None
+    if relatorios_porta:
+        from src.services import report_server
+        relatorios = report_server.iniciar(relatorios_porta)
+        _log(f"relatórios em http://0.0.0.0:{relatorios_porta}/relatorios")
+    full_cada = full_cada_horas * 3600
+    workers = [
+        _Worker("contas_pagar", sync_contas_pagar, intervalo_pagar * 60, full_cada, parar),
+        _Worker("contas_receber", sync_contas_receber, intervalo_receber * 60, full_cada, parar),
+    ]
+    _log(f"daemon iniciado (pagar a cada {intervalo_pagar:g} min, receber a cada {intervalo_receber:g} min, "
+         f"completo a cada {full_cada_horas:g} h)")
+    for w in workers:
+        w.start()
+    while not parar.is_set():
+        parar.wait(60)
+    for w in workers:
+        w.join()
+    if httpd is not None:
+        httpd.shutdown()
+    if receptor is not None:
+        webhook.parar(*receptor)
+    if relatorios is not None:
+        report_server.parar(*relatorios)
+    h = http_stats()
+    _log(f"daemon encerrado. HTTP: {h['requisicoes']} requisições, {h['retries']} retries, "
+         f"conexões abertas: {h['conexoes_abertas']}, reutilizadas: {h['conexoes_reutilizadas']}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Sincronização contínua com o Bling (processo único).")
+    ap.add_argument("--intervalo-pagar", type=float, default=INTERVALO_PAGAR, help="minutos entre syncs de contas a pagar")
+    ap.add_argument("--intervalo-receber", type=float, default=INTERVALO_RECEBER, help="minutos entre syncs de contas a receber")
+    ap.add_argument("--full-cada", type=float, default=FULL_CADA_HORAS,
+                    help="horas entre syncs completos (0 = nunca força; o primeiro sync do banco é sempre completo)")
+    ap.add_argument("--metrics-porta", type=int, default=METRICS_PORTA, help="serve /metrics (Prometheus) nesta porta; 0 = desligado")
+    ap.add_argument("--webhook-porta", type=int, default=WEBHOOK_PORTA, help="recebe webhooks do Bling nesta porta; 0 = desligado")
+    ap.add_argument("--relatorios-porta", type=int, default=RELATORIOS_PORTA,
+                    help="serve a API de relatórios nesta porta; 0 = desligado")
+    args = ap.parse_args(argv)
+    run(args.intervalo_pagar, args.intervalo_receber, args.full_cada, args.metrics_porta, args.webhook_porta,
+        args.relatorios_porta)
+
+
+if __name__ == "__main__":
+    main()
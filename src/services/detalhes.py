@@ -0,0 +1,101 @@
+# src/services/detalhes.py — hidratação dos títulos da listagem v3 com o detalhe por id
+#
+# A listagem de contas/{pagar,receber} da v3 traz um resumo do título: categoria,
+# contato.nome, numeroDocumento etc. costumam faltar, e as colunas ficam vazias.
+# Com a hidratação ligada (BLING_HIDRATAR=1 ou sync --hidratar), cada página passa por:
+#   1. versão de cada item = hash do texto do resumo na listagem;
+#   2. ids sem detalhe em cache, ou com versão diferente (novo/alterado) -> GET contas/{tipo}/{id},
+#      com no máximo HIDRATAR_CONCORRENCIA buscas simultâneas (e o mesmo rate limit do sync);
+#   3. o título gravado é o resumo completado pelo detalhe; o resultado vai para detalhe_cache
+#      na mesma transação da página.
+# Título inalterado na listagem usa o detalhe em cache: nenhuma requisição extra (sem N+1).
+import os, json, hashlib, contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from database import detalhes_em_cache, gravar_detalhes
+except ImportError:
+    from src.database import detalhes_em_cache, gravar_detalhes
+
+from src.core import metrics
+
+try:
+    from src.api.bling_api import get_conta
+except ImportError:
+    try:
+        from api.bling_api import get_conta
+    except ImportError:
+        from bling_api import get_conta
+
+HIDRATAR = os.getenv("BLING_HIDRATAR", "0") == "1"
+HIDRATAR_CONCORRENCIA = int(os.getenv("BLING_HIDRATAR_CONCORRENCIA", "4"))
+
+
+def versao(raw: str) -> str:
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _dumps(item):
+    return json.dumps(item, ensure_ascii=False, sort_keys=True)
+
+
+class Hidratador:
+    """Completa as páginas de uma tabela com o detalhe dos títulos novos/alterados."""
+
+    def __init__(self, tabela, buscar=get_conta, concorrencia=HIDRATAR_CONCORRENCIA):
+        self.tabela = tabela
+        self.tipo = tabela.split("_", 1)[1]  # contas_pagar -> pagar
+        self.buscar = buscar
+        self.ex = ThreadPoolExecutor(max_workers=max(1, concorrencia), thread_name_prefix=f"detalhe-{self.tipo}")
+        self.pendentes = []  # (id, versao, payload) a gravar com a página
+        self.stats = {"buscados": 0, "em_cache": 0, "sem_detalhe": 0}
+
+    def fechar(self):
+        self.ex.shutdown(wait=True, cancel_futures=True)
+
+    def pagina(self, batch):
+        """Itens da página (dicts ou (item, raw) do streaming) -> lista de (item, raw) hidratados."""
+        self.pendentes = []
+        itens = []
+        for x in batch:
+            item, raw = x if x.__class__ is tuple else (x, None)
+            itens.append((item, raw if raw is not None else _dumps(item)))
+        ids = [str(item.get("id") or "") for item, _ in itens]
+        cache = detalhes_em_cache(self.tabela, [i for i in ids if i])
+        versoes = [versao(raw) for _, raw in itens]
+
+        buscar = {}
+        for id_bling, v in zip(ids, versoes):
+            if id_bling and cache.get(id_bling, (None,))[0] != v and id_bling not in buscar:
+                # cópia do contexto: as requisições contam na execução atual (metrics)
+                buscar[id_bling] = self.ex.submit(contextvars.copy_context().run, self.buscar, self.tipo, id_bling)
+
+        saida = []
+        for (item, raw), id_bling, v in zip(itens, ids, versoes):
+            if id_bling in buscar:
+                detalhe = buscar[id_bling].result()
+                if not detalhe:  # sumiu entre a listagem e o detalhe: fica o resumo, tenta de novo depois
+                    self.stats["sem_detalhe"] += 1
+                    saida.append((item, raw))
+                    continue
+                completo = {**item, **detalhe}
+                payload = _dumps(completo)
+                self.pendentes.append((id_bling, v, payload))
+                saida.append((completo, payload))
+            elif id_bling in cache:
+                payload = cache[id_bling][1]
+                saida.append((json.loads(payload), payload))
+            else:
+                saida.append((item, raw))
+        n_cache = sum(1 for i in ids if i in cache and i not in buscar)
+        self.stats["buscados"] += len(buscar)
+        self.stats["em_cache"] += n_cache
+        metrics.contar("detalhes_buscados", len(buscar))
+        metrics.contar("detalhes_em_cache", n_cache)
+        return saida
+
+    def gravar(self, con):
+        """Grava no cache os detalhes buscados (chamar dentro da transação da página)."""
+        if self.pendentes:
+            gravar_detalhes(con, self.tabela, self.pendentes)
+            self.pendentes = []
@@ -0,0 +1,244 @@
+# src/services/export.py — exporta contas_pagar/contas_receber para Parquet particionado
+#
+# Uma partição por ano-mês do vencimento (layout Hive, lido direto por pyarrow.dataset,
+# DuckDB, Polars, Spark...):
+#   <destino>/contas_receber/ano_mes=2025-03/dados.parquet
+#   <destino>/contas_receber/ano_mes=sem_data/dados.parquet   (vencimento nulo)
+#
+# Incremental: o manifesto <destino>/_export.json guarda, por tabela, a marca de
+# updated_at da última exportação e a contagem de linhas por partição. Só são
+# reescritas as partições com linhas alteradas desde a marca ou cuja contagem mudou
+# (título que trocou de vencimento sai de uma partição e entra em outra).
+#
+#   python -m src.services.export --destino export/ [--full] [--paralelo 4]
+#
+# Requer pyarrow (opcional; só este comando usa): pip install pyarrow
+import os, json, shutil, sqlite3, argparse, tempfile
+from pathlib import Path
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from database import _norm_data
+except ImportError:
+    from src.database import _norm_data
+
+DB_PATH = os.getenv("BLING_DB_PATH", "bling.db")
+TABELAS = ("contas_pagar", "contas_receber")
+SEM_DATA = "sem_data"
+LOTE = 50_000  # linhas por record batch (memória limitada ao lote)
+MANIFESTO = "_export.json"
+
+# coluna de saída -> expressão SQL; a ordem é a do arquivo. Contato vem de `contatos`
+# (renomear um contato não altera o título: para refletir em partições antigas, use --full)
+_SELECT = (
+    ("id_bling", "id_bling"),
+    ("numero_documento", "numero_documento"),
+    ("descricao", "descricao"),
+    ("categoria", "categoria"),
+    ("contato_id", "(SELECT id_bling FROM contatos WHERE contatos.id = contato_ref)"),
+    ("contato_nome", "(SELECT nome FROM contatos WHERE contatos.id = contato_ref)"),
+    ("valor", "valor"),
+    ("data_emissao", "norm_data(data_emissao)"),
+    ("data_vencimento", "vencimento"),
+    ("data_pagamento", "norm_data(data_pagamento)"),
+    ("situacao", "CAST(situacao AS TEXT)"),
+    ("situacao_cod", "situacao_cod"),
+    ("status", "status"),
+    ("created_at", "created_at"),
+    ("updated_at", "updated_at"),
+    ("excluido_em", "excluido_em"),
+)
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Exportação Parquet requer pyarrow: pip install pyarrow") from None
+    return pa, pq
+
+
+def _schema(pa):
+    texto = pa.string()
+    return pa.schema([
+        ("id_bling", texto),
+        ("numero_documento", texto),
+        ("descricao", texto),
+        ("categoria", texto),
+        ("contato_id", texto),
+        ("contato_nome", texto),
+        ("valor", pa.float64()),
+        ("data_emissao", pa.date32()),
+        ("data_vencimento", pa.date32()),
+        ("data_pagamento", pa.date32()),
+        ("situacao", texto),
+        ("situacao_cod", pa.dictionary(pa.int32(), texto)),
+        ("status", texto),
+        ("created_at", pa.timestamp("s")),
+        ("updated_at", pa.timestamp("s")),
+        ("excluido_em", pa.timestamp("s")),
+    ])
+
+
+def _conn_leitura():
+    # somente leitura: a exportação nunca trava o sync
+    con = sqlite3.connect(f"file:{Path(DB_PATH).resolve()}?mode=ro", uri=True, timeout=30)
+    con.create_function("norm_data", 1, _norm_data, deterministic=True)
+    return con
+
+
+def _ano_mes_sql():
+    return f"IFNULL(substr(vencimento, 1, 7), '{SEM_DATA}')"
+
+
+def _filtro_particao(ano_mes):
+    """WHERE da partição (usa o índice de vencimento)."""
+    if ano_mes == SEM_DATA:
+        return "vencimento IS NULL", ()
+    ano, mes = map(int, ano_mes.split("-"))
+    fim = date(ano + mes // 12, mes % 12 + 1, 1).isoformat()
+    return "vencimento >= ? AND vencimento < ?", (f"{ano_mes}-01", fim)
+
+
+# --------- Manifesto ---------
+def _ler_manifesto(destino):
+    try:
+        return json.loads((destino / MANIFESTO).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _gravar_manifesto(destino, manifesto):
+    fd, tmp = tempfile.mkstemp(dir=destino, prefix=".export.")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, destino / MANIFESTO)
+
+
+# --------- Detecção de partições alteradas ---------
+def particoes_alteradas(con, tabela, estado):
+    """
+    (contagens, alteradas, removidas) comparando o banco com o `estado` do manifesto
+    ({"marca": ..., "particoes": {ano_mes: qtd}}); estado vazio = tudo alterado.
+    """
+    contagens = dict(con.execute(f"SELECT {_ano_mes_sql()}, COUNT(*) FROM {tabela} GROUP BY 1"))
+    antigas = estado.get("particoes", {})
+    marca = estado.get("marca")
+    if marca is None:
+        alteradas = set(contagens)
+    else:
+        alteradas = {am for (am,) in con.execute(
+            f"SELECT DISTINCT {_ano_mes_sql()} FROM {tabela} WHERE updated_at >= ?", (marca,))}
+        alteradas |= {am for am, n in contagens.items() if antigas.get(am) != n}
+    removidas = set(antigas) - set(contagens)
+    return contagens, sorted(alteradas), sorted(removidas)
+
+
+# --------- Escrita ---------
+def _lote_arrow(pa, schema, linhas):
+    colunas = list(zip(*linhas))
+    arrays = []
+    for valores, campo in zip(colunas, schema):
+        tipo = campo.type
+        if pa.types.is_date32(tipo) or pa.types.is_timestamp(tipo):
+            # texto ISO -> timestamp -> data no próprio Arrow (sem objetos date por linha)
+            arr = pa.array([v or None for v in valores], pa.string()).cast(pa.timestamp("s")).cast(tipo)
+        elif pa.types.is_dictionary(tipo):
+            arr = pa.array(valores, pa.string()).dictionary_encode()
+        else:
+            arr = pa.array(valores, tipo)
+        arrays.append(arr)
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def exportar_particao(tabela, ano_mes, destino, compressao="zstd"):
+    """Reescreve uma partição (arquivo temporário + os.replace). Retorna o nº de linhas."""
+    pa, pq = _pyarrow()
+    schema = _schema(pa)
+    pasta = Path(destino) / tabela / f"ano_mes={ano_mes}"
+    pasta.mkdir(parents=True, exist_ok=True)
+    where, params = _filtro_particao(ano_mes)
+    cols = ", ".join(expr for _, expr in _SELECT)
+    con = _conn_leitura()
+    fd, tmp = tempfile.mkstemp(dir=pasta, prefix=".dados.", suffix=".parquet")
+    os.close(fd)
+    n = 0
+    try:
+        cur = con.execute(f"SELECT {cols} FROM {tabela} WHERE {where} ORDER BY vencimento, id", params)
+        with pq.ParquetWriter(tmp, schema, compression=compressao) as w:
+            while True:
+                linhas = cur.fetchmany(LOTE)
+                if not linhas:
+                    break
+                w.write_batch(_lote_arrow(pa, schema, linhas))
+                n += len(linhas)
+        os.replace(tmp, pasta / "dados.parquet")
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    finally:
+        con.close()
+    return n
+
+
+def exportar(destino="export", full=False, paralelo=4, tabelas=TABELAS):
+    """
+    Exporta as partições alteradas desde a última execução (ou todas, com full=True).
+    Partições independentes são escritas em paralelo, cada uma com sua conexão.
+    Retorna {tabela: {"reescritas": [...], "removidas": [...], "linhas": n}}.
+    """
+    _pyarrow()  # falha cedo, antes de tocar no destino
+    destino = Path(destino)
+    destino.mkdir(parents=True, exist_ok=True)
+    manifesto = {} if full else _ler_manifesto(destino)
+    resultado = {}
+
+    con = _conn_leitura()
+    try:
+        planos = {}
+        con.execute("BEGIN")  # mesma leitura (snapshot) para marca e contagens
+        # a marca é o "agora" do banco antes da leitura: o que for gravado durante
+        # a exportação tem updated_at >= marca e entra na próxima
+        marca = con.execute("SELECT datetime('now')").fetchone()[0]
+        for tabela in tabelas:
+            planos[tabela] = particoes_alteradas(con, tabela, manifesto.get(tabela, {}))
+        con.rollback()
+    finally:
+        con.close()
+
+    with ThreadPoolExecutor(max_workers=max(1, paralelo)) as ex:
+        futuros = {tabela: [ex.submit(exportar_particao, tabela, am, destino) for am in plano[1]]
+                   for tabela, plano in planos.items()}
+        for tabela, (contagens, alteradas, removidas) in planos.items():
+            linhas = sum(f.result() for f in futuros[tabela])
+            for am in removidas:
+                shutil.rmtree(destino / tabela / f"ano_mes={am}", ignore_errors=True)
+            manifesto[tabela] = {"marca": marca, "particoes": contagens}
+            resultado[tabela] = {"reescritas": alteradas, "removidas": removidas, "linhas": linhas}
+            # manifesto a cada tabela: uma falha depois não refaz o que já foi escrito
+            _gravar_manifesto(destino, manifesto)
+    return resultado
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Exporta os títulos para Parquet particionado por ano-mês do vencimento.")
+    ap.add_argument("--destino", default=os.getenv("BLING_EXPORT_DIR", "export"))
+    ap.add_argument("--full", action="store_true", help="ignora o manifesto e reescreve todas as partições")
+    ap.add_argument("--paralelo", type=int, default=min(4, os.cpu_count() or 1), help="partições escritas em paralelo")
+    args = ap.parse_args(argv)
+    try:
+        r = exportar(args.destino, args.full, args.paralelo)
+    except RuntimeError as e:
+        raise SystemExit(f" {e}")
+    for tabela, info in r.items():
+        print(f" {tabela}: {len(info['reescritas'])} partição(ões) reescrita(s), {info['linhas']} linhas"
+              + (f", {len(info['removidas'])} removida(s)" if info["removidas"] else ""))
+
+
+if __name__ == "__main__":
+    main()
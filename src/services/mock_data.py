@@ -1,30 +1,246 @@
-# mock_data.py
-import sqlite3, random, datetime
-
-DB_PATH = "bling.db"
-con = sqlite3.connect(DB_PATH)
-cur = con.cursor()
-
-nomes = ["Cliente A", "Cliente B", "Fornecedor X", "Fornecedor Y"]
-situacoes = ["ABERTA", "BAIXADA"]
-
-def add_mock(tabela, tipo):
-    for i in range(5):
-        id_bling = f"{tipo}_{i}"
-        descricao = f"{tipo.capitalize()} teste {i}"
-        valor = round(random.uniform(50, 500), 2)
-        data_venc = (datetime.date.today() + datetime.timedelta(days=random.randint(-3, 3))).isoformat()
-        situacao = random.choice(situacoes)
-        nome = random.choice(nomes)
-
-        cur.execute(f"""
-        INSERT OR IGNORE INTO {tabela} (id_bling, descricao, contato_nome, valor, data_vencimento, situacao)
-        VALUES (?, ?, ?, ?, ?, ?)
-        """, (id_bling, descricao, nome, valor, data_venc, situacao))
-
-add_mock("contas_pagar", "pagar")
-add_mock("contas_receber", "receber")
-
-con.commit()
-con.close()
-print("✅ Dados de teste inseridos no banco!")
+# mock_data.py — gerador determinístico de títulos sintéticos (testes de carga/benchmarks)
+#
+# Gera contas a pagar/receber com a forma dos payloads da API (v3 ou v2) e grava pelo
+# mesmo mapeamento do sync (extrator), com payload original comprimido em {tabela}_raw.
+#
+#   python -m src.services.mock_data --titulos 1000000 [--seed 42] [--versao v3|v2]
+#          [--contatos 5000] [--referencia 2025-06-30] [--processos 4] [--modo massa|upsert]
+#
+# Mesmo seed + mesma referência = mesmos títulos, em qualquer máquina e com qualquer nº
+# de processos: cada bloco de BLOCO títulos tem o próprio gerador aleatório (derivado de
+# seed, tipo e nº do bloco), e os blocos são gravados na ordem.
+# Distribuições:
+#   - contatos: Zipf (poucos contatos concentram muitos títulos); fornecedores (pagar) e
+#     clientes (receber) são cadastros distintos;
+#   - emissão nos últimos ~18 meses (mais recentes são mais comuns), prazos usuais (0–120 dias);
+#   - situação coerente com o vencimento: vencidos quase todos pagos (uma parte inadimplente),
+#     a vencer quase todos em aberto; pagamento perto do vencimento.
+# Modos de gravação:
+#   massa  (padrão) uma transação, sem leitura de hashes nem triggers (agregados recalculados no fim)
+#   upsert          database.upsert_rows por bloco, o mesmo caminho do sync
+import os, json, time, random, hashlib, argparse, itertools, multiprocessing
+from bisect import bisect
+from datetime import date, timedelta
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+from src.core.paralelo import em_ordem
+
+BLOCO = 20_000  # títulos por bloco; faz parte do determinismo (não mude sem mudar o seed)
+TIPOS = {"pagar": "contas_pagar", "receber": "contas_receber"}
+ZIPF_S = 1.1
+
+_SITUACAO_V3 = {"ABERTO": 1, "PAGO": 2, "PARCIAL": 3, "DEVOLVIDO": 4, "CANCELADO": 5}
+_SITUACAO_V2 = {"ABERTO": "em aberto", "PAGO": "pago", "PARCIAL": "parcial", "DEVOLVIDO": "devolvido",
+                "CANCELADO": "cancelado"}
+# (situação, peso) por momento do título
+_MIX_VENCIDO = (("PAGO", 80), ("ABERTO", 12), ("PARCIAL", 3), ("CANCELADO", 4), ("DEVOLVIDO", 1))
+_MIX_A_VENCER = (("ABERTO", 88), ("PAGO", 7), ("PARCIAL", 2), ("CANCELADO", 3))
+_PRAZOS = ((0, 8), (7, 6), (14, 8), (21, 5), (28, 14), (30, 22), (45, 12), (60, 12), (90, 9), (120, 4))
+_CATEGORIAS = {
+    "pagar": ("Fornecedores", "Aluguel", "Energia", "Folha", "Impostos", "Frete", "Serviços", "Marketing"),
+    "receber": ("Vendas", "Serviços", "Assinaturas", "Locação", "Comissões"),
+}
+_NOMES = ("Silva", "Souza", "Oliveira", "Santos", "Pereira", "Lima", "Costa", "Ferreira", "Almeida", "Ribeiro",
+          "Carvalho", "Gomes", "Martins", "Araújo", "Barbosa", "Rocha", "Dias", "Moreira", "Cardoso", "Teixeira")
+_RAMOS = ("Comércio", "Distribuidora", "Indústria", "Serviços", "Tecnologia", "Alimentos", "Transportes",
+          "Construções", "Agro", "Logística")
+
+
+def _rnd(seed, tipo, bloco):
+    h = hashlib.blake2b(f"{seed}:{tipo}:{bloco}".encode(), digest_size=8).digest()
+    return random.Random(int.from_bytes(h, "big"))
+
+
+@lru_cache(maxsize=None)
+def _zipf_acumulado(n, s=ZIPF_S):
+    acc, total = [], 0.0
+    for k in range(1, n + 1):
+        total += 1 / k ** s
+        acc.append(total)
+    return acc
+
+
+def _acumulado(mix):
+    return [c for c in itertools.accumulate(p for _, p in mix)]
+
+
+_ACC_VENCIDO, _ACC_A_VENCER, _ACC_PRAZOS = _acumulado(_MIX_VENCIDO), _acumulado(_MIX_A_VENCER), _acumulado(_PRAZOS)
+
+
+def _escolher(rnd, mix, acc):
+    return mix[bisect(acc, rnd.random() * acc[-1])][0]
+
+
+def _contato(tipo, k):
+    """
+    Contato nº k (1 = o mais frequente) do `tipo`: id e nome estáveis. Fornecedores (pagar)
+    e clientes (receber) são cadastros distintos, como no Bling: ids em faixas separadas,
+    fornecedores só pessoa jurídica, clientes também pessoa física.
+    """
+    sobrenome = _NOMES[k % len(_NOMES)]
+    if tipo == "pagar":
+        ramo = _RAMOS[k % len(_RAMOS)]
+        return {"id": 800_000 + k, "nome": f"{ramo} {sobrenome} Fornecedora {k}", "tipo": "J"}
+    if k % 4 == 0:
+        return {"id": 900_000 + k, "nome": f"{sobrenome} {_NOMES[(k // 7) % len(_NOMES)]} {k}", "tipo": "F"}
+    ramo = _RAMOS[(k // len(_NOMES)) % len(_RAMOS)]
+    return {"id": 900_000 + k, "nome": f"{sobrenome} {ramo} Ltda {k}", "tipo": "J"}
+
+
+def _titulo(rnd, tipo, i, ref, contatos):
+    """Título neutro (independente da versão da API); consome sempre as mesmas chamadas de `rnd`."""
+    emissao = ref - timedelta(days=int(540 * rnd.random() ** 1.6))  # mais recentes são mais comuns
+    venc = emissao + timedelta(days=_escolher(rnd, _PRAZOS, _ACC_PRAZOS))
+    vencido = venc < ref
+    situacao = _escolher(rnd, *((_MIX_VENCIDO, _ACC_VENCIDO) if vencido else (_MIX_A_VENCER, _ACC_A_VENCER)))
+    atraso = rnd.randint(-5, 15)
+    acc = _zipf_acumulado(contatos)
+    k = bisect(acc, rnd.random() * acc[-1]) + 1
+    valor = round(rnd.lognormvariate(6.2 if tipo == "pagar" else 6.0, 1.1), 2)
+    categoria = rnd.randrange(len(_CATEGORIAS[tipo]))
+    documento = rnd.randint(1, 999_999)
+    pagamento = None
+    if situacao in ("PAGO", "PARCIAL"):
+        pagamento = min(venc + timedelta(days=atraso), ref)
+    return {
+        "id": (1 if tipo == "pagar" else 2) * 10_000_000_000 + i + 1,
+        "situacao": situacao, "emissao": emissao, "vencimento": venc, "pagamento": pagamento,
+        "valor": valor, "contato": _contato(tipo, min(k, contatos)),
+        "categoria": (categoria + 1, _CATEGORIAS[tipo][categoria]), "documento": f"{documento:06d}", "i": i,
+    }
+
+
+def payload_v3(t):
+    """Forma da listagem v3 de contas/{pagar,receber}."""
+    item = {
+        "id": t["id"],
+        "situacao": _SITUACAO_V3[t["situacao"]],
+        "vencimento": t["vencimento"].isoformat(),
+        "valor": t["valor"],
+        "dataEmissao": t["emissao"].isoformat(),
+        "dataVencimento": t["vencimento"].isoformat(),
+        "contato": t["contato"],
+        "categoria": {"id": t["categoria"][0], "descricao": t["categoria"][1]},
+        "numeroDocumento": t["documento"],
+        "historico": f"Título {t['i']}",
+    }
+    if t["pagamento"]:
+        item["dataPagamento"] = t["pagamento"].isoformat()
+    return item
+
+
+def _br(d):
+    return d.strftime("%d/%m/%Y")
+
+
+def payload_v2(t):
+    """Forma da v2 (chave de API): textos, datas dd/mm/aaaa e valores como string."""
+    item = {
+        "id": str(t["id"]),
+        "situacao": _SITUACAO_V2[t["situacao"]],
+        "valor": f"{t['valor']:.2f}",
+        "dataEmissao": _br(t["emissao"]),
+        "dataVencimento": _br(t["vencimento"]),
+        "contato": {"id": str(t["contato"]["id"]), "nome": t["contato"]["nome"]},
+        "categoria": t["categoria"][1],
+        "numeroDocumento": t["documento"],
+        "historico": f"Título {t['i']}",
+    }
+    if t["pagamento"]:
+        item["dataPagamento"] = _br(t["pagamento"])
+    return item
+
+
+def gerar(tipo, bloco, n_total, seed=42, versao="v3", contatos=5000, referencia=None):
+    """Payloads do bloco `bloco` (títulos bloco*BLOCO até o limite `n_total`)."""
+    ref = referencia or date.today()
+    rnd = _rnd(seed, tipo, bloco)
+    formato = payload_v3 if versao == "v3" else payload_v2
+    inicio = bloco * BLOCO
+    return [formato(_titulo(rnd, tipo, i, ref, contatos)) for i in range(inicio, min(inicio + BLOCO, n_total))]
+
+
+def _linhas_bloco(tipo, bloco, n_total, seed, versao, contatos, referencia, comprimir):
+    """Roda no processo gerador: payloads -> linhas prontas para gravar."""
+    try:
+        from database import extrator, _compress
+    except ImportError:
+        from src.database import extrator, _compress
+
+    extrair = extrator(versao)
+    linhas = []
+    for item in gerar(tipo, bloco, n_total, seed, versao, contatos, referencia):
+        valores, raw = extrair(item, json.dumps(item, ensure_ascii=False))
+        linhas.append((valores, _compress(raw) if comprimir else raw))
+    return linhas
+
+
+def popular(titulos, seed=42, versao="v3", contatos=5000, referencia=None, processos=None, modo="massa",
+            tipos=tuple(TIPOS)):
+    """
+    Gera `titulos` títulos por tipo em blocos paralelos (processos) e grava na ordem dos blocos.
+    Retorna {tabela: linhas gravadas}.
+    """
+    try:
+        from database import migrate, get_conn, close_conn, carga_em_massa, upsert_rows
+    except ImportError:
+        from src.database import migrate, get_conn, close_conn, carga_em_massa, upsert_rows
+
+    referencia = referencia or date.today()
+    processos = processos or os.cpu_count() or 1
+    migrate()
+    con = get_conn()
+    con.execute("PRAGMA synchronous=OFF")  # carga descartável: sem fsync por commit
+    r = {}
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processos, mp_context=ctx) as ex:
+        for tipo in tipos:
+            tabela = TIPOS[tipo]
+            n_blocos = -(-titulos // BLOCO)
+            args = [(tipo, b, titulos, seed, versao, contatos, referencia, modo == "massa") for b in range(n_blocos)]
+            # map entrega em ordem; no máximo ~2 blocos por processo em memória à frente do gravador
+            blocos = em_ordem(ex, _linhas_bloco, args, janela=2 * processos)
+            if modo == "massa":
+                r[tabela] = carga_em_massa(tabela, blocos, con=con)
+            else:
+                r[tabela] = 0
+                for linhas in blocos:
+                    upsert_rows(tabela, linhas, con=con)
+                    r[tabela] += len(linhas)
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute("ANALYZE")
+    close_conn()
+    return r
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Gera títulos sintéticos determinísticos (contas a pagar/receber).")
+    ap.add_argument("--titulos", type=int, default=100_000, help="títulos por tabela")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--versao", choices=("v3", "v2"), default="v3", help="forma do payload gerado")
+    ap.add_argument("--contatos", type=int, default=5000, help="contatos distintos (distribuição Zipf)")
+    ap.add_argument("--referencia", type=date.fromisoformat, default=None,
+                    help="data 'hoje' dos títulos (AAAA-MM-DD; padrão: hoje) — fixe para reproduzir")
+    ap.add_argument("--processos", type=int, default=os.cpu_count() or 1, help="processos geradores")
+    ap.add_argument("--modo", choices=("massa", "upsert"), default="massa", help="caminho de gravação")
+    ap.add_argument("--tabelas", default="pagar,receber", help="pagar, receber ou ambas")
+    ap.add_argument("--db", help="arquivo SQLite (padrão: BLING_DB_PATH ou bling.db)")
+    args = ap.parse_args(argv)
+    if args.db:
+        os.environ["BLING_DB_PATH"] = args.db  # antes de importar database (e nos processos spawn)
+
+    tipos = tuple(t.strip() for t in args.tabelas.split(",") if t.strip())
+    if set(tipos) - set(TIPOS):
+        raise SystemExit(f" Tabelas inválidas: {args.tabelas} (use pagar, receber)")
+    t0 = time.perf_counter()
+    r = popular(args.titulos, args.seed, args.versao, args.contatos, args.referencia, args.processos,
+                args.modo, tipos)
+    dt = time.perf_counter() - t0
+    total = sum(r.values())
+    print(f" {total} títulos gravados em {dt:.1f}s ({total / dt:.0f}/s): "
+          + ", ".join(f"{t} {n}" for t, n in r.items()))
+
+
+if __name__ == "__main__":
+    main()
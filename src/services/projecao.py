@@ -0,0 +1,285 @@
+# src/services/projecao.py — fluxo de caixa projetado e aging por contato
+#
+# Carrega os títulos em aberto de contas_pagar/contas_receber uma vez (por versão do
+# banco, ver report.versao_banco) em colunas — dias desde 1970 do vencimento, valor e
+# código do contato (contato_ref) — e calcula tudo em passadas vetorizadas:
+#   - fluxo diário de hoje até hoje+horizonte: entradas, saídas, líquido e saldo acumulado
+#     (np.bincount por dia + np.cumsum); vencidos ficam fora da série, num total à parte;
+#   - aging por contato: a vencer (inclusive hoje), 1–30, 31–60, 61–90 e 90+ dias de atraso
+#     (np.searchsorted nas faixas + np.bincount em contato*faixas).
+# Os resultados também ficam em cache pela versão do banco (e pelos parâmetros).
+#
+# Só títulos ABERTO entram nas contas. PARCIAL (pago em parte) fica de fora: nem a listagem
+# v3 nem a v2 trazem quanto já foi pago, então não há saldo restante para projetar, e usar
+# o valor cheio superestimaria entradas/saídas. Quantos ficaram de fora (e o valor cheio
+# deles) sai em `parciais` em cada resultado e no aviso da saída de texto.
+#
+# NumPy é opcional: sem ele o mesmo cálculo roda em Python puro (mais lento, mesmos números).
+#
+#   python -m src.services.projecao [--dias 90] [--saldo-inicial 0] [--aging] [--json]
+import json, sqlite3, argparse, threading
+from pathlib import Path
+from datetime import date, timedelta
+
+from src.services import report
+
+try:
+    import numpy as np
+except ImportError:  # opcional (pip install numpy)
+    np = None
+
+TIPOS = {"receber": "contas_receber", "pagar": "contas_pagar"}
+FAIXAS = ("a_vencer", "1-30", "31-60", "61-90", "90+")
+LIMITES = (30, 60, 90)  # fim (inclusive) de cada faixa de atraso; vencendo hoje ainda não é atraso
+_EPOCA = date(1970, 1, 1)
+
+# dias desde 1970 calculados no SQLite (sem parse de data em Python)
+_SQL_CARGA = """
+SELECT CAST(julianday(vencimento) - 2440587.5 AS INTEGER), valor, IFNULL(contato_ref, 0)
+FROM {tabela}
+WHERE situacao_cod = 'ABERTO' AND vencimento IS NOT NULL AND julianday(vencimento) IS NOT NULL
+"""
+# pagos em parte: fora da projeção (sem saldo restante no payload), só contados
+_SQL_PARCIAIS = "SELECT COUNT(*), IFNULL(SUM(valor), 0) FROM {tabela} WHERE situacao_cod = 'PARCIAL'"
+
+
+class Colunas:
+    """Títulos em aberto de um tipo, em colunas (arrays NumPy ou listas)."""
+
+    def __init__(self, dias, valor, contato, contatos, parciais=(0, 0.0)):
+        self.dias = dias        # vencimento em dias desde 1970
+        self.valor = valor
+        self.contato = contato  # índice em `contatos`
+        self.contatos = contatos  # [(id no Bling, nome)]
+        self.parciais = parciais  # (qtd, valor cheio) dos PARCIAL deixados de fora
+
+    def __len__(self):
+        return len(self.dias)
+
+
+def _carregar(con, tabela, usar_numpy, cadastro):
+    rows = con.execute(_SQL_CARGA.format(tabela=tabela)).fetchall()
+    codigos = {}
+    contato = [codigos.setdefault(r[2], len(codigos)) for r in rows]
+    contatos = [cadastro.get(ref, (None, "")) for ref in codigos]
+    qtd, valor = con.execute(_SQL_PARCIAIS.format(tabela=tabela)).fetchone()
+    parciais = (qtd, round(valor, 2))
+    if not usar_numpy:
+        return Colunas([r[0] for r in rows], [float(r[1] or 0) for r in rows], contato, contatos, parciais)
+    n = len(rows)
+    return Colunas(np.fromiter((r[0] for r in rows), np.int64, n),
+                   np.fromiter((r[1] or 0 for r in rows), np.float64, n),
+                   np.fromiter(contato, np.int64, n), contatos, parciais)
+
+
+def _dia(d):
+    return (d - _EPOCA).days
+
+
+def _parciais(cart):
+    return {tipo: {"qtd": c.parciais[0], "valor": c.parciais[1]} for tipo, c in cart.items()}
+
+
+# --------- Cálculo (NumPy) ---------
+def _serie_np(c, inicio, horizonte):
+    d = c.dias - inicio
+    dentro = (d >= 0) & (d < horizonte)
+    # astype: sem títulos no intervalo o bincount devolve inteiros
+    serie = np.bincount(d[dentro], weights=c.valor[dentro], minlength=horizonte).astype(np.float64, copy=False)
+    return serie, float(c.valor[d < 0].sum())
+
+
+def _aging_np(c, hoje, limite):
+    atraso = hoje - c.dias
+    faixa = np.where(atraso <= 0, 0, np.searchsorted(LIMITES, atraso, side="left") + 1)
+    k = len(FAIXAS)
+    m = np.bincount(c.contato * k + faixa, weights=c.valor, minlength=len(c.contatos) * k)
+    m = m.astype(np.float64, copy=False).reshape(-1, k).round(2)
+    vencido = m[:, 1:].sum(axis=1).round(2)
+    total = m.sum(axis=1).round(2)
+    # estável: empates na ordem de carga; só as linhas pedidas viram objetos Python
+    ordem = np.argsort(-vencido, kind="stable")[:limite]
+    linhas = [(c.contatos[i], m[i].tolist(), float(vencido[i]), float(total[i])) for i in ordem.tolist()]
+    return m.sum(axis=0).round(2).tolist(), linhas
+
+
+# --------- Cálculo (Python puro) ---------
+def _serie_py(c, inicio, horizonte):
+    serie, vencido = [0.0] * horizonte, 0.0
+    for d, v in zip(c.dias, c.valor):
+        d -= inicio
+        if d < 0:
+            vencido += v
+        elif d < horizonte:
+            serie[d] += v
+    return serie, vencido
+
+
+def _aging_py(c, hoje, limite):
+    m = [[0.0] * len(FAIXAS) for _ in c.contatos]
+    for d, v, k in zip(c.dias, c.valor, c.contato):
+        atraso = hoje - d
+        if atraso <= 0:
+            f = 0
+        else:
+            f = 1 + sum(atraso > lim for lim in LIMITES)
+        m[k][f] += v
+    m = [[round(x, 2) for x in linha] for linha in m]
+    vencido = [round(sum(linha[1:]), 2) for linha in m]
+    ordem = sorted(range(len(m)), key=lambda i: -vencido[i])[:limite]
+    linhas = [(c.contatos[i], m[i], vencido[i], round(sum(m[i]), 2)) for i in ordem]
+    return [round(sum(col), 2) for col in zip(*m)] if m else [0.0] * len(FAIXAS), linhas
+
+
+class Projecao:
+    """
+    Motor de projeção sobre uma conexão somente leitura própria (também usada para a
+    versão do banco). Seguro entre threads: um cálculo por vez.
+    """
+
+    def __init__(self, db_path=None, usar_numpy=None):
+        db_path = db_path or report.DB_PATH
+        self.usar_numpy = np is not None if usar_numpy is None else usar_numpy
+        if self.usar_numpy and np is None:
+            raise RuntimeError("usar_numpy=True requer numpy: pip install numpy")
+        self._con = sqlite3.connect(f"file:{Path(db_path).resolve()}?mode=ro", uri=True, timeout=30,
+                                    check_same_thread=False)
+        self._lock = threading.Lock()
+        self._versao = None
+        self._carteira = None  # {"receber": Colunas, "pagar": Colunas}
+        self._resultados = {}  # (nome, parâmetros) -> resultado, da versão atual
+        self.stats = {"cargas": 0, "calculos": 0, "acertos": 0}
+
+    def _atualizar(self):
+        """Recarrega as colunas se a versão do banco mudou (chamar com o lock)."""
+        versao = report.versao_banco(self._con)
+        if versao != self._versao or self._carteira is None:
+            cadastro = {ref: (id_bling, nome or "") for ref, id_bling, nome
+                        in self._con.execute("SELECT id, id_bling, nome FROM contatos")}
+            self._carteira = {tipo: _carregar(self._con, tabela, self.usar_numpy, cadastro)
+                              for tipo, tabela in TIPOS.items()}
+            self._versao = versao
+            self._resultados = {}
+            self.stats["cargas"] += 1
+
+    def _memo(self, chave, fn):
+        with self._lock:
+            self._atualizar()
+            if chave in self._resultados:
+                self.stats["acertos"] += 1
+                return self._resultados[chave]
+            r = self._resultados[chave] = fn(self._carteira)
+            self.stats["calculos"] += 1
+            return r
+
+    def fluxo_caixa(self, horizonte=90, hoje=None, saldo_inicial=0.0):
+        """
+        Série diária de `hoje` a hoje+horizonte-1: entradas (a receber), saídas (a pagar),
+        líquido e saldo acumulado a partir de `saldo_inicial`. Títulos em aberto já
+        vencidos não entram na série; vêm somados em `vencidos`. Títulos PARCIAL não
+        entram em nada (ver o cabeçalho do módulo); vêm contados em `parciais`.
+        """
+        if horizonte < 1:
+            raise ValueError("horizonte deve ser >= 1 dia")
+        hoje = hoje or date.today()
+        return self._memo(("fluxo", horizonte, hoje, saldo_inicial),
+                          lambda cart: self._fluxo(cart, horizonte, hoje, saldo_inicial))
+
+    def _fluxo(self, cart, horizonte, hoje, saldo_inicial):
+        inicio = _dia(hoje)
+        serie = _serie_np if self.usar_numpy else _serie_py
+        entradas, venc_receber = serie(cart["receber"], inicio, horizonte)
+        saidas, venc_pagar = serie(cart["pagar"], inicio, horizonte)
+        if self.usar_numpy:
+            liquido = entradas - saidas
+            saldo = saldo_inicial + np.cumsum(liquido)
+            colunas = [x.round(2).tolist() for x in (entradas, saidas, liquido, saldo)]
+        else:
+            liquido = [e - s for e, s in zip(entradas, saidas)]
+            saldo, acumulado = [], saldo_inicial
+            for v in liquido:
+                acumulado += v
+                saldo.append(acumulado)
+            colunas = [[round(v, 2) for v in x] for x in (entradas, saidas, liquido, saldo)]
+        return {
+            "hoje": hoje.isoformat(),
+            "horizonte": horizonte,
+            "dias": [(hoje + timedelta(days=i)).isoformat() for i in range(horizonte)],
+            "entradas": colunas[0], "saidas": colunas[1], "liquido": colunas[2], "saldo": colunas[3],
+            "vencidos": {"receber": round(venc_receber, 2), "pagar": round(venc_pagar, 2)},
+            "parciais": _parciais(cart),
+        }
+
+    def aging(self, hoje=None, limite=None):
+        """
+        Valor em aberto por contato e faixa de atraso (FAIXAS), para receber e pagar;
+        contatos ordenados pelo total vencido (maior primeiro), até `limite` por tipo.
+        Como no fluxo, títulos PARCIAL ficam de fora e vêm contados em `parciais`.
+        """
+        hoje = hoje or date.today()
+        return self._memo(("aging", hoje, limite), lambda cart: self._aging(cart, hoje, limite))
+
+    def _aging(self, cart, hoje, limite):
+        calc = _aging_np if self.usar_numpy else _aging_py
+        r = {"hoje": hoje.isoformat(), "faixas": list(FAIXAS), "parciais": _parciais(cart)}
+        for tipo, c in cart.items():
+            totais, linhas = calc(c, _dia(hoje), limite or None)
+            r[tipo] = {"totais": totais,
+                       "contatos": [{"contato_id": cid, "contato": nome, "faixas": faixas, "vencido": vencido,
+                                     "total": total}
+                                    for (cid, nome), faixas, vencido, total in linhas]}
+        return r
+
+    def fechar(self):
+        self._con.close()
+
+
+def _brl(v):
+    return f"R$ {v:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Fluxo de caixa projetado e aging dos títulos em aberto.")
+    ap.add_argument("--dias", type=int, default=90, help="horizonte da projeção (ex.: 90 a 365)")
+    ap.add_argument("--saldo-inicial", type=float, default=0.0)
+    ap.add_argument("--aging", action="store_true", help="mostra o aging por contato")
+    ap.add_argument("--limite", type=int, default=20, help="contatos no aging")
+    ap.add_argument("--json", action="store_true", help="saída completa em JSON")
+    args = ap.parse_args(argv)
+
+    motor = Projecao()
+    try:
+        fluxo = motor.fluxo_caixa(args.dias, saldo_inicial=args.saldo_inicial)
+        aging = motor.aging(limite=args.limite) if args.aging or args.json else None
+    finally:
+        motor.fechar()
+    if args.json:
+        print(json.dumps({"fluxo": fluxo, "aging": aging}, ensure_ascii=False))
+        return
+
+    print(f" FLUXO DE CAIXA PROJETADO ({args.dias} dias, {'numpy' if motor.usar_numpy else 'python'})\n")
+    print(f" Vencidos em aberto: a receber {_brl(fluxo['vencidos']['receber'])}, "
+          f"a pagar {_brl(fluxo['vencidos']['pagar'])}")
+    # resumo semanal (a série diária completa sai com --json)
+    for i in range(0, args.dias, 7):
+        fim = min(i + 7, args.dias)
+        print(f" {fluxo['dias'][i]} a {fluxo['dias'][fim - 1]}: entradas {_brl(sum(fluxo['entradas'][i:fim]))}, "
+              f"saídas {_brl(sum(fluxo['saidas'][i:fim]))}, saldo {_brl(fluxo['saldo'][fim - 1])}")
+    menor = min(range(args.dias), key=lambda i: fluxo["saldo"][i])
+    print(f"\n Menor saldo projetado: {_brl(fluxo['saldo'][menor])} em {fluxo['dias'][menor]}")
+    for tipo, p in fluxo["parciais"].items():
+        if p["qtd"]:
+            print(f" Atenção: {p['qtd']} título(s) a {tipo} pagos em parte (valor cheio {_brl(p['valor'])}) "
+                  f"fora da projeção e do aging: o Bling não informa o saldo restante")
+
+    if aging:
+        for tipo in ("receber", "pagar"):
+            print(f"\n Aging a {tipo} ({' / '.join(FAIXAS)}):")
+            print("   total: " + " / ".join(_brl(v) for v in aging[tipo]["totais"]))
+            for l in aging[tipo]["contatos"]:
+                if l["vencido"] > 0:
+                    print(f" - {l['contato'] or '(sem nome)'}: " + " / ".join(_brl(v) for v in l["faixas"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# src/services/reindex.py — refaz as colunas derivadas a partir do payload guardado, sem API
+#
+# Depois de corrigir o mapeamento (src/core/campos.py), os títulos já gravados ficam com as
+# colunas antigas (numero_documento, categoria, contato, datas, situação...) até um sync
+# completo. Aqui cada payload de {tabela}_raw é descomprimido e passa pelo mesmo extrator do
+# sync; só as linhas cujo resultado mudou são regravadas, em SQL por conjunto (tabela
+# temporária + UPDATE ... FROM por coluna alterada, ver database.regravar_derivadas).
+#
+# Em Python, e não com json_extract no SQL: o payload está comprimido (deflate com
+# dicionário) e as regras (fallbacks, normalização de datas/situação) só existem no extrator.
+# A leitura e a extração rodam em processos, por faixa de id, cada um com sua conexão
+# somente leitura; a gravação fica num processo só, uma transação por faixa.
+#
+#   python -m src.services.reindex [--tabelas pagar,receber] [--versao v3] [--processos 4] [--simular]
+import os, json, time, sqlite3, argparse, multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+from src.core.paralelo import em_ordem
+
+TABELAS = {"pagar": "contas_pagar", "receber": "contas_receber"}
+FAIXA = 20_000  # ids por tarefa (e por transação de gravação)
+
+
+def _recalcular(db_path, tabela, versao, id_ini, id_fim):
+    """
+    Roda no processo de trabalho: títulos com id em [id_ini, id_fim) -> (lidos, linhas
+    alteradas (tuplas do extrator), {coluna: alterações}).
+    """
+    try:
+        from database import extrator, _decompress, _COLS, COLS_DERIVADAS, I_CONTATO_ID, I_CONTATO_NOME
+    except ImportError:
+        from src.database import extrator, _decompress, _COLS, COLS_DERIVADAS, I_CONTATO_ID, I_CONTATO_NOME
+
+    extrair = extrator(versao)
+    idx = [_COLS.index(c) for c in COLS_DERIVADAS]
+    i_sit = COLS_DERIVADAS.index("situacao_cod")
+    cols = ", ".join(f"t.{c}" for c in COLS_DERIVADAS)
+    con = sqlite3.connect(f"file:{Path(db_path).resolve()}?mode=ro", uri=True, timeout=30)
+    try:
+        rows = con.execute(f"""
+        SELECT r.raw, {cols}, t.excluido_em IS NOT NULL, c.id_bling, CASE WHEN c.buscado_em IS NULL THEN c.nome END
+        FROM {tabela} t
+        JOIN {tabela}_raw r ON r.id_bling = t.id_bling
+        LEFT JOIN contatos c ON c.id = t.contato_ref
+        WHERE t.id >= ? AND t.id < ?
+        """, (id_ini, id_fim)).fetchall()
+    finally:
+        con.close()
+
+    n = len(COLS_DERIVADAS)
+    alteradas, contagem = [], {}
+    for row in rows:
+        raw = _decompress(row[0])
+        valores, _ = extrair(json.loads(raw), raw)
+        atual = row[1:n + 1]
+        mudou = False
+        for j, i in enumerate(idx):
+            v, a = valores[i], atual[j]
+            if v == a or (j == i_sit and row[n + 1]):  # excluído fica EXCLUIDO
+                continue
+            if a.__class__ is str and v.__class__ is not str and str(v) == a:
+                continue  # número gravado em coluna TEXT (ex.: situacao 1 da v3) volta como texto
+            contagem[COLS_DERIVADAS[j]] = contagem.get(COLS_DERIVADAS[j], 0) + 1
+            mudou = True
+        # contato: outra chave, ou nome ainda vindo dos títulos (sem busca na API) diferente
+        if (valores[I_CONTATO_ID] or None) != row[n + 2]:
+            contagem["contato_ref"] = contagem.get("contato_ref", 0) + 1
+            mudou = True
+        elif row[n + 3] is not None and valores[I_CONTATO_NOME] and valores[I_CONTATO_NOME] != row[n + 3]:
+            contagem["contato_nome"] = contagem.get("contato_nome", 0) + 1
+            mudou = True
+        if mudou:
+            alteradas.append(valores)
+    return len(rows), alteradas, contagem
+
+
+def reindexar(tabelas=tuple(TABELAS.values()), versao=None, processos=None, simular=False, faixa=FAIXA):
+    """
+    Recalcula as colunas derivadas de todos os títulos com payload guardado.
+    `simular`: só conta o que mudaria. Retorna {tabela: {"lidos", "alterados", "colunas"}}.
+    """
+    try:
+        import database
+    except ImportError:
+        from src import database
+    if versao is None:
+        try:
+            from src.api.bling_api import versao_api
+        except ImportError:
+            from bling_api import versao_api
+        versao = versao_api()  # o formato com que o sync gravou
+
+    database.migrate()
+    db_path = database.DB_PATH
+    processos = processos or os.cpu_count() or 1
+    con = database.get_conn()
+    r = {}
+    ex = None
+    if processos > 1:
+        ex = ProcessPoolExecutor(max_workers=processos, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        for tabela in tabelas:
+            ini, fim = con.execute(f"SELECT IFNULL(MIN(id), 0), IFNULL(MAX(id), -1) FROM {tabela}").fetchone()
+            args = [(db_path, tabela, versao, a, a + faixa) for a in range(ini, fim + 1, faixa)]
+            resultados = em_ordem(ex, _recalcular, args, janela=2 * processos) if ex else (_recalcular(*a) for a in args)
+            st = r[tabela] = {"lidos": 0, "alterados": 0, "colunas": {}}
+            for lidos, alteradas, contagem in resultados:
+                st["lidos"] += lidos
+                st["alterados"] += len(alteradas)
+                for c, k in contagem.items():
+                    st["colunas"][c] = st["colunas"].get(c, 0) + k
+                if not simular:
+                    # só as colunas que mudaram nesta faixa (nome do contato vai direto para `contatos`)
+                    colunas = tuple(c for c in (*database.COLS_DERIVADAS, "contato_ref") if c in contagem)
+                    database.regravar_derivadas(tabela, alteradas, colunas, con=con)
+    finally:
+        if ex is not None:
+            ex.shutdown(cancel_futures=True)
+        database.close_conn()
+    return r
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Recalcula as colunas derivadas a partir do payload guardado (sem API).")
+    ap.add_argument("--tabelas", default="pagar,receber", help="pagar, receber ou ambas")
+    ap.add_argument("--versao", choices=("v3", "v2"), default=None,
+                    help="formato dos payloads guardados (padrão: o do sync, v2 com BLING_API_KEY)")
+    ap.add_argument("--processos", type=int, default=os.cpu_count() or 1, help="processos de extração")
+    ap.add_argument("--simular", action="store_true", help="só conta o que mudaria, sem gravar")
+    args = ap.parse_args(argv)
+    tipos = [t.strip() for t in args.tabelas.split(",") if t.strip()]
+    if set(tipos) - set(TABELAS):
+        raise SystemExit(f" Tabelas inválidas: {args.tabelas} (use pagar, receber)")
+
+    t0 = time.perf_counter()
+    r = reindexar(tuple(TABELAS[t] for t in tipos), args.versao, args.processos, args.simular)
+    dt = time.perf_counter() - t0
+    for tabela, st in r.items():
+        colunas = ", ".join(f"{c} {k}" for c, k in sorted(st["colunas"].items(), key=lambda x: -x[1]))
+        print(f" {tabela}: {st['lidos']} títulos lidos, {st['alterados']} "
+              f"{'a alterar' if args.simular else 'alterados'}" + (f" ({colunas})" if colunas else ""))
+    print(f" Concluído em {dt:.1f}s (nenhuma chamada à API).")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,16 @@
 # report.py
-import sqlite3
+import os, sqlite3
 from datetime import datetime
 
-DB_PATH = "bling.db"
+DB_PATH = os.getenv("BLING_DB_PATH", "bling.db")
 
-def run_query(q, params=()):
+# Os totais saem de agg_vencimento/agg_contato (mantidos por triggers no database.py):
+# leem O(dias) ou O(contatos) linhas em vez de varrer os títulos.
+
+def run_query(q, params=(), con=None):
+    """Sem `con`, abre e fecha uma conexão (uso avulso); report_server passa as do pool."""
+    if con is not None:
+        return con.execute(q, params).fetchall()
     con = sqlite3.connect(DB_PATH)
     con.row_factory = sqlite3.Row
     cur = con.cursor()
@@ -13,43 +19,72 @@ def run_query(q, params=()):
     con.close()
     return rows
 
-def total_a_pagar_hoje():
+def versao_banco(con):
+    """
+    Versão dos dados para cache: (PRAGMA data_version, gerações do sync, date('now')).
+    data_version é por conexão e só muda com COMMITs de outras conexões: use sempre
+    a mesma conexão (que não escreve) para comparar.
+    """
+    dv = con.execute("PRAGMA data_version").fetchone()[0]
+    hoje, geracoes = con.execute("""
+    SELECT date('now'), (SELECT group_concat(recurso || ':' || geracao) FROM sync_state)
+    """).fetchone()
+    return dv, geracoes or "", hoje
+
+def total_a_pagar_hoje(con=None):
     q = """
-    SELECT IFNULL(SUM(valor),0) AS total
-    FROM contas_pagar
-    WHERE situacao LIKE 'ABER%' AND date(data_vencimento) = date('now');
+    SELECT IFNULL(SUM(total),0) AS total
+    FROM agg_vencimento
+    WHERE tipo = 'pagar' AND vencimento = date('now') AND situacao_cod = 'ABERTO';
     """
-    return run_query(q)[0]["total"]
+    return run_query(q, con=con)[0]["total"]
 
-def total_a_receber_hoje():
+def total_a_receber_hoje(con=None):
     q = """
-    SELECT IFNULL(SUM(valor),0) AS total
-    FROM contas_receber
-    WHERE situacao LIKE 'ABER%' AND date(data_vencimento) = date('now');
+    SELECT IFNULL(SUM(total),0) AS total
+    FROM agg_vencimento
+    WHERE tipo = 'receber' AND vencimento = date('now') AND situacao_cod = 'ABERTO';
     """
-    return run_query(q)[0]["total"]
+    return run_query(q, con=con)[0]["total"]
 
-def devedores():
+def devedores(con=None):
+    # em aberto por contato (agregado) menos o que ainda não venceu (busca no índice);
+    # agrupa pela chave do contato e só então junta o nome (homônimos não se misturam)
     q = """
-    SELECT contato_nome, SUM(valor) AS total
-    FROM contas_receber
-    WHERE situacao LIKE 'ABER%' AND date(data_vencimento) < date('now')
-    GROUP BY contato_nome
-    ORDER BY total DESC;
+    SELECT c.id_bling AS contato_id, IFNULL(c.nome, '') AS contato_nome, d.total
+    FROM (
+        SELECT contato_ref, SUM(total) AS total
+        FROM (
+            SELECT contato_ref, total, qtd
+            FROM agg_contato
+            WHERE tipo = 'receber' AND situacao_cod = 'ABERTO'
+            UNION ALL
+            SELECT IFNULL(contato_ref, 0), -IFNULL(valor, 0), -1
+            FROM contas_receber
+            WHERE situacao_cod = 'ABERTO' AND vencimento >= date('now')
+        )
+        GROUP BY contato_ref
+        HAVING SUM(qtd) > 0
+    ) d
+    LEFT JOIN contatos c ON c.id = d.contato_ref
+    ORDER BY d.total DESC;
     """
-    return run_query(q)
+    return run_query(q, con=con)
 
-def resumo_semana():
+def resumo_semana(con=None):
+    # títulos excluídos (soft delete) continuam nos agregados, com situacao_cod EXCLUIDO
     q = """
-    SELECT 'pagar' AS tipo, IFNULL(SUM(valor),0) AS total
-    FROM contas_pagar
-    WHERE date(data_vencimento) BETWEEN date('now','-6 day') AND date('now')
+    SELECT 'pagar' AS tipo, IFNULL(SUM(total),0) AS total
+    FROM agg_vencimento
+    WHERE tipo = 'pagar' AND vencimento BETWEEN date('now','-6 day') AND date('now')
+      AND situacao_cod != 'EXCLUIDO'
     UNION ALL
-    SELECT 'receber', IFNULL(SUM(valor),0)
-    FROM contas_receber
-    WHERE date(data_vencimento) BETWEEN date('now','-6 day') AND date('now');
+    SELECT 'receber', IFNULL(SUM(total),0)
+    FROM agg_vencimento
+    WHERE tipo = 'receber' AND vencimento BETWEEN date('now','-6 day') AND date('now')
+      AND situacao_cod != 'EXCLUIDO';
     """
-    return run_query(q)
+    return run_query(q, con=con)
 
 if __name__ == "__main__":
     print(" RELATÓRIO FINANCEIRO\n")
@@ -0,0 +1,224 @@
+# src/services/report_server.py — API HTTP (JSON) dos relatórios, com cache por versão do banco
+#
+# Os dashboards consultam os relatórios o tempo todo, mas os dados só mudam quando o
+# sync (ou um webhook) grava. Então cada relatório é calculado uma vez por versão do
+# banco e servido do cache até a próxima gravação:
+#   versão = (PRAGMA data_version, gerações do sync_state, date('now'))
+#   - data_version muda a cada COMMIT de outra conexão/processo no arquivo;
+#   - a geração muda a cada sync completo (reconciliação de exclusões);
+#   - a data entra porque os relatórios usam date('now').
+# Consultas rodam num pool de conexões somente leitura (WAL: nunca travam o sync); em
+# acerto de cache nenhuma conexão do pool é usada. Cálculos concorrentes do mesmo
+# relatório numa versão nova viram um só (os outros pedidos esperam o resultado).
+#
+# Cada resposta leva ETag (hash do corpo); If-None-Match igual -> 304 sem corpo.
+#
+#   python -m src.services.report_server [--porta 8090] [--pool 4]
+#   (ou junto do daemon: python -m src.services.daemon --relatorios-porta 8090)
+#
+#   GET /relatorios                 todos os relatórios num objeto
+#   GET /relatorios/<nome>          pagar_hoje, receber_hoje, devedores, resumo_semana
+#   GET /saude                      versão atual, acertos/erros do cache, pool
+import os, json, time, queue, hashlib, sqlite3, argparse, threading
+from pathlib import Path
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.services import report
+
+REPORT_PORTA = int(os.getenv("BLING_REPORT_PORTA", "8090"))
+REPORT_POOL = int(os.getenv("BLING_REPORT_POOL", "4"))
+
+
+def _log(msg):
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}", flush=True)
+
+
+def _linhas(rows):
+    return [dict(r) for r in rows]
+
+
+# nome -> função(con) com resultado serializável em JSON
+RELATORIOS = {
+    "pagar_hoje": lambda con: {"total": report.total_a_pagar_hoje(con)},
+    "receber_hoje": lambda con: {"total": report.total_a_receber_hoje(con)},
+    "devedores": lambda con: _linhas(report.devedores(con)),
+    "resumo_semana": lambda con: _linhas(report.resumo_semana(con)),
+}
+
+
+def _conectar(db_path):
+    con = sqlite3.connect(f"file:{Path(db_path).resolve()}?mode=ro", uri=True, timeout=30,
+                          check_same_thread=False)
+    con.row_factory = sqlite3.Row
+    return con
+
+
+class PoolLeitura:
+    """Conexões somente leitura reaproveitadas entre pedidos (no máximo `tamanho` consultas juntas)."""
+
+    def __init__(self, db_path, tamanho=REPORT_POOL):
+        self.db_path = db_path
+        self.livres = queue.LifoQueue()
+        for _ in range(max(1, tamanho)):
+            self.livres.put(_conectar(db_path))
+        self.tamanho = max(1, tamanho)
+
+    def executar(self, fn):
+        con = self.livres.get()
+        try:
+            return fn(con)
+        finally:
+            self.livres.put(con)
+
+    def fechar(self):
+        while True:
+            try:
+                self.livres.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class ServicoRelatorios:
+    """Cache dos relatórios por versão do banco (ver o cabeçalho do módulo)."""
+
+    def __init__(self, db_path=None, pool=REPORT_POOL, relatorios=RELATORIOS):
+        db_path = db_path or report.DB_PATH
+        self.relatorios = relatorios
+        self.pool = PoolLeitura(db_path, pool)
+        # conexão só para ler a versão (ver report.versao_banco)
+        self._sentinela = _conectar(db_path)
+        self._lock_versao = threading.Lock()
+        self._cache = {}  # nome -> (versao, etag, corpo)
+        self._locks = {nome: threading.Lock() for nome in relatorios}
+        self.stats = {"acertos": 0, "calculos": 0, "nao_modificados": 0}
+        self._lock = threading.Lock()  # stats
+
+    def versao(self):
+        with self._lock_versao:
+            return report.versao_banco(self._sentinela)
+
+    def _contar(self, chave):
+        with self._lock:
+            self.stats[chave] += 1
+
+    def obter(self, nome):
+        """(etag, corpo JSON em bytes) do relatório `nome`; KeyError se não existe."""
+        lock = self._locks[nome]
+        versao = self.versao()
+        item = self._cache.get(nome)
+        if item and item[0] == versao:
+            self._contar("acertos")
+            return item[1], item[2]
+        with lock:  # um cálculo por relatório; quem chegou junto usa o resultado
+            item = self._cache.get(nome)
+            if item and item[0] == versao:
+                self._contar("acertos")
+                return item[1], item[2]
+            t0 = time.perf_counter()
+            dados = self.pool.executar(self.relatorios[nome])
+            corpo = json.dumps({"relatorio": nome, "dados": dados}, ensure_ascii=False).encode("utf-8")
+            etag = '"' + hashlib.blake2b(corpo, digest_size=12).hexdigest() + '"'
+            self._cache[nome] = (versao, etag, corpo)
+            self._contar("calculos")
+            _log(f"relatório {nome} recalculado em {(time.perf_counter() - t0) * 1000:.1f} ms")
+            return etag, corpo
+
+    def obter_todos(self):
+        partes = {nome: self.obter(nome) for nome in self.relatorios}
+        corpo = b"{" + b",".join(json.dumps(n).encode("utf-8") + b":" + c for n, (_, c) in partes.items()) + b"}"
+        etag = '"' + hashlib.blake2b("".join(e for e, _ in partes.values()).encode("ascii"),
+                                     digest_size=12).hexdigest() + '"'
+        return etag, corpo
+
+    def fechar(self):
+        self.pool.fechar()
+        self._sentinela.close()
+
+
+# --------- HTTP ---------
+def _handler(servico):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, body: bytes, status=200, content_type="application/json; charset=utf-8", etag=None):
+            self.send_response(status)
+            if etag:
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", "no-cache")  # sempre revalida (barato: 304)
+            if status != 304:
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if status != 304:
+                self.wfile.write(body)
+
+        def log_message(self, fmt, *args):  # silencia logs chatos
+            return
+
+        def do_GET(self):
+            caminho = self.path.split("?")[0].rstrip("/")
+            if caminho == "/saude":
+                with servico._lock:
+                    stats = dict(servico.stats)
+                dv, geracoes, hoje = servico.versao()
+                corpo = {"data_version": dv, "geracoes": geracoes, "data": hoje,
+                         "pool": servico.pool.tamanho, **stats}
+                return self._send(json.dumps(corpo).encode("utf-8"))
+            try:
+                if caminho == "/relatorios":
+                    etag, corpo = servico.obter_todos()
+                elif caminho.startswith("/relatorios/"):
+                    etag, corpo = servico.obter(caminho[len("/relatorios/"):])
+                else:
+                    return self._send(b'{"erro": "caminho desconhecido"}', 404)
+            except KeyError:
+                return self._send(b'{"erro": "relatorio desconhecido"}', 404)
+            except sqlite3.Error as e:
+                return self._send(json.dumps({"erro": str(e)}).encode("utf-8"), 503)
+            pedidos = [t.strip() for t in (self.headers.get("If-None-Match") or "").split(",")]
+            if etag in pedidos or "*" in pedidos:
+                servico._contar("nao_modificados")
+                return self._send(b"", 304, etag=etag)
+            self._send(corpo, etag=etag)
+
+    return Handler
+
+
+def iniciar(porta=REPORT_PORTA, host="0.0.0.0", servico=None):
+    """Sobe a API numa thread; devolve (httpd, servico)."""
+    servico = servico or ServicoRelatorios()
+    httpd = ThreadingHTTPServer((host, porta), _handler(servico))
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="relatorios-http", daemon=True).start()
+    return httpd, servico
+
+
+def parar(httpd, servico):
+    httpd.shutdown()
+    httpd.server_close()
+    servico.fechar()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="API JSON dos relatórios, com cache por versão do banco.")
+    ap.add_argument("--porta", type=int, default=REPORT_PORTA)
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--pool", type=int, default=REPORT_POOL, help="conexões somente leitura")
+    args = ap.parse_args(argv)
+    try:
+        from database import migrate
+    except ImportError:
+        from src.database import migrate
+    migrate()  # o pool é somente leitura: garante tabelas/índices antes
+    httpd, servico = iniciar(args.porta, args.host, ServicoRelatorios(pool=args.pool))
+    _log(f"relatórios em http://{args.host}:{args.porta}/relatorios (saúde em /saude)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        parar(httpd, servico)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,88 +1,358 @@
 # src/services/sync.py
-from typing import Iterable, Dict, Any, List
+import os, time, argparse, itertools, contextvars
+from functools import partial
+from datetime import datetime, timedelta
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Dict, Any, Tuple
 
 # database: tenta raiz (database.py) ou dentro de src
 try:
-    from database import migrate, upsert_conta  # raiz do projeto
+    from database import (migrate, upsert_rows, extrator, close_conn, get_sync_state, set_sync_state,
+                          registrar_run, nova_geracao, varrer_excluidos, gravar_checkpoint, get_checkpoint,
+                          limpar_checkpoint, ultimas_runs)  # raiz do projeto
 except ImportError:
-    from src.database import migrate, upsert_conta  # fallback se você mover para src/
+    from src.database import (migrate, upsert_rows, extrator, close_conn, get_sync_state, set_sync_state,
+                              registrar_run, nova_geracao, varrer_excluidos, gravar_checkpoint, get_checkpoint,
+                              limpar_checkpoint, ultimas_runs)  # fallback se você mover para src/
+
+from src.core import metrics
+from src.services.detalhes import Hidratador, HIDRATAR
+from src.services.contatos import atualizar_contatos
 
 # bling_api: tenta em src/api, depois em api/, depois na raiz
 try:
-    from src.api.bling_api import get_contas_pagar, get_contas_receber
+    from src.api.bling_api import stream_contas_pagar, stream_contas_receber, http_stats, filtros_desde, versao_api
 except ImportError:
     try:
-        from api.bling_api import get_contas_pagar, get_contas_receber
+        from api.bling_api import stream_contas_pagar, stream_contas_receber, http_stats, filtros_desde, versao_api
     except ImportError:
-        from bling_api import get_contas_pagar, get_contas_receber
+        from bling_api import stream_contas_pagar, stream_contas_receber, http_stats, filtros_desde, versao_api
+
+
+# páginas buscadas em paralelo (o rate limit é controlado no bling_api)
+SYNC_CONCURRENCY = int(os.getenv("BLING_SYNC_CONCURRENCY", "3"))
+
+
+def _page_items(payload):
+    """
+    Suporta os formatos: {data: [...]} ou {items: [...]} ou lista pura, ou um
+    gerador de (item, raw) do parser em streaming (lido sob demanda; aqui só se
+    espia o primeiro item para saber se a página está vazia).
+    """
+    if isinstance(payload, dict):
+        if isinstance(payload.get("data"), list):
+            return payload["data"]
+        if isinstance(payload.get("items"), list):
+            return payload["items"]
+        return []
+    if isinstance(payload, list):
+        return payload
+    if payload is None:
+        return []
+    it = iter(payload)
+    first = next(it, None)
+    return [] if first is None else itertools.chain([first], it)
+
+
+def _fechar(payload):
+    """Descarta uma página não consumida (v3_stream: fecha a resposta)."""
+    close = getattr(payload, "close", None)
+    if close is not None:
+        close()
+
+
+def _linhas(batch, contador, extrair):
+    """Itens da página -> linhas do banco; aceita dicts ou (item, raw) do streaming."""
+    gasto = 0.0
+    try:
+        for x in batch:
+            contador[0] += 1
+            t0 = time.perf_counter()
+            linha = extrair(x[0], x[1]) if x.__class__ is tuple else extrair(x)
+            gasto += time.perf_counter() - t0
+            yield linha
+    finally:
+        metrics.add_tempo("extract", gasto)
+
+
+def _iter_paginated(fetch_fn, page_size=100, concurrency=1, inicio=1) -> Iterable[Tuple[int, Iterable[Any]]]:
+    """
+    fetch_fn(page, limit) -> dict/json do Bling v3. Gera (página, itens) a partir
+    da página `inicio`.
+    Com concurrency > 1 mantém até N páginas em voo, mas entrega em ordem
+    e para na primeira página vazia; as buscadas de antemão e não entregues são
+    fechadas (resposta em streaming devolve a conexão ao pool).
+    """
+    if concurrency <= 1:
+        page = inicio
+        while True:
+            data = _page_items(fetch_fn(page=page, limit=page_size))
+            if not data:
+                break
+            yield page, data
+            page += 1
+        return
+
+    ex = ThreadPoolExecutor(max_workers=concurrency)
+    pending = deque()
+    next_page = inicio
+    try:
+        while True:
+            while len(pending) < concurrency:
+                # cópia do contexto: as requisições das threads contam na execução atual
+                ctx = contextvars.copy_context()
+                pending.append((next_page, ex.submit(ctx.run, fetch_fn, page=next_page, limit=page_size)))
+                next_page += 1
+            page, futuro = pending.popleft()
+            data = _page_items(futuro.result())
+            if not data:
+                break
+            yield page, data
+    finally:
+        ex.shutdown(wait=True, cancel_futures=True)
+        for _, futuro in pending:
+            if not futuro.cancelled() and futuro.exception() is None:
+                _fechar(futuro.result())
+
+
+# sobreposição da janela incremental (fuso/atraso de indexação no Bling)
+OVERLAP_DIAS = 1
+
+
+def _filtros_incrementais(tabela: str, full: bool, state=None):
+    """Lista de filtros de data a partir do high-water mark, ou None para sync completo."""
+    if full or not state or not state.get("cursor"):
+        return None
+    desde = datetime.strptime(state["cursor"], "%Y-%m-%d").date() - timedelta(days=OVERLAP_DIAS)
+    return filtros_desde(tabela, desde)
 
 
-def _iter_paginated(fetch_fn, page_size=100) -> Iterable[List[Dict[str, Any]]]:
+def _retomada(tabela: str, full: bool):
     """
-    fetch_fn(page, limit) -> dict/json do Bling v3.
-    Suporta os formatos: {data: [...]} ou {items: [...]} ou lista pura.
+    Checkpoint utilizável de um sync interrompido, ou None (descarta o expirado).
+    Completo interrompido é sempre retomado (cobre também um incremental); incremental
+    interrompido só é retomado por outro incremental.
     """
-    page = 1
-    while True:
-        payload = fetch_fn(page=page, limit=page_size)
-        data = None
+    ck = get_checkpoint(tabela)
+    if ck is None:
+        return None
+    if ck["expirado"] or (full and ck["plano"] != [{}]):
+        limpar_checkpoint(tabela)
+        return None
+    return ck
 
-        if isinstance(payload, dict):
-            if isinstance(payload.get("data"), list):
-                data = payload["data"]
-            elif isinstance(payload.get("items"), list):
-                data = payload["items"]
 
-        if data is None:
-            data = payload if isinstance(payload, list) else []
+def _sync_tabela(tabela: str, fetch_fn, full: bool = False, parar=None, hidratar=None) -> Dict[str, int]:
+    """
+    Uma transação (executemany) por página, na conexão compartilhada.
+    `parar` (threading.Event opcional) interrompe entre páginas; nesse caso o
+    high-water mark não avança e a próxima execução retoma do checkpoint.
+    Cada página grava, na mesma transação, o checkpoint (sync_checkpoint): se a execução
+    cair, a próxima continua da página seguinte à última gravada, com o mesmo plano de
+    filtros, a mesma geração e os contadores acumulados.
+    `hidratar` (padrão: BLING_HIDRATAR) completa, só na v3, os títulos novos/alterados
+    com o detalhe por id (src/services/detalhes.py); inalterados saem do cache.
+    Sync completo: reserva uma geração, carimba cada título visto com ela e, no fim,
+    marca como excluídos os que não apareceram (varrer_excluidos).
+    Cada execução é medida (metrics.RunMetrics), gravada em sync_runs e logada em JSON.
+    """
+    state = get_sync_state(tabela)
+    ck = _retomada(tabela, full)
+    stats = {"vistos": 0, "inseridos": 0, "atualizados": 0, "inalterados": 0, "excluidos": 0}
+    anteriores = dict(ck["contadores"]) if ck else {}  # páginas gravadas pela execução interrompida
+    if ck:
+        plano, geracao, inicio = ck["plano"], ck["geracao"], ck["inicio"]
+        etapa0, pagina0 = ck["etapa"], ck["pagina"] + 1
+        stats.update(ck["contadores"])
+        stats["retomado"] = {"etapa": etapa0, "pagina": pagina0}
+    else:
+        inicio = datetime.now().isoformat(timespec="seconds")
+        plano = _filtros_incrementais(tabela, full, state) or [{}]
+        # incremental carimba com a geração atual (não interfere na próxima varredura)
+        geracao = nova_geracao(tabela) if plano == [{}] else state["geracao"]
+        etapa0, pagina0 = 0, 1
+    completo = plano == [{}]
+    stats["incremental"] = not completo
+    versao = versao_api()
+    extrair = extrator(versao)
+    hid = Hidratador(tabela) if (HIDRATAR if hidratar is None else hidratar) and versao == "v3" else None
+    run = metrics.RunMetrics(tabela, "completo" if completo else "incremental")
+    if ck:
+        run.contar("retomadas")
+    token = metrics.ativar(run)
+    status = "erro"
+    try:
+        for etapa, f in enumerate(plano):
+            if etapa < etapa0:
+                continue
+            paginas = _iter_paginated(partial(fetch_fn, **f), page_size=100, concurrency=SYNC_CONCURRENCY,
+                                      inicio=pagina0 if etapa == etapa0 else 1)
+            for pagina, batch in paginas:
+                if parar is not None and parar.is_set():
+                    stats["interrompido"] = True
+                    status = "interrompido"
+                    return stats
+                metrics.contar("paginas")
+                vistos = [0]
+                if hid is not None:
+                    batch = hid.pagina(batch)
+
+                def checkpoint(con, r, etapa=etapa, pagina=pagina, vistos=vistos):
+                    contadores = {k: stats[k] + r.get(k, 0) for k in ("inseridos", "atualizados", "inalterados")}
+                    contadores["vistos"] = stats["vistos"] + vistos[0]
+                    gravar_checkpoint(con, tabela, plano, etapa, pagina, geracao, inicio, contadores)
+                    if hid is not None:
+                        hid.gravar(con)  # detalhe em cache só junto com a página gravada
+
+                r = upsert_rows(tabela, _linhas(batch, vistos, extrair), geracao=geracao, na_transacao=checkpoint)
+                stats["vistos"] += vistos[0]
+                for k in ("inseridos", "atualizados", "inalterados"):
+                    stats[k] += r[k]
+        if completo:
+            n = varrer_excluidos(tabela, geracao, stats["vistos"])
+            if n < 0:
+                stats["varredura_recusada"] = True
+            else:
+                stats["excluidos"] = n
+        # só avança o high-water mark depois que todas as páginas foram gravadas;
+        # numa retomada vale o início da execução original
+        set_sync_state(tabela, inicio, inicio[:10])
+        limpar_checkpoint(tabela)
+        status = "ok"
+        return stats
+    finally:
+        if hid is not None:
+            hid.fechar()
+            stats["detalhes"] = dict(hid.stats)
+        metrics.desativar(token)
+        for k in ("vistos", "inseridos", "atualizados", "inalterados", "excluidos"):
+            run.contar(k, stats[k] - anteriores.get(k, 0))  # só o desta execução
+        run.finalizar(status)
+        stats["metricas"] = _registrar(run)
+
+
+def _registrar(run):
+    """sync_runs + log JSON; falha aqui não derruba o sync."""
+    resumo = run.resumo()
+    try:
+        registrar_run(resumo)
+    except Exception as e:
+        resumo["erro_registro"] = str(e)
+    metrics.log_json({"evento": "sync_run", **resumo})
+    return resumo
+
+
+def _com_contatos(r, parar=None):
+    """Depois dos títulos, completa os contatos pendentes pela API (falha aqui não derruba o sync)."""
+    if not r.get("interrompido"):
+        try:
+            r["contatos"] = atualizar_contatos(parar=parar)
+        except Exception as e:
+            r["contatos"] = {"erro": str(e)}
+    return r
 
-        if not data:
-            break
 
-        yield data
-        page += 1
+def sync_contas_pagar(full: bool = False, parar=None, hidratar=None) -> Dict[str, int]:
+    return _com_contatos(_sync_tabela("contas_pagar", stream_contas_pagar, full, parar, hidratar), parar)
 
 
-def sync_contas_pagar() -> Dict[str, int]:
-    vistos = 0
-    for batch in _iter_paginated(get_contas_pagar, page_size=100):
-        for item in batch:
-            upsert_conta("contas_pagar", item)
-            vistos += 1
-    return {"vistos": vistos}
+def sync_contas_receber(full: bool = False, parar=None, hidratar=None) -> Dict[str, int]:
+    return _com_contatos(_sync_tabela("contas_receber", stream_contas_receber, full, parar, hidratar), parar)
 
 
-def sync_contas_receber() -> Dict[str, int]:
-    vistos = 0
-    for batch in _iter_paginated(get_contas_receber, page_size=100):
-        for item in batch:
-            upsert_conta("contas_receber", item)
-            vistos += 1
-    return {"vistos": vistos}
+def _modo(r):
+    return "incremental" if r.get("incremental") else "completo"
 
 
-def main():
+def _aviso_varredura(r):
+    return "; exclusões não aplicadas: poucos títulos vistos" if r.get("varredura_recusada") else ""
+
+
+def _aviso_retomada(r):
+    ret = r.get("retomado")
+    return f"; retomado da página {ret['pagina']} (etapa {ret['etapa'] + 1})" if ret else ""
+
+
+TABELAS = ("contas_pagar", "contas_receber")
+
+
+def status(tabelas=TABELAS):
+    """Estado por recurso: high-water mark, checkpoint em andamento e últimas execuções."""
+    return {t: {"estado": get_sync_state(t), "checkpoint": get_checkpoint(t), "execucoes": ultimas_runs(t, 3)}
+            for t in tabelas}
+
+
+def imprimir_status(st):
+    for tabela, info in st.items():
+        e = info["estado"] or {}
+        print(f" {tabela}: última sync {e.get('ultima_sync') or 'nunca'}, cursor {e.get('cursor') or '-'}, "
+              f"geração {e.get('geracao', 0)}")
+        ck = info["checkpoint"]
+        if ck:
+            modo = "completo" if ck["plano"] == [{}] else "incremental"
+            situacao = "expirado, será descartado" if ck["expirado"] else "será retomado"
+            print(f"   em andamento ({modo}, iniciado {ck['inicio']}): etapa {ck['etapa'] + 1}/{len(ck['plano'])}, "
+                  f"página {ck['pagina']}, {ck['contadores'].get('vistos', 0)} títulos gravados; "
+                  f"último checkpoint há {ck['idade_h'] * 60:.0f} min ({situacao})")
+        for r in info["execucoes"]:
+            print(f"   {r['inicio']} {r['modo']:<11} {r['status']:<11} {r['duracao_s'] or 0:>7.1f}s "
+                  f"{r['paginas'] or 0:>5} pág. novos {r['inseridos'] or 0}, atualizados {r['atualizados'] or 0}")
+
+
+def main(full: bool = False, hidratar=None):
     print(" Preparando banco...")
     migrate()
 
     print(" Buscando contas a pagar...")
     try:
-        r1 = sync_contas_pagar()
-        print(f" Contas a pagar sincronizadas (itens processados: {r1.get('vistos', 0)})")
+        r1 = sync_contas_pagar(full, hidratar=hidratar)
+        print(f" Contas a pagar sincronizadas ({_modo(r1)}; itens processados: {r1.get('vistos', 0)}, "
+              f"novos: {r1['inseridos']}, atualizados: {r1['atualizados']}, inalterados: {r1['inalterados']}, "
+              f"excluídos: {r1['excluidos']}{_aviso_varredura(r1)}{_aviso_retomada(r1)})")
     except Exception as e:
         print(" Erro ao sincronizar contas a pagar:", e)
         raise
 
     print(" Buscando contas a receber...")
     try:
-        r2 = sync_contas_receber()
-        print(f" Contas a receber sincronizadas (itens processados: {r2.get('vistos', 0)})")
+        r2 = sync_contas_receber(full, hidratar=hidratar)
+        print(f" Contas a receber sincronizadas ({_modo(r2)}; itens processados: {r2.get('vistos', 0)}, "
+              f"novos: {r2['inseridos']}, atualizados: {r2['atualizados']}, inalterados: {r2['inalterados']}, "
+              f"excluídos: {r2['excluidos']}{_aviso_varredura(r2)}{_aviso_retomada(r2)})")
     except Exception as e:
         print(" Erro ao sincronizar contas a receber:", e)
         raise
 
+    for r in (r1, r2):
+        m = r["metricas"]
+        fases = ", ".join(f"{k} {v:.1f}s" for k, v in m["fases_s"].items())
+        print(f" {m['recurso']}: {m['duracao_s']:.1f}s, {m['registros_s']:.0f} registros/s ({fases})")
+        if "detalhes" in r:
+            d = r["detalhes"]
+            print(f"   detalhes: {d['buscados']} buscados, {d['em_cache']} do cache, {d['sem_detalhe']} sem detalhe")
+        c = r.get("contatos") or {}
+        if "erro" in c:
+            print(f"   contatos: erro ao buscar na API ({c['erro']})")
+        elif c.get("buscados") or c.get("nao_encontrados"):
+            print(f"   contatos: {c['buscados']} atualizados pela API, {c['nao_encontrados']} não encontrados")
+
+    close_conn()
+    h = http_stats()
+    print(f" HTTP: {h['requisicoes']} requisições, {h['retries']} retries, "
+          f"conexões abertas: {h['conexoes_abertas']}, reutilizadas: {h['conexoes_reutilizadas']}")
     print(" Sincronização concluída!")
 
 
 if __name__ == "__main__":
-    main()
+    ap = argparse.ArgumentParser(description="Sincroniza contas a pagar/receber do Bling.")
+    ap.add_argument("--full", action="store_true", help="ignora o high-water mark e baixa tudo")
+    ap.add_argument("--status", action="store_true", help="mostra o progresso/estado do sync e sai")
+    ap.add_argument("--hidratar", action="store_true", default=None,
+                    help="completa títulos novos/alterados com o detalhe por id (v3; padrão: BLING_HIDRATAR)")
+    args = ap.parse_args()
+    if args.status:
+        migrate()
+        imprimir_status(status())
+    else:
+        main(full=args.full, hidratar=args.hidratar)
@@ -0,0 +1,203 @@
+# src/services/tenants.py — sync de várias contas Bling (tenants) em paralelo
+#
+# Cada tenant tem credenciais, token store, limite de requisições e banco SQLite
+# próprios, declarados num registro JSON (BLING_TENANTS, padrão tenants.json):
+#
+#   {"tenants": [
+#     {"id": "empresa_a", "client_id": "...", "client_secret": "${EMPRESA_A_SECRET}",
+#      "refresh_token": "...", "rate_per_sec": 3},
+#     {"id": "empresa_b", "api_key": "${EMPRESA_B_APIKEY}", "db_path": "/dados/b.db"}
+#   ]}
+#
+# Valores "${VAR}" são lidos do ambiente (segredos fora do arquivo). Sem db_path/token_store,
+# cada tenant usa <BLING_TENANTS_DIR>/<id>/bling.db e <BLING_TENANTS_DIR>/<id>/tokens.json.
+#
+# bling_api e database guardam a configuração em globais lidas na importação; por isso
+# cada tenant roda num processo novo (spawn, um processo por tarefa) com o ambiente
+# do tenant, e nada de um tenant vaza para outro.
+#
+#   python -m src.services.tenants [--full] [--concorrencia 4] [--so empresa_a,empresa_b]
+#                                  [--saida relatorio.json]
+import os, re, sys, json, time, argparse, traceback, multiprocessing
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+TENANTS_PATH = os.getenv("BLING_TENANTS", "tenants.json")
+TENANTS_DIR = os.getenv("BLING_TENANTS_DIR", "tenants")
+TENANT_CONCURRENCY = int(os.getenv("BLING_TENANT_CONCURRENCY", "4"))
+
+_ID_VALIDO = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# campo do registro -> variável lida por bling_api/database/metrics
+_ENV = {
+    "client_id": "BLING_CLIENT_ID",
+    "client_secret": "BLING_CLIENT_SECRET",
+    "access_token": "BLING_ACCESS_TOKEN",
+    "refresh_token": "BLING_REFRESH_TOKEN",
+    "api_key": "BLING_API_KEY",
+    "rate_per_sec": "BLING_RATE_PER_SEC",
+    "sync_concurrency": "BLING_SYNC_CONCURRENCY",
+    "v3_base": "BLING_V3_BASE",
+    "db_path": "BLING_DB_PATH",
+    "token_store": "BLING_TOKEN_STORE",
+}
+# credenciais: sempre definidas no processo do tenant (vazias se ausentes), para o .env
+# da raiz não completar um tenant com a conta de outro
+_CREDENCIAIS = ("client_id", "client_secret", "access_token", "refresh_token", "api_key")
+
+
+def _expandir(v):
+    if isinstance(v, str):
+        return re.sub(r"\$\{(\w+)\}", lambda m: os.environ.get(m.group(1), ""), v)
+    return v
+
+
+def carregar_tenants(caminho=None, base_dir=None):
+    """Lê e valida o registro; devolve a lista de tenants com caminhos resolvidos."""
+    caminho = Path(caminho or TENANTS_PATH)
+    base_dir = Path(base_dir or TENANTS_DIR)
+    try:
+        dados = json.loads(caminho.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        raise RuntimeError(f"Registro de tenants não encontrado: {caminho}") from None
+    tenants, vistos = [], set()
+    for t in dados.get("tenants", []):
+        t = {k: _expandir(v) for k, v in t.items()}
+        tid = t.get("id")
+        if not tid or not _ID_VALIDO.match(str(tid)):
+            raise RuntimeError(f"Tenant com id inválido: {tid!r} (use letras, números, _ ou -)")
+        if tid in vistos:
+            raise RuntimeError(f"Tenant duplicado: {tid}")
+        vistos.add(tid)
+        if not t.get("api_key") and not (t.get("client_id") and t.get("client_secret")
+                                         and (t.get("refresh_token") or t.get("access_token"))):
+            raise RuntimeError(f"Tenant {tid}: defina api_key (v2) ou client_id, client_secret e refresh_token (v3)")
+        t.setdefault("db_path", str(base_dir / tid / "bling.db"))
+        t.setdefault("token_store", str(base_dir / tid / "tokens.json"))
+        tenants.append(t)
+    if not tenants:
+        raise RuntimeError(f"Nenhum tenant em {caminho}")
+    return tenants
+
+
+def _ambiente(tenant):
+    env = {"BLING_TENANT": tenant["id"]}
+    for campo in _CREDENCIAIS:
+        env[_ENV[campo]] = str(tenant.get(campo) or "")
+    for campo, var in _ENV.items():
+        if campo not in _CREDENCIAIS and tenant.get(campo) not in (None, ""):
+            env[var] = str(tenant[campo])
+    return env
+
+
+def _sync_tenant(tenant, full):
+    """Roda no processo do tenant: aplica o ambiente, importa o sync e executa os dois recursos."""
+    os.environ.update(_ambiente(tenant))
+    Path(tenant["db_path"]).parent.mkdir(parents=True, exist_ok=True)
+    inicio = time.perf_counter()
+    r = {"tenant": tenant["id"], "status": "ok", "recursos": {}}
+    try:
+        from src.services import sync
+        from src.api.bling_api import http_stats
+
+        sync.migrate()
+        for nome, fn in (("contas_pagar", sync.sync_contas_pagar), ("contas_receber", sync.sync_contas_receber)):
+            r["recursos"][nome] = fn(full)
+        r["http"] = http_stats()
+        sync.close_conn()
+    except Exception as e:
+        r["status"] = "erro"
+        r["erro"] = f"{type(e).__name__}: {e}"
+        r["traceback"] = traceback.format_exc()
+    r["duracao_s"] = round(time.perf_counter() - inicio, 3)
+    return r
+
+
+def sync_tenants(tenants, full=False, concorrencia=TENANT_CONCURRENCY):
+    """
+    Sincroniza os tenants em até `concorrencia` processos simultâneos.
+    Um processo novo por tenant (spawn + max_tasks_per_child=1): globais limpas.
+    Devolve o relatório agregado (ver _agregar).
+    """
+    inicio = datetime.now()
+    t0 = time.perf_counter()
+    ctx = multiprocessing.get_context("spawn")
+    resultados = []
+    with ProcessPoolExecutor(max_workers=max(1, min(concorrencia, len(tenants))),
+                             mp_context=ctx, max_tasks_per_child=1) as ex:
+        futuros = {ex.submit(_sync_tenant, t, full): t["id"] for t in tenants}
+        for f in as_completed(futuros):
+            try:
+                resultados.append(f.result())
+            except Exception as e:  # processo morreu (ex.: OOM/sinal)
+                resultados.append({"tenant": futuros[f], "status": "erro", "erro": f"{type(e).__name__}: {e}",
+                                   "recursos": {}})
+    return _agregar(resultados, inicio, time.perf_counter() - t0)
+
+
+def _agregar(resultados, inicio, duracao):
+    total = {"vistos": 0, "inseridos": 0, "atualizados": 0, "inalterados": 0, "requisicoes": 0, "retries": 0}
+    for r in resultados:
+        for st in r.get("recursos", {}).values():
+            for k in ("vistos", "inseridos", "atualizados", "inalterados"):
+                total[k] += st.get(k, 0)
+        for k in ("requisicoes", "retries"):
+            total[k] += (r.get("http") or {}).get(k, 0)
+    resultados.sort(key=lambda r: r["tenant"])
+    return {
+        "inicio": inicio.isoformat(timespec="seconds"),
+        "duracao_s": round(duracao, 3),
+        "tenants": len(resultados),
+        "ok": sum(r["status"] == "ok" for r in resultados),
+        "erros": sum(r["status"] != "ok" for r in resultados),
+        "registros_s": round(total["vistos"] / duracao, 1) if duracao else 0.0,
+        "totais": total,
+        "resultados": resultados,
+    }
+
+
+def _imprimir(rel):
+    print(f"{'tenant':<20} {'status':<7} {'tempo(s)':>9} {'vistos':>8} {'novos':>7} {'atualiz.':>8} {'req':>6} {'retries':>7}")
+    for r in rel["resultados"]:
+        rec = r.get("recursos", {}).values()
+        soma = lambda k: sum(st.get(k, 0) for st in rec)
+        http = r.get("http") or {}
+        print(f"{r['tenant']:<20} {r['status']:<7} {r.get('duracao_s', 0):>9.1f} {soma('vistos'):>8} "
+              f"{soma('inseridos'):>7} {soma('atualizados'):>8} {http.get('requisicoes', 0):>6} {http.get('retries', 0):>7}")
+        if r["status"] != "ok":
+            print(f"    erro: {r.get('erro')}")
+    t = rel["totais"]
+    print(f"\n {rel['tenants']} tenant(s), {rel['ok']} ok, {rel['erros']} com erro, {rel['duracao_s']:.1f}s; "
+          f"{t['vistos']} registros ({rel['registros_s']:.0f}/s), {t['requisicoes']} requisições, {t['retries']} retries")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Sincroniza várias contas Bling em paralelo (um processo por tenant).")
+    ap.add_argument("--tenants", default=TENANTS_PATH, help="registro JSON de tenants")
+    ap.add_argument("--full", action="store_true", help="ignora o high-water mark e baixa tudo")
+    ap.add_argument("--concorrencia", type=int, default=TENANT_CONCURRENCY, help="tenants sincronizados ao mesmo tempo")
+    ap.add_argument("--so", help="ids separados por vírgula (padrão: todos)")
+    ap.add_argument("--saida", help="grava o relatório agregado (JSON) neste arquivo")
+    args = ap.parse_args(argv)
+
+    try:
+        tenants = carregar_tenants(args.tenants)
+    except RuntimeError as e:
+        raise SystemExit(f" {e}")
+    if args.so:
+        ids = set(args.so.split(","))
+        faltando = ids - {t["id"] for t in tenants}
+        if faltando:
+            raise SystemExit(f" Tenant(s) desconhecido(s): {', '.join(sorted(faltando))}")
+        tenants = [t for t in tenants if t["id"] in ids]
+
+    rel = sync_tenants(tenants, args.full, args.concorrencia)
+    _imprimir(rel)
+    if args.saida:
+        Path(args.saida).write_text(json.dumps(rel, ensure_ascii=False, indent=2), encoding="utf-8")
+    sys.exit(1 if rel["erros"] else 0)
+
+
+if __name__ == "__main__":
+    main()
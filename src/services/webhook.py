@@ -0,0 +1,296 @@
+# src/services/webhook.py — recebe webhooks do Bling (contas a pagar/receber) e aplica em micro-lotes
+#
+# O handler HTTP só valida (assinatura, JSON, evento conhecido), enfileira e responde 202;
+# uma thread aplicadora junta os eventos em lotes (até LOTE eventos ou JANELA_S segundos),
+# descarta repetidos e grava cada tabela numa transação:
+#   - criação/alteração: o payload do evento completa o payload guardado do título; se o
+#     resultado tem todos os campos gravados -> upsert direto, sem chamar a API
+#   - payload parcial (ou título novo sem contato/categoria/documento) -> busca pontual do
+#     título por id (GET contas/{tipo}/{id})
+#   - exclusão (ou título que não existe mais) -> soft delete, como na varredura do sync completo
+# Os títulos gravados recebem a geração atual do sync (não são varridos por um sync completo
+# em andamento) e um evento só conta como visto depois de aplicado (reenvio após erro vale).
+#
+# Os eventos ficam só em memória: o que estiver na fila ao cair o processo volta no
+# próximo sync incremental/completo, que continua rodando (com intervalo maior).
+#
+#   python -m src.services.webhook [--porta 8081]
+#   (ou junto do daemon: python -m src.services.daemon --webhook-porta 8081)
+import os, hmac, json, time, queue, hashlib, argparse, threading, traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from database import migrate, upsert_rows, extrator, excluir_ids, close_conn, get_raw_json, marcar_geracao_atual
+except ImportError:
+    from src.database import (migrate, upsert_rows, extrator, excluir_ids, close_conn, get_raw_json,
+                              marcar_geracao_atual)
+
+from src.core import metrics
+
+try:
+    from src.api.bling_api import get_conta
+except ImportError:
+    from bling_api import get_conta
+
+WEBHOOK_PORTA = int(os.getenv("BLING_WEBHOOK_PORTA", "8081"))
+# HMAC-SHA256 do corpo (cabeçalho X-Bling-Signature-256: sha256=<hex>); padrão: client secret do app
+WEBHOOK_SECRET = os.getenv("BLING_WEBHOOK_SECRET") or os.getenv("BLING_CLIENT_SECRET") or ""
+FILA_MAX = int(os.getenv("BLING_WEBHOOK_FILA", "10000"))
+LOTE = 200
+JANELA_S = 0.5
+BUSCAS_PARALELAS = int(os.getenv("BLING_SYNC_CONCURRENCY", "3"))
+CORPO_MAX = 1 << 20  # 1 MiB
+
+_TABELAS = {"pagar": "contas_pagar", "receber": "contas_receber"}
+_ACOES = {
+    "created": "upsert", "updated": "upsert", "criado": "upsert", "alterado": "upsert",
+    "deleted": "excluir", "excluido": "excluir", "removido": "excluir",
+}
+# campos que tornam o payload (evento sobre o payload guardado) suficiente para gravar sem
+# buscar o título: o upsert regrava todas as colunas, faltando um deles a coluna ficaria vazia
+_CAMPOS_COMPLETOS = ("id", "valor", "situacao", "dataVencimento", "contato", "categoria", "numeroDocumento")
+
+
+def _log(msg):
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}", flush=True)
+
+
+# --------- Validação ---------
+def assinatura_valida(corpo: bytes, cabecalho, segredo=None):
+    segredo = WEBHOOK_SECRET if segredo is None else segredo
+    if not segredo:
+        return True  # sem segredo configurado (dev): aceita
+    esperado = "sha256=" + hmac.new(segredo.encode("utf-8"), corpo, hashlib.sha256).hexdigest()
+    return bool(cabecalho) and hmac.compare_digest(esperado, cabecalho.strip())
+
+
+def validar_evento(ev):
+    """
+    Evento do Bling -> (chave, tabela, acao, id, data). ValueError se não for um evento
+    de contas a pagar/receber reconhecido. `chave` identifica o evento (reenvios).
+    Formato: {"eventId", "date", "event": "contas.receber.updated", "data": {"id": ..., ...}}
+    """
+    if not isinstance(ev, dict):
+        raise ValueError("evento deve ser um objeto JSON")
+    nome = str(ev.get("event") or "").lower()
+    partes = nome.replace("_", ".").split(".")
+    tipo = next((t for t in ("pagar", "receber") if t in partes), None)
+    acao = _ACOES.get(partes[-1])
+    if tipo is None or acao is None:
+        raise ValueError(f"evento não suportado: {nome or '(vazio)'}")
+    data = ev.get("data")
+    if not isinstance(data, dict) or not str(data.get("id") or "").strip():
+        raise ValueError("evento sem data.id")
+    id_bling = str(data["id"])
+    chave = str(ev.get("eventId") or f"{nome}:{id_bling}:{ev.get('date')}")
+    return chave, _TABELAS[tipo], acao, id_bling, data
+
+
+def _completo(data):
+    return all(data.get(c) not in (None, "") for c in _CAMPOS_COMPLETOS)
+
+
+# --------- Fila + aplicação em lotes ---------
+class Receptor:
+    """Fila limitada + thread que aplica os eventos em micro-lotes."""
+
+    def __init__(self, lote=LOTE, janela=JANELA_S, buscar=get_conta, fila_max=FILA_MAX):
+        self.lote = lote
+        self.janela = janela
+        self.buscar = buscar
+        self.fila = queue.Queue(maxsize=fila_max)
+        self.vistos = OrderedDict()  # eventIds recentes (o Bling reenvia em caso de timeout)
+        self.stats = {"recebidos": 0, "repetidos": 0, "aplicados": 0, "buscados": 0, "excluidos": 0, "erros": 0}
+        self._lock = threading.Lock()  # stats (handlers HTTP em várias threads)
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="webhook-aplicador", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        self._parar.set()
+        self._thread.join(timeout)
+
+    def enfileirar(self, evento) -> bool:
+        """Evento validado (tupla de validar_evento); False se a fila está cheia."""
+        try:
+            self.fila.put_nowait(evento)
+        except queue.Full:
+            return False
+        with self._lock:
+            self.stats["recebidos"] += 1
+        return True
+
+    def _coletar(self):
+        try:
+            lote = [self.fila.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        limite = time.monotonic() + self.janela
+        while len(lote) < self.lote:
+            resta = limite - time.monotonic()
+            if resta <= 0:
+                break
+            try:
+                lote.append(self.fila.get(timeout=resta))
+            except queue.Empty:
+                break
+        return lote
+
+    def _loop(self):
+        try:
+            while not (self._parar.is_set() and self.fila.empty()):
+                lote = self._coletar()
+                if not lote:
+                    continue
+                try:
+                    self.aplicar(lote)
+                except Exception:
+                    with self._lock:
+                        self.stats["erros"] += len(lote)
+                    _log(f"webhook: erro ao aplicar lote de {len(lote)} evento(s)")
+                    traceback.print_exc()
+        finally:
+            close_conn()  # conexão desta thread
+
+    def _marcar_vistos(self, chaves):
+        for chave in chaves:
+            self.vistos[chave] = True
+        while len(self.vistos) > 50_000:
+            self.vistos.popitem(last=False)
+
+    def aplicar(self, eventos):
+        """
+        Aplica um lote: último evento por título vence; uma transação por tabela. Os eventos
+        só entram em `vistos` depois de aplicados: se algo falhar, o reenvio é aplicado.
+        """
+        t0 = time.perf_counter()
+        ultimo = {}
+        chaves = set()
+        repetidos = 0
+        for chave, tabela, acao, id_bling, data in eventos:
+            if chave in self.vistos or chave in chaves:
+                repetidos += 1
+                continue
+            chaves.add(chave)
+            if acao == "upsert":
+                guardado = get_raw_json(tabela, id_bling)
+                if guardado:  # evento parcial não apaga o que já se sabe do título
+                    data = {**guardado, **data}
+            ultimo[(tabela, id_bling)] = (acao, data)
+
+        buscar = [k for k, (acao, data) in ultimo.items() if acao == "upsert" and not _completo(data)]
+        if buscar:
+            tipo = {v: k for k, v in _TABELAS.items()}
+            with ThreadPoolExecutor(max_workers=max(1, BUSCAS_PARALELAS)) as ex:
+                detalhes = ex.map(lambda k: self.buscar(tipo[k[0]], k[1]), buscar)
+                for k, det in zip(buscar, detalhes):
+                    # título sumiu entre o evento e a busca: trata como exclusão
+                    ultimo[k] = ("upsert", det) if det else ("excluir", None)
+
+        extrair = extrator("v3")
+        r = {"aplicados": 0, "excluidos": 0}
+        for tabela in _TABELAS.values():
+            linhas = [extrair(d) for (t, _), (acao, d) in ultimo.items() if t == tabela and acao == "upsert"]
+            excluir = [i for (t, i), (acao, _) in ultimo.items() if t == tabela and acao == "excluir"]
+            if linhas:
+                ids = [v[0] for v, _ in linhas]
+                # geração atual na mesma transação: um sync completo em andamento não varre o título
+                upsert_rows(tabela, linhas,
+                            na_transacao=lambda con, _, t=tabela, ids=ids: marcar_geracao_atual(con, t, ids))
+                r["aplicados"] += len(linhas)
+            if excluir:
+                r["excluidos"] += excluir_ids(tabela, excluir)
+        self._marcar_vistos(chaves)
+        with self._lock:
+            self.stats["repetidos"] += repetidos
+            self.stats["buscados"] += len(buscar)
+            self.stats["aplicados"] += r["aplicados"]
+            self.stats["excluidos"] += r["excluidos"]
+        metrics.log_json({"evento": "webhook_lote", "eventos": len(eventos), "titulos": len(ultimo),
+                          "buscados": len(buscar), **r, "ms": round((time.perf_counter() - t0) * 1000, 1)})
+        return r
+
+
+# --------- HTTP ---------
+def _handler(receptor):
+    class Handler(BaseHTTPRequestHandler):
+        def _send_text(self, text: str, status: int = 200):
+            body = text.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):  # silencia logs chatos
+            return
+
+        def do_GET(self):
+            if self.path.split("?")[0] == "/saude":
+                with receptor._lock:
+                    stats = dict(receptor.stats)
+                return self._send_text(json.dumps({"fila": receptor.fila.qsize(), **stats}))
+            self._send_text("OK")
+
+        def do_POST(self):
+            n = int(self.headers.get("Content-Length") or 0)
+            if n <= 0 or n > CORPO_MAX:
+                return self._send_text("Corpo ausente ou grande demais.", 413 if n > CORPO_MAX else 400)
+            corpo = self.rfile.read(n)
+            if not assinatura_valida(corpo, self.headers.get("X-Bling-Signature-256")):
+                return self._send_text("Assinatura inválida.", 401)
+            try:
+                evento = validar_evento(json.loads(corpo))
+            except ValueError as e:  # inclui JSON inválido
+                return self._send_text(f"Evento inválido: {e}", 400)
+            if not receptor.enfileirar(evento):
+                # fila cheia: o Bling reenvia depois
+                return self._send_text("Fila cheia, tente novamente.", 503)
+            self._send_text("Aceito.", 202)
+
+    return Handler
+
+
+def iniciar(porta=WEBHOOK_PORTA, host="0.0.0.0", receptor=None):
+    """Sobe o receptor (thread aplicadora + servidor em thread); devolve (httpd, receptor)."""
+    receptor = (receptor or Receptor()).start()
+    httpd = ThreadingHTTPServer((host, porta), _handler(receptor))
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="webhook-http", daemon=True).start()
+    if not WEBHOOK_SECRET:
+        _log("webhook: sem BLING_WEBHOOK_SECRET/BLING_CLIENT_SECRET, assinaturas não são verificadas")
+    return httpd, receptor
+
+
+def parar(httpd, receptor):
+    httpd.shutdown()
+    httpd.server_close()
+    receptor.stop()  # aplica o que ainda estiver na fila
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Recebe webhooks de contas a pagar/receber do Bling.")
+    ap.add_argument("--porta", type=int, default=WEBHOOK_PORTA)
+    ap.add_argument("--host", default="0.0.0.0")
+    args = ap.parse_args(argv)
+    migrate()
+    httpd, receptor = iniciar(args.porta, args.host)
+    _log(f"webhook ouvindo em http://{args.host}:{args.porta}/ (saúde em /saude)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        parar(httpd, receptor)
+        _log(f"webhook encerrado: {receptor.stats}")
+
+
+if __name__ == "__main__":
+    main()
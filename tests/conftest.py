@@ -0,0 +1,21 @@
+# tests/conftest.py — banco SQLite migrado num diretório temporário, por teste
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import database
+from src.services import report
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Caminho de um banco novo e migrado; database/report apontam para ele."""
+    caminho = str(tmp_path / "teste.db")
+    database.close_conn()
+    monkeypatch.setattr(database, "DB_PATH", caminho)
+    monkeypatch.setattr(report, "DB_PATH", caminho)
+    database.migrate()
+    yield caminho
+    database.close_conn()
@@ -0,0 +1,43 @@
+# tests/test_campos.py — extrator compilado: o mesmo título dá o mesmo content_hash pelo
+# caminho em streaming (texto original do Bling) e pelo caminho de dict (webhook, mock_data)
+import json
+
+import pytest
+
+from src.api.bling_api import iter_json_array
+from src.core.campos import I_HASH, extrator
+
+ITEM = {
+    "id": 123, "situacao": 1, "valor": 150.5, "vencimento": "2026-03-10", "dataVencimento": "2026-03-10",
+    "dataEmissao": "2026-02-01", "numeroDocumento": "NF-7",
+    "contato": {"id": 9, "nome": "João & Cia", "tipo": "J"}, "categoria": {"id": 3, "descricao": "Serviços"},
+}
+
+# como o Bling manda: outra ordem de chaves, sem espaços, acentos escapados
+CORPO = ('{"data":[{"valor":150.5,"id":123,"situacao":1,"dataVencimento":"2026-03-10",'
+         '"vencimento":"2026-03-10","dataEmissao":"2026-02-01","numeroDocumento":"NF-7",'
+         '"categoria":{"descricao":"Servi\\u00e7os","id":3},'
+         '"contato":{"tipo":"J","nome":"Jo\\u00e3o & Cia","id":9}}]}')
+
+
+def _do_stream(corpo, tamanho=17):
+    dados = corpo.encode("utf-8")
+    return list(iter_json_array(dados[i:i + tamanho] for i in range(0, len(dados), tamanho)))
+
+
+@pytest.mark.parametrize("versao", ["v3", "v2"])
+def test_stream_e_dict_dao_o_mesmo_hash(versao):
+    extrair = extrator(versao)
+    [(item, raw)] = _do_stream(CORPO)
+    assert raw != json.dumps(ITEM, ensure_ascii=False, sort_keys=True)  # textos diferentes...
+    pelo_stream, raw_guardado = extrair(item, raw)
+    pelo_dict, _ = extrair(json.loads(json.dumps(ITEM)))
+    assert pelo_stream == pelo_dict  # ...mesmas colunas, inclusive content_hash
+    assert raw_guardado == raw  # o texto original continua sendo o guardado
+
+
+def test_hash_muda_com_o_conteudo():
+    extrair = extrator("v3")
+    a, _ = extrair(dict(ITEM))
+    b, _ = extrair({**ITEM, "saldo": 10.0})  # campo fora das colunas também conta
+    assert a[I_HASH] != b[I_HASH]
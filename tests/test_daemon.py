@@ -0,0 +1,59 @@
+# tests/test_daemon.py — intervalo do sync completo respeitado entre reinícios do daemon
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+from src.services import daemon
+
+HORA = 3600
+RECURSO = "contas_pagar"
+
+
+def _run(horas_atras, modo="completo", status="ok", recurso=RECURSO):
+    inicio = datetime.now() - timedelta(hours=horas_atras)
+    database.registrar_run({"recurso": recurso, "modo": modo, "status": status,
+                            "inicio": inicio.isoformat(timespec="seconds"), "duracao_s": 1.0, "registros_s": 0.0})
+
+
+def _primeiro_sync(full_cada_h=24):
+    pedidos = []
+
+    def fn(full, parar):
+        pedidos.append(full)
+        return {"vistos": 0, "inseridos": 0, "atualizados": 0, "inalterados": 0, "excluidos": 0,
+                "incremental": not full}
+
+    w = daemon._Worker(RECURSO, fn, 60, full_cada_h * HORA, threading.Event())
+    w._carregar_ultimo_full()
+    w._executar()
+    return pedidos[0]
+
+
+def test_sem_completo_registrado_faz_completo(db):
+    _run(1, modo="incremental")
+    assert _primeiro_sync() is True
+
+
+def test_completo_recente_nao_repete_no_reinicio(db):
+    _run(2)
+    _run(1, modo="incremental")
+    assert _primeiro_sync() is False
+
+
+def test_completo_antigo_vence_o_intervalo(db):
+    _run(25)
+    assert _primeiro_sync() is True
+
+
+@pytest.mark.parametrize("status", ["erro", "interrompido"])
+def test_completo_sem_sucesso_nao_conta(db, status):
+    _run(30)
+    _run(1, status=status)
+    assert _primeiro_sync() is True
+
+
+def test_completo_de_outro_recurso_nao_conta(db):
+    _run(1, recurso="contas_receber")
+    assert _primeiro_sync() is True
@@ -0,0 +1,22 @@
+# tests/test_mock_data.py — gerador sintético: determinístico, fornecedores e clientes distintos
+from datetime import date
+
+from src.services import mock_data
+
+REF = date(2025, 6, 30)
+
+
+def test_mesmo_seed_mesmos_titulos():
+    assert mock_data.gerar("receber", 0, 500, seed=5, referencia=REF) == \
+        mock_data.gerar("receber", 0, 500, seed=5, referencia=REF)
+
+
+def test_fornecedores_e_clientes_sao_cadastros_distintos():
+    contatos = {}
+    for tipo in mock_data.TIPOS:
+        contatos[tipo] = {(t["contato"]["id"], t["contato"]["nome"])
+                          for t in mock_data.gerar(tipo, 0, 2000, seed=5, contatos=50, referencia=REF)}
+    ids = {tipo: {i for i, _ in c} for tipo, c in contatos.items()}
+    nomes = {tipo: {n for _, n in c} for tipo, c in contatos.items()}
+    assert not ids["pagar"] & ids["receber"]
+    assert not nomes["pagar"] & nomes["receber"]
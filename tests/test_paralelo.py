@@ -0,0 +1,26 @@
+# tests/test_paralelo.py — em_ordem: resultados na ordem dos argumentos, janela limitada
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.core.paralelo import em_ordem
+
+
+@pytest.mark.parametrize("janela", [1, 2, 5])
+def test_ordem_e_janela(janela):
+    lock, executadas = threading.Lock(), []
+
+    def tarefa(i, atraso):
+        time.sleep(atraso)
+        with lock:
+            executadas.append(i)
+        return i * 10
+
+    args = [(i, 0.01 * (i % 3)) for i in range(12)]
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        for k, r in enumerate(em_ordem(ex, tarefa, args, janela)):
+            assert r == k * 10
+            # nunca mais de `janela` tarefas executadas à frente da que acabou de ser consumida
+            assert len(executadas) <= k + janela
@@ -0,0 +1,140 @@
+# tests/test_projecao.py — motor de projeção (NumPy e Python puro) contra a referência em SQL
+import random
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+from src.services import projecao
+
+HOJE = date(2025, 6, 15)
+CONTATOS = 25
+# atrasos nas bordas das faixas (negativo = a vencer; 0 = vence hoje, ainda não é atraso)
+BORDAS = (-400, -3, 0, 1, 30, 31, 60, 61, 90, 91, 365)
+
+CAMINHOS = [pytest.param(False, id="python"),
+            pytest.param(True, id="numpy",
+                         marks=pytest.mark.skipif(projecao.np is None, reason="numpy não instalado"))]
+
+
+def _popular(caminho, n=1500, seed=3):
+    rnd = random.Random(seed)
+    sits = ["ABERTO"] * 5 + ["PARCIAL", "PAGO", "CANCELADO", "EXCLUIDO"]
+    con = sqlite3.connect(caminho)
+    with con:
+        con.executemany("INSERT INTO contatos (id, id_bling, nome) VALUES (?, ?, ?)",
+                        [(k, str(700000 + k), f"Contato {k}") for k in range(1, CONTATOS + 1)])
+        for tabela in projecao.TIPOS.values():
+            rows = []
+            for i in range(n):
+                atraso = BORDAS[i] if i < len(BORDAS) else rnd.randint(-400, 400)
+                venc = (HOJE - timedelta(days=atraso)).isoformat() if i % 50 else None  # alguns sem vencimento
+                ref = rnd.randint(1, CONTATOS) if i % 13 else None  # alguns sem contato
+                sit = "ABERTO" if i < len(BORDAS) else rnd.choice(sits)
+                rows.append((f"{tabela}-{i}", ref, round(rnd.uniform(10, 5000), 2), venc, sit))
+            con.executemany(f"""INSERT INTO {tabela} (id_bling, contato_ref, valor, vencimento, situacao_cod)
+                VALUES (?, ?, ?, ?, ?)""", rows)
+    con.close()
+
+
+# --------- referência: uma consulta por pergunta ---------
+def _fluxo_sql(con, horizonte):
+    fim = HOJE + timedelta(days=horizonte)
+    r = {}
+    for tipo, tabela in projecao.TIPOS.items():
+        por_dia = dict(con.execute(f"""SELECT vencimento, SUM(valor) FROM {tabela}
+            WHERE situacao_cod = 'ABERTO' AND vencimento >= ? AND vencimento < ? GROUP BY vencimento""",
+                                   (HOJE.isoformat(), fim.isoformat())))
+        r[tipo] = [por_dia.get((HOJE + timedelta(days=i)).isoformat(), 0.0) for i in range(horizonte)]
+        r["vencidos_" + tipo] = con.execute(f"""SELECT IFNULL(SUM(valor), 0) FROM {tabela}
+            WHERE situacao_cod = 'ABERTO' AND vencimento < ?""", (HOJE.isoformat(),)).fetchone()[0]
+    return r
+
+
+def _aging_sql(con, tipo):
+    return {cid: list(faixas) for cid, *faixas in con.execute(f"""
+        SELECT (SELECT id_bling FROM contatos WHERE contatos.id = contato_ref),
+               SUM(CASE WHEN atraso <= 0 THEN valor ELSE 0 END),
+               SUM(CASE WHEN atraso BETWEEN 1 AND 30 THEN valor ELSE 0 END),
+               SUM(CASE WHEN atraso BETWEEN 31 AND 60 THEN valor ELSE 0 END),
+               SUM(CASE WHEN atraso BETWEEN 61 AND 90 THEN valor ELSE 0 END),
+               SUM(CASE WHEN atraso > 90 THEN valor ELSE 0 END)
+        FROM (SELECT contato_ref, valor, CAST(julianday(?) - julianday(vencimento) AS INTEGER) AS atraso
+              FROM {projecao.TIPOS[tipo]} WHERE situacao_cod = 'ABERTO' AND vencimento IS NOT NULL)
+        GROUP BY contato_ref""", (HOJE.isoformat(),))}
+
+
+@pytest.fixture
+def populado(db):
+    _popular(db)
+    return db
+
+
+@pytest.fixture
+def motor(db, request):
+    m = projecao.Projecao(db_path=db, usar_numpy=request.param)
+    yield m
+    m.fechar()
+
+
+@pytest.mark.parametrize("motor", CAMINHOS, indirect=True)
+@pytest.mark.parametrize("horizonte", [1, 90, 365])
+def test_fluxo_igual_ao_sql(populado, motor, horizonte):
+    con = sqlite3.connect(populado)
+    ref = _fluxo_sql(con, horizonte)
+    con.close()
+    f = motor.fluxo_caixa(horizonte, HOJE, saldo_inicial=100.0)
+    assert f["entradas"] == pytest.approx(ref["receber"], abs=0.005)
+    assert f["saidas"] == pytest.approx(ref["pagar"], abs=0.005)
+    saldo, acumulado = [], 100.0
+    for e, s in zip(ref["receber"], ref["pagar"]):
+        acumulado += e - s
+        saldo.append(acumulado)
+    assert f["saldo"] == pytest.approx(saldo, abs=0.01)
+    assert f["vencidos"]["receber"] == pytest.approx(ref["vencidos_receber"], abs=0.005)
+    assert f["vencidos"]["pagar"] == pytest.approx(ref["vencidos_pagar"], abs=0.005)
+
+
+@pytest.mark.parametrize("motor", CAMINHOS, indirect=True)
+def test_aging_igual_ao_sql(populado, motor):
+    con = sqlite3.connect(populado)
+    ag = motor.aging(HOJE)
+    for tipo in projecao.TIPOS:
+        ref = _aging_sql(con, tipo)
+        got = {l["contato_id"]: l["faixas"] for l in ag[tipo]["contatos"]}
+        assert got.keys() == ref.keys()
+        for cid, faixas in ref.items():
+            assert got[cid] == pytest.approx(faixas, abs=0.005), cid
+        assert ag[tipo]["totais"] == pytest.approx([sum(c) for c in zip(*ref.values())], abs=0.05)
+        vencidos = [l["vencido"] for l in ag[tipo]["contatos"]]
+        assert vencidos == sorted(vencidos, reverse=True)
+    con.close()
+
+
+@pytest.mark.parametrize("motor", CAMINHOS, indirect=True)
+def test_bordas_das_faixas(db, motor):
+    # só os títulos das bordas, todos do mesmo contato: cada atraso na sua faixa
+    con = sqlite3.connect(db)
+    with con:
+        con.execute("INSERT INTO contatos (id, id_bling, nome) VALUES (1, '1', 'Único')")
+        con.executemany("INSERT INTO contas_receber (id_bling, contato_ref, valor, vencimento, situacao_cod) "
+                        "VALUES (?, 1, ?, ?, 'ABERTO')",
+                        [(str(a), 10.0 ** k, (HOJE - timedelta(days=a)).isoformat()) for k, a in enumerate(BORDAS)])
+    con.close()
+    (linha,) = motor.aging(HOJE)["receber"]["contatos"]
+    v = {a: 10.0 ** k for k, a in enumerate(BORDAS)}
+    assert linha["faixas"] == pytest.approx([
+        v[-400] + v[-3] + v[0], v[1] + v[30], v[31] + v[60], v[61] + v[90], v[91] + v[365]])
+
+
+@pytest.mark.parametrize("motor", CAMINHOS, indirect=True)
+def test_parciais_fora_e_contados(populado, motor):
+    con = sqlite3.connect(populado)
+    esperado = {tipo: con.execute(f"SELECT COUNT(*), ROUND(SUM(valor), 2) FROM {tabela} "
+                                  "WHERE situacao_cod = 'PARCIAL'").fetchone()
+                for tipo, tabela in projecao.TIPOS.items()}
+    con.close()
+    for r in (motor.fluxo_caixa(30, HOJE), motor.aging(HOJE)):
+        for tipo, (qtd, valor) in esperado.items():
+            assert qtd > 0
+            assert r["parciais"][tipo] == {"qtd": qtd, "valor": pytest.approx(valor, abs=0.005)}
@@ -0,0 +1,117 @@
+# tests/test_report_plans.py — relatórios: plano de execução (sem SCAN nas tabelas) e mesmo
+# resultado das consultas antigas (date()/LIKE direto nos títulos)
+import random
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+import database
+from src.services import report
+
+# tabelas que nunca podem ser varridas por inteiro pelos relatórios
+TABELAS = ("contas_pagar", "contas_receber", "agg_vencimento", "agg_contato")
+
+NOVAS = {
+    "pagar_hoje": report.total_a_pagar_hoje,
+    "receber_hoje": report.total_a_receber_hoje,
+    "devedores": report.devedores,
+    "resumo_semana": report.resumo_semana,
+}
+
+ANTIGAS = {
+    "pagar_hoje": """SELECT IFNULL(SUM(valor),0) FROM contas_pagar
+        WHERE situacao LIKE 'ABER%' AND date(data_vencimento) = date('now')""",
+    "receber_hoje": """SELECT IFNULL(SUM(valor),0) FROM contas_receber
+        WHERE situacao LIKE 'ABER%' AND date(data_vencimento) = date('now')""",
+    "devedores": """SELECT c.id_bling, IFNULL(c.nome, ''), SUM(valor) AS total FROM contas_receber
+        LEFT JOIN contatos c ON c.id = contato_ref
+        WHERE situacao LIKE 'ABER%' AND date(data_vencimento) < date('now')
+        GROUP BY contato_ref ORDER BY total DESC""",
+    "resumo_semana": """SELECT 'pagar', IFNULL(SUM(valor),0) FROM contas_pagar
+        WHERE date(data_vencimento) BETWEEN date('now','-6 day') AND date('now')
+        UNION ALL SELECT 'receber', IFNULL(SUM(valor),0) FROM contas_receber
+        WHERE date(data_vencimento) BETWEEN date('now','-6 day') AND date('now')""",
+}
+
+CONTATOS = 60
+
+
+def _popular(caminho, n=3000, seed=7):
+    rnd = random.Random(seed)
+    hoje = date.today()
+    sits = ["ABERTA"] * 3 + ["BAIXADA"] * 6 + ["CANCELADA"]
+    con = sqlite3.connect(caminho)
+    with con:
+        # homônimos de propósito: devedores separa por contato, não por nome
+        con.executemany("INSERT INTO contatos (id, id_bling, nome) VALUES (?, ?, ?)",
+                        [(k, str(900000 + k), f"Contato {k % (CONTATOS // 2)}") for k in range(1, CONTATOS + 1)])
+        for tabela in ("contas_pagar", "contas_receber"):
+            rows = []
+            for i in range(n):
+                venc = (hoje + timedelta(days=rnd.randint(-30, 10))).isoformat()
+                sit = rnd.choice(sits)
+                # alguns sem contato (contato_ref NULL) e alguns vencendo hoje
+                ref = rnd.randint(1, CONTATOS) if i % 17 else None
+                rows.append((f"{tabela}-{i}", ref, round(rnd.uniform(10, 5000), 2), venc, sit, venc,
+                             database._norm_situacao(sit)))
+            con.executemany(f"""INSERT INTO {tabela} (id_bling, contato_ref, valor, data_vencimento, situacao,
+                vencimento, situacao_cod) VALUES (?, ?, ?, ?, ?, ?, ?)""", rows)
+    con.execute("ANALYZE")
+    con.close()
+
+
+def _normalizar(linhas):
+    if not isinstance(linhas, list):
+        linhas = [(linhas,)]
+    # sem contato: id_bling NULL nas duas consultas
+    return sorted((tuple("" if x is None else x for x in tuple(r)[:-1]), round(tuple(r)[-1], 2)) for r in linhas)
+
+
+@pytest.fixture
+def populado(db):
+    _popular(db)
+    return db
+
+
+@pytest.mark.parametrize("nome", sorted(NOVAS))
+def test_relatorio_usa_indice(populado, nome):
+    con = sqlite3.connect(populado)
+    con.row_factory = sqlite3.Row
+    executadas = []
+    con.set_trace_callback(executadas.append)
+    NOVAS[nome](con)
+    con.set_trace_callback(None)
+    assert executadas
+    for sql in executadas:
+        plano = [r[3] for r in con.execute("EXPLAIN QUERY PLAN " + sql)]
+        scans = [p for p in plano if p.startswith("SCAN") and any(f"SCAN {t}" in p for t in TABELAS)]
+        assert not scans, (nome, plano)
+        assert any(p.startswith("SEARCH") and " USING " in p for p in plano), (nome, plano)
+    con.close()
+
+
+@pytest.mark.parametrize("nome", sorted(NOVAS))
+def test_relatorio_igual_consulta_antiga(populado, nome):
+    antigo = report.run_query(ANTIGAS[nome])
+    novo = NOVAS[nome]()
+    assert _normalizar(novo) == _normalizar(antigo)
+
+
+def test_devedores_separa_homonimos(populado):
+    nomes = [r["contato_nome"] for r in report.devedores()]
+    assert len(nomes) > len(set(nomes))  # mesmo nome, contatos diferentes, linhas diferentes
+
+
+def test_excluido_sai_dos_relatorios(populado):
+    con = sqlite3.connect(populado)
+    ids = [r[0] for r in con.execute("SELECT id_bling FROM contas_pagar WHERE vencimento BETWEEN "
+                                     "date('now','-6 day') AND date('now')")]
+    con.close()
+    assert ids
+    database.excluir_ids("contas_pagar", ids)
+    # agregados: somas e subtrações deixam resíduo de ponto flutuante
+    pagar = {r["tipo"]: r["total"] for r in report.resumo_semana()}["pagar"]
+    assert pagar == pytest.approx(0, abs=0.005)
+    assert report.total_a_pagar_hoje() == pytest.approx(0, abs=0.005)
+    assert database.checar_agregados() == []
@@ -0,0 +1,63 @@
+# tests/test_sync_geracao.py — carimbo da geração no upsert e varredura de exclusões
+import pytest
+
+import database
+
+TABELA = "contas_pagar"
+
+
+def _itens(n, valor=10.0):
+    return [{"id": i, "valor": valor + (i % 3), "situacao": 1, "dataVencimento": "2026-01-10",
+             "contato": {"id": 500 + i % 4, "nome": f"C{i % 4}"}} for i in range(1, n + 1)]
+
+
+def _gravar(itens, geracao=None, con=None):
+    extrair = database.extrator("v3")
+    return database.upsert_rows(TABELA, [extrair(x) for x in itens], geracao=geracao, con=con)
+
+
+def _gens(con):
+    return dict(con.execute(f"SELECT id_bling, sync_gen FROM {TABELA}"))
+
+
+def test_geracao_em_novos_alterados_e_inalterados(db):
+    con = database.get_conn()
+    g1 = database.nova_geracao(TABELA)
+    assert _gravar(_itens(20), g1)["inseridos"] == 20
+    assert set(_gens(con).values()) == {g1}
+
+    g2 = database.nova_geracao(TABELA)
+    itens = _itens(20)
+    itens[0]["valor"] = 999.0  # um alterado, 19 inalterados (não reescritos)
+    r = _gravar(itens + _itens(22)[20:], g2)
+    assert (r["inseridos"], r["atualizados"], r["inalterados"]) == (2, 1, 19)
+    assert set(_gens(con).values()) == {g2}
+    assert database.varrer_excluidos(TABELA, g2, 22) == 0
+
+
+def test_nao_visto_na_geracao_e_varrido(db):
+    g1 = database.nova_geracao(TABELA)
+    _gravar(_itens(10), g1)
+    g2 = database.nova_geracao(TABELA)
+    _gravar(_itens(10)[:8], g2)
+    assert database.varrer_excluidos(TABELA, g2, 8) == 2
+    con = database.get_conn()
+    assert {r[0] for r in con.execute(f"SELECT id_bling FROM {TABELA} WHERE excluido_em IS NOT NULL")} == {"9", "10"}
+
+
+@pytest.mark.parametrize("mudar", [False, True])
+def test_carimbo_nao_acrescenta_instrucoes(db, mudar):
+    """Com geracao, o upsert roda as mesmas instruções que sem ela (fora BEGIN/COMMIT: carimbar é escrita)."""
+    def instrucoes(geracao):
+        con = database._conn()
+        with con:
+            con.execute(f"DELETE FROM {TABELA}")
+        _gravar(_itens(50), con=con)
+        executadas = []
+        con.set_trace_callback(executadas.append)
+        _gravar(_itens(50, valor=20.0 if mudar else 10.0), geracao, con=con)
+        con.set_trace_callback(None)
+        con.close()
+        return len([q for q in executadas if q.split()[0].upper() not in ("BEGIN", "COMMIT")])
+
+    assert instrucoes(database.nova_geracao(TABELA)) == instrucoes(None)
@@ -0,0 +1,58 @@
+# tests/test_sync_paginacao.py — paginação concorrente: ordem, parada e páginas descartadas
+import time
+import threading
+
+import pytest
+
+from src.services import sync
+
+
+class _Pagina:
+    """Página em streaming de mentira: registra se foi fechada."""
+
+    def __init__(self, itens):
+        self.itens = itens
+        self.fechada = False
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def close(self):
+        self.fechada = True
+
+
+def _fonte(total_paginas, por_pagina=3):
+    criadas, lock = [], threading.Lock()
+
+    def fetch(page, limit):
+        p = _Pagina([{"id": (page, i)} for i in range(por_pagina)] if page <= total_paginas else [])
+        with lock:
+            criadas.append((page, p))
+        return p
+    return fetch, criadas
+
+
+@pytest.mark.parametrize("concorrencia", [1, 2, 4])
+def test_entrega_em_ordem_ate_pagina_vazia(concorrencia):
+    fetch, _ = _fonte(5)
+    paginas = [(n, [x["id"] for x in itens]) for n, itens in sync._iter_paginated(fetch, concurrency=concorrencia)]
+    assert [n for n, _ in paginas] == [1, 2, 3, 4, 5]
+    assert paginas[2][1] == [(3, 0), (3, 1), (3, 2)]
+
+
+def test_paginas_buscadas_de_antemao_sao_fechadas():
+    fetch, criadas = _fonte(5)
+    for _, itens in sync._iter_paginated(fetch, concurrency=4):
+        list(itens)
+        time.sleep(0.02)  # consumidor lento: as buscadas de antemão chegam a rodar
+    # 5 com dados + a vazia que encerrou; as além dela foram buscadas de antemão e descartadas
+    descartadas = [p for n, p in criadas if n > 6]
+    assert descartadas and all(p.fechada for p in descartadas)
+
+
+def test_interrompido_no_meio_fecha_as_pendentes():
+    fetch, criadas = _fonte(50)
+    it = sync._iter_paginated(fetch, concurrency=4)
+    next(it)
+    it.close()  # ex.: sync parado (SIGTERM) entre páginas
+    assert all(p.fechada for n, p in criadas if n > 1)